@@ -1,6 +1,176 @@
-import streamlit as st
 import pandas as pd
-from Insider_trading_secrets import obtener_transacciones_insiders, dividir_compras_ventas, filtrar_por_fecha, formatear_fecha, obtener_acciones_totales, crear_resumen
+import plotly.graph_objects as go
+import streamlit as st
+from insider.acciones import AccionesNoDisponibles
+from insider.cache import CacheTTL
+from insider.clusters import DIAS_CLUSTER, MIN_INSIDERS, detectar_clusters, presentar_clusters
+from insider.config import configurar_logging
+from insider.consulta import Consulta
+from insider.descarga import LimitadorTokens
+from insider.fechas import COLUMNA_FECHA
+from insider.identidades import IndiceInsiders
+from insider.ingesta import construir_transacciones, frame_vacio
+from insider.metricas import METRICAS
+from insider.pipeline import (RUTA_INSIDERS, RUTA_PRECIOS, descargar_registros, obtener_acciones_totales,
+                              obtener_rentabilidades)
+from insider.presentacion import filtrar_texto, linea_temporal, numero_paginas, ordenar, pagina
+from insider.rentabilidades import CachePrecios, resumen_rentabilidades
+from insider.resumen import resumir_transacciones
+
+# Punto de entrada de la aplicación Streamlit: streamlit run app_insider.py
+configurar_logging('insider_app.log')
+
+# Caducidad de cada etapa de la caché (en segundos)
+TTL_TRANSACCIONES = 30 * 60
+TTL_FRAMES = 30 * 60
+TTL_ACCIONES = 7 * 24 * 3600
+TTL_RESUMENES = 30 * 60
+TTL_VISTAS = 10 * 60
+
+# Cachés por etapa y limitador de la API compartidos por todas las sesiones del servidor.
+# Las peticiones simultáneas de la misma clave se agrupan en una sola descarga.
+@st.cache_resource
+def recursos_compartidos():
+    return {
+        'transacciones': CacheTTL(TTL_TRANSACCIONES, nombre='transacciones'),
+        'frames': CacheTTL(TTL_FRAMES, max_entradas=16, nombre='frames'),
+        'acciones': CacheTTL(TTL_ACCIONES, nombre='acciones'),
+        'resumenes': CacheTTL(TTL_RESUMENES, max_entradas=256, nombre='resumenes'),
+        'vistas': CacheTTL(TTL_VISTAS, max_entradas=32, nombre='vistas'),
+        'limitador': LimitadorTokens(60),
+        'precios': CachePrecios(RUTA_PRECIOS),
+        'insiders': IndiceInsiders(RUTA_INSIDERS),
+    }
+
+recursos = recursos_compartidos()
+
+# Descarga los tickers que faltan y añade sus transacciones al índice de insiders. Si el índice cambia,
+# los frames ya unificados pueden haber quedado con nombres antiguos y se descartan.
+def descargar_e_indexar(tickers):
+    registros = descargar_registros(tickers, limitador=recursos['limitador'])
+    if recursos['insiders'].indexar(registros):
+        recursos['frames'].invalidar()
+    return registros
+
+# Frame de transacciones de un conjunto de tickers (tupla), con el nombre de cada insider unificado según
+# el índice. Se construye una vez por conjunto a partir de los registros en bruto en caché (solo se
+# descargan los tickers que faltan); si algún ticker falla, el frame se devuelve sin guardarlo.
+def cargar_transacciones(tickers):
+    incompletos = {}
+
+    def calcular(_):
+        registros = recursos['transacciones'].obtener_varios(tickers, descargar_e_indexar)
+        df = recursos['insiders'].unificar(
+            construir_transacciones([(ticker, registros[ticker]) for ticker in tickers if ticker in registros]))
+        if len(registros) < len(tickers):
+            incompletos[tickers] = df
+            return {}
+        return {tickers: df}
+
+    frames = recursos['frames'].obtener_varios([tickers], calcular)
+    return frames[tickers] if tickers in frames else incompletos.get(tickers, frame_vacio())
+
+# Total de acciones por ticker. Solo se guardan una semana los totales válidos: los centinelas de error o
+# sin dato se piden cada vez al resolutor, que ya los reintenta pasada su propia caducidad (una hora).
+def cargar_acciones(tickers):
+    no_disponibles = {}
+
+    def calcular(pendientes):
+        totales = obtener_acciones_totales(pendientes)
+        no_disponibles.update({t: v for t, v in totales.items() if isinstance(v, AccionesNoDisponibles)})
+        return {t: v for t, v in totales.items() if t not in no_disponibles}
+
+    return {**recursos['acciones'].obtener_varios(tickers, calcular), **no_disponibles}
+
+# Tablas ya filtradas y resumidas para un conjunto de tickers y un número de días: del frame en caché
+# del conjunto solo se recorta la ventana y se resume. Las fechas siguen en datetime64: solo se
+# formatean las filas de la página que se muestra
+def calcular_resultados(tickers, dias):
+    def calcular():
+        df_total = cargar_transacciones(tickers)
+        if df_total.empty:
+            return None
+
+        # Compras y ventas de la ventana y sus resúmenes en una sola pasada
+        resultado = Consulta(df_total).ventana(dias).salidas(
+            'compras', 'ventas', 'resumen_compras', 'resumen_ventas', formatear=False
+        ).ejecutar(cargar_acciones(list(tickers)))
+        return resultado['compras'], resultado['ventas'], resultado['resumen_compras'], resultado['resumen_ventas']
+
+    return recursos['resumenes'].obtener((tickers, dias), calcular)
+
+# Rentabilidad posterior media por ticker y por insider de las transacciones ya calculadas
+def calcular_rentabilidades(tickers, dias, df_compras, df_ventas):
+    def calcular():
+        df = obtener_rentabilidades(pd.concat([df_compras, df_ventas], ignore_index=True), recursos['precios'])
+        return resumen_rentabilidades(df, 'Ticker'), resumen_rentabilidades(df, 'Nombre')
+
+    return recursos['resumenes'].obtener((tickers, dias, 'rentabilidades'), calcular)
+
+# Vista filtrada y ordenada en el servidor (se guarda para que cambiar de página no vuelva a ordenar)
+def vista_detalle(clave, df, texto, columna, ascendente):
+    return recursos['vistas'].obtener(clave + (texto, columna, ascendente),
+                                      lambda: ordenar(filtrar_texto(df, texto), columna, ascendente))
+
+# Detalle de transacciones bajo demanda: solo se calcula si se despliega y al navegador solo se
+# envía la página visible
+def mostrar_detalle(titulo, df, clave):
+    if not st.toggle(f"{titulo} ({len(df):,} transacciones)", key=f'ver_{clave[-1]}'):
+        return
+    col_filtro, col_orden, col_sentido = st.columns([3, 3, 2])
+    texto = col_filtro.text_input("Filtrar por ticker o insider", key=f'filtro_{clave[-1]}').strip()
+    columnas = list(df.columns)
+    columna = col_orden.selectbox("Ordenar por", columnas, index=columnas.index(COLUMNA_FECHA), key=f'orden_{clave[-1]}')
+    ascendente = col_sentido.toggle("Ascendente", key=f'ascendente_{clave[-1]}')
+
+    vista = vista_detalle(clave, df, texto.lower(), columna, ascendente)
+    paginas = numero_paginas(len(vista))
+    clave_pagina = f'pagina_{clave[-1]}'
+    if st.session_state.get(clave_pagina, 1) > paginas:
+        st.session_state[clave_pagina] = paginas
+    numero = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key=clave_pagina)
+    st.dataframe(pagina(vista, int(numero)), hide_index=True)
+
+# Compras en grupo con los parámetros elegidos (se guardan junto a las demás vistas)
+def mostrar_clusters(df_compras, clave):
+    col_dias, col_insiders, col_importe = st.columns(3)
+    dias = col_dias.number_input("Ventana (días)", min_value=1, max_value=365, value=DIAS_CLUSTER, step=1)
+    min_insiders = col_insiders.number_input("Mínimo de insiders", min_value=1, max_value=50, value=MIN_INSIDERS, step=1)
+    min_importe = col_importe.number_input("Importe mínimo", min_value=0.0, value=0.0, step=100000.0)
+    clusters = recursos['vistas'].obtener(
+        clave + ('clusters', int(dias), int(min_insiders), float(min_importe)),
+        lambda: presentar_clusters(detectar_clusters(df_compras, int(dias), int(min_insiders), float(min_importe))),
+    )
+    if clusters.empty:
+        st.write("No hay compras en grupo con estos parámetros.")
+    else:
+        st.dataframe(clusters, hide_index=True)
+
+# Vista por insider: busca a una persona en el índice (que reúne las variantes de su nombre) y muestra
+# sus compras y ventas en todos los tickers consultados hasta ahora, no solo en los cargados
+def mostrar_insider():
+    texto = st.text_input("Buscar insider por nombre", key='buscar_insider').strip()
+    personas = recursos['insiders'].insiders(texto)
+    if personas.empty:
+        st.write("No hay insiders que coincidan: carga primero los tickers en los que opera.")
+        return
+    etiquetas = dict(zip(personas['Insider'], personas['Nombre'] + ' (' + personas['Tickers'] + ')'))
+    insider = st.selectbox("Insider", list(etiquetas), format_func=etiquetas.get, key='insider')
+    df = recursos['insiders'].transacciones(insider)
+    _, _, neto = resumir_transacciones(df, {})
+    st.dataframe(neto, hide_index=True)
+    mostrar_detalle(f"Transacciones de {etiquetas[insider]}", df, ('insider', len(df), f'insider_{insider}'))
+
+# Actividad de compras y ventas en el tiempo, con un número fijo de puntos por serie
+def grafico_actividad(df_compras, df_ventas):
+    figura = go.Figure()
+    for nombre, df in (('Compras', df_compras), ('Ventas', df_ventas)):
+        serie = linea_temporal(df)
+        figura.add_scatter(x=serie[COLUMNA_FECHA], y=serie['Importe'], name=nombre, mode='lines+markers',
+                           customdata=serie['Transacciones'],
+                           hovertemplate='%{x|%d/%m/%Y}<br>Importe: %{y:,.0f}<br>Transacciones: %{customdata}')
+    figura.update_layout(xaxis_title='Fecha', yaxis_title='Importe', hovermode='x unified')
+    return figura
 
 # Título de la aplicación
 st.title('Análisis de Transacciones de Insiders')
@@ -18,7 +188,7 @@ tickers_input = st.text_input(
 )
 
 # Convertir la entrada en una lista de tickers
-tickers = [ticker.strip().upper() for ticker in tickers_input.split(',')]
+tickers = [ticker.strip().upper() for ticker in tickers_input.split(',') if ticker.strip()]
 
 # Entrada de usuario: seleccionar número de días para filtrar
 dias_input = st.number_input(
@@ -26,55 +196,67 @@ dias_input = st.number_input(
     min_value=1, max_value=365, value=15, step=1
 )
 
-# Botón para cargar datos
+# Botón para cargar datos: solo fija los tickers a mostrar. Los datos salen de la caché compartida,
+# así que cambiar el número de días no vuelve a consultar Finnhub ni Yahoo
 if st.button('Cargar datos'):
-    # Mostrar un mensaje de carga
-    st.write("Obteniendo datos, por favor espera...")
-
-    # Obtener transacciones de múltiples tickers y combinarlas
-    df_total = pd.DataFrame()
-    for ticker in tickers:
-        df_ticker = obtener_transacciones_insiders(ticker)
-        df_total = pd.concat([df_total, df_ticker], ignore_index=True)
-    
-    # Si hay datos, procesar y mostrar
-    if not df_total.empty:
-        # Dividir en compras y ventas
-        df_compras, df_ventas = dividir_compras_ventas(df_total)
-        
-        # Filtrar las transacciones por fecha
-        df_compras = filtrar_por_fecha(df_compras, dias=dias_input)
-        df_ventas = filtrar_por_fecha(df_ventas, dias=dias_input)
-        
-        # Formatear fechas
-        df_compras = formatear_fecha(df_compras)
-        df_ventas = formatear_fecha(df_ventas)
-        
-        # Crear resúmenes
-        total_acciones = obtener_acciones_totales(tickers)
-        resumen_compras, resumen_ventas = crear_resumen(df_compras, df_ventas, total_acciones)
-        
-        # Eliminar índices antes de mostrar
-        df_compras = df_compras.reset_index(drop=True)
-        df_ventas = df_ventas.reset_index(drop=True)
-        resumen_compras = resumen_compras.reset_index(drop=True)
-        resumen_ventas = resumen_ventas.reset_index(drop=True)
-        
-        # Mostrar los DataFrames en la aplicación
-        st.subheader("Transacciones de Compras")
-        st.dataframe(df_compras)
-
-        st.subheader("Transacciones de Ventas")
-        st.dataframe(df_ventas)
-
-        st.subheader("Resumen de Compras")
-        st.dataframe(resumen_compras)
-
-        st.subheader("Resumen de Ventas")
-        st.dataframe(resumen_ventas)
-else:
+    st.session_state['tickers_cargados'] = tuple(sorted(set(tickers)))
+
+tickers_cargados = st.session_state.get('tickers_cargados')
+resultados = None
+if tickers_cargados:
+    with st.spinner("Obteniendo datos, por favor espera..."):
+        resultados = calcular_resultados(tickers_cargados, int(dias_input))
+
+if resultados is not None:
+    df_compras, df_ventas, resumen_compras, resumen_ventas = resultados
+
+    clave = (tickers_cargados, int(dias_input))
+
+    # Primero los resúmenes (una fila por ticker)
+    st.subheader("Resumen de Compras")
+    st.dataframe(resumen_compras, hide_index=True)
+
+    st.subheader("Resumen de Ventas")
+    st.dataframe(resumen_ventas, hide_index=True)
+
+    st.subheader("Compras en Grupo")
+    mostrar_clusters(df_compras, clave)
+
+    if st.toggle("Mostrar rentabilidad posterior (+5, +20 y +60 sesiones)"):
+        with st.spinner("Obteniendo cotizaciones..."):
+            por_ticker, por_insider = calcular_rentabilidades(tickers_cargados, int(dias_input), df_compras, df_ventas)
+        st.subheader("Rentabilidad Posterior por Ticker")
+        st.dataframe(por_ticker, hide_index=True)
+        st.subheader("Rentabilidad Posterior por Insider")
+        st.dataframe(por_insider, hide_index=True)
+
+    st.subheader("Actividad de Insiders")
+    st.plotly_chart(grafico_actividad(df_compras, df_ventas), use_container_width=True)
+
+    # Detalle de las transacciones, paginado
+    st.subheader("Transacciones")
+    mostrar_detalle("Transacciones de Compras", df_compras, clave + ('compras',))
+    mostrar_detalle("Transacciones de Ventas", df_ventas, clave + ('ventas',))
+elif tickers_cargados:
     st.warning("No se encontraron transacciones para los tickers seleccionados o los directivos de tu empresa no tienen que rellenar el formulario de la SEC.")
 
+# Historial de cada insider en todas las empresas consultadas
+st.subheader("Transacciones por Insider")
+mostrar_insider()
+
+# Panel opcional de métricas del proceso (compartidas por todas las sesiones del servidor). La medición
+# se decide una vez por proceso con INSIDER_METRICAS=1 al arrancar; la casilla solo muestra el panel.
+if st.sidebar.checkbox('Mostrar métricas de rendimiento'):
+    st.sidebar.subheader('Métricas')
+    tabla_metricas = METRICAS.tabla()
+    if not METRICAS.activo:
+        st.sidebar.write("Las métricas están desactivadas: arranca la aplicación con INSIDER_METRICAS=1.")
+    elif tabla_metricas.empty:
+        st.sidebar.write("Aún no hay métricas: carga datos para empezar a medir.")
+    else:
+        st.sidebar.dataframe(tabla_metricas, hide_index=True)
+        st.sidebar.download_button('Descargar (Prometheus)', METRICAS.a_prometheus(), file_name='insider_metricas.prom')
+
 # Agregar tu autoría y enlaces al final
 st.markdown("""
     ---
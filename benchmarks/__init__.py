@@ -0,0 +1 @@
+# Benchmarks reproducibles del pipeline (no requieren acceso a Finnhub ni a Yahoo)
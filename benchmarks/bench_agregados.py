@@ -0,0 +1,115 @@
+# Comprueba que los agregados incrementales (insider.agregados) coinciden con recalcular el resumen
+# completo sobre la ventana y compara el coste de ambos. Simula varios días de sondeos sobre datos
+# aleatorios: cada día llegan transacciones nuevas (algunas con fecha atrasada o fuera de la ventana),
+# se retiran algunas de las ya vistas y la ventana avanza, de modo que salen las más antiguas.
+#
+#   python -m benchmarks.bench_agregados --filas 100000 1000000 --dias 30 --pasos 60
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.sintetico import generar_transacciones
+from insider.agregados import AgregadosVentana
+from insider.fechas import COLUMNA_FECHA, ventana_dias
+from insider.resumen import agregar_por_ticker, resumir_agregados, resumir_transacciones
+
+
+def _ordenar(df, claves):
+    return df.sort_values(claves, kind='stable', ignore_index=True)
+
+
+# Compara agregados y resúmenes de ambos caminos; los importes admiten el error de redondeo de sumar y restar
+def comprobar(incremental, df_vivas, dias, hoy, total_acciones):
+    ventana = ventana_dias(df_vivas, dias, hoy=hoy)
+    esperado = agregar_por_ticker(ventana)
+    esperado.index = esperado.index.set_levels(esperado.index.levels[0].astype(object), level='Ticker')
+    obtenido = incremental.agregados()
+    esperado, obtenido = esperado.sort_index(), obtenido.sort_index()
+    assert list(esperado.index) == list(obtenido.index), "Los grupos (ticker, lado) no coinciden"
+    for columna in ('Total', 'Transacciones', 'Insiders'):
+        assert (esperado[columna].to_numpy() == obtenido[columna].to_numpy()).all(), f"'{columna}' no coincide"
+    assert np.allclose(esperado['Importe'], obtenido['Importe'], rtol=1e-9), "'Importe' no coincide"
+    assert (np.abs(esperado['VWAP'] - obtenido['VWAP']) <= 0.01 + 1e-9).all(), "'VWAP' no coincide"
+
+    for lleno, parcial in zip(resumir_transacciones(ventana, total_acciones), resumir_agregados(obtenido, total_acciones)):
+        lleno, parcial = _ordenar(lleno, 'Ticker'), _ordenar(parcial, 'Ticker')
+        assert list(lleno.columns) == list(parcial.columns) and len(lleno) == len(parcial)
+        for columna in lleno.columns:
+            a, b = lleno[columna].to_numpy(), parcial[columna].to_numpy()
+            if columna.startswith(('Importe', 'Precio Medio')):
+                assert np.allclose(a.astype(float), b.astype(float), rtol=1e-9, atol=0.01, equal_nan=True), columna
+            else:
+                assert (a.astype(str) == b.astype(str)).all(), f"'{columna}' del resumen no coincide"
+
+
+def simular(filas, dias, pasos, semilla, verificar):
+    rng = np.random.default_rng(semilla)
+    df, total_acciones = generar_transacciones(filas, semilla=semilla)
+    df = df.sort_values(COLUMNA_FECHA, kind='stable', ignore_index=True)
+    # Las transacciones de los últimos `pasos` días llegan como nuevas, una vez al día; el resto es el histórico
+    fin = df[COLUMNA_FECHA].max()
+    hoy = (fin - pd.Timedelta(days=pasos)).to_pydatetime()
+    historico = df[df[COLUMNA_FECHA] <= hoy]
+    llegadas = df[df[COLUMNA_FECHA] > hoy]
+    vivas = np.zeros(len(df), dtype=bool)
+    vivas[:len(historico)] = True
+
+    inicio = time.perf_counter()
+    incremental = AgregadosVentana(dias, hoy=hoy)
+    incremental.anadir(historico)
+    carga = time.perf_counter() - inicio
+    t_deltas = t_resumen = t_completo = 0.0
+    for _ in range(pasos):
+        hoy = hoy + pd.Timedelta(days=1).to_pytimedelta()
+        nuevas = llegadas[llegadas[COLUMNA_FECHA].dt.normalize() == pd.Timestamp(hoy).normalize()]
+        # Algunas llegan con fecha atrasada (dentro y fuera de la ventana)
+        atrasadas = nuevas.sample(frac=0.1, random_state=int(rng.integers(1 << 31))).index
+        nuevas = nuevas.copy()
+        nuevas.loc[atrasadas, COLUMNA_FECHA] -= pd.to_timedelta(rng.integers(1, dias * 2, len(atrasadas)), unit='D')
+        df.loc[atrasadas, COLUMNA_FECHA] = nuevas.loc[atrasadas, COLUMNA_FECHA]
+        candidatas = np.flatnonzero(vivas)
+        retiradas = rng.choice(candidatas, size=min(len(candidatas), int(rng.integers(0, 20))), replace=False)
+
+        inicio = time.perf_counter()
+        incremental.avanzar(hoy)
+        incremental.anadir(nuevas)
+        incremental.quitar(df.iloc[retiradas])
+        t_deltas += time.perf_counter() - inicio
+        vivas[nuevas.index] = True
+        vivas[retiradas] = False
+
+        df_vivas = df[vivas]
+        inicio = time.perf_counter()
+        resumir_transacciones(ventana_dias(df_vivas, dias, hoy=hoy), total_acciones)
+        t_completo += time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        incremental.resumenes(total_acciones)
+        t_resumen += time.perf_counter() - inicio
+
+        if verificar:
+            comprobar(incremental, df_vivas, dias, hoy, total_acciones)
+    return carga, t_deltas / pasos, t_resumen / pasos, t_completo / pasos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agregados incrementales frente a recálculo completo')
+    parser.add_argument('--filas', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--dias', type=int, default=30)
+    parser.add_argument('--pasos', type=int, default=60)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--sin-verificar', action='store_true', help='Solo mide tiempos')
+    args = parser.parse_args()
+
+    print(f"{'filas':>12} {'carga (s)':>10} {'deltas/paso (ms)':>17} {'resumen/paso (ms)':>18} "
+          f"{'completo/paso (ms)':>19}")
+    for filas in args.filas:
+        carga, deltas, resumen, completo = simular(filas, args.dias, args.pasos, args.semilla, not args.sin_verificar)
+        print(f"{filas:>12,} {carga:>10.3f} {deltas * 1000:>17.2f} {resumen * 1000:>18.2f} {completo * 1000:>19.2f}")
+    if not args.sin_verificar:
+        print("Los agregados incrementales coinciden con el recálculo completo en todos los pasos.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# Comprueba la detección de compras en grupo (insider.clusters) contra una implementación por fuerza
+# bruta y compara el coste de detectarlas de una vez con el de ir actualizando el detector por lotes.
+# La fuerza bruta recorre, para cada compra, todas las compras del ticker de los `dias` días que
+# terminan en ella, sin ventana deslizante ni contadores; el detector incremental recibe las mismas
+# compras en lotes sucesivos (con compras atrasadas) y al final debe dar los mismos clusters.
+#
+#   python -m benchmarks.bench_clusters --filas 10000 100000 --lotes 20
+import argparse
+import time
+from bisect import bisect_left
+
+import numpy as np
+
+from benchmarks.sintetico import generar_transacciones
+from insider.clusters import COLUMNAS_CLUSTER, DetectorClusters, _a_frame, detectar_clusters
+from insider.fechas import COLUMNA_FECHA
+
+
+# Clusters por fuerza bruta con la misma definición: la ventana de cada compra son las compras del
+# ticker de los `dias` días anteriores hasta ella (en orden de fecha estable); las ventanas válidas
+# que se solapan forman un cluster
+def clusters_fuerza_bruta(df, dias, min_insiders, min_importe):
+    compras = df[(df['Cantidad'] > 0) & df[COLUMNA_FECHA].notna()]
+    compras = compras.iloc[np.argsort(compras[COLUMNA_FECHA].to_numpy(), kind='stable')]
+    filas = []
+    for ticker, grupo in compras.groupby(compras['Ticker'].astype(str), sort=False):
+        fechas = grupo[COLUMNA_FECHA].to_numpy().astype('datetime64[D]').astype(np.int64).tolist()
+        nombres = grupo['Nombre'].astype(str).tolist()
+        acciones = grupo['Cantidad'].to_numpy(dtype=np.float64)
+        importes = acciones * np.nan_to_num(grupo['Precio de Transacción'].to_numpy(dtype=np.float64))
+        rangos = []
+        for r in range(len(fechas)):
+            izquierda = bisect_left(fechas, fechas[r] - dias + 1)
+            if len(set(nombres[izquierda:r + 1])) >= min_insiders and importes[izquierda:r + 1].sum() >= min_importe:
+                if rangos and izquierda <= rangos[-1][1]:
+                    rangos[-1][1] = r
+                else:
+                    rangos.append([izquierda, r])
+        for primera, ultima in rangos:
+            insiders = sorted(set(nombres[primera:ultima + 1]))
+            filas.append((ticker, fechas[primera], fechas[ultima], len(insiders), ultima - primera + 1,
+                          float(acciones[primera:ultima + 1].sum()), float(importes[primera:ultima + 1].sum()),
+                          ', '.join(insiders)))
+    return _a_frame(filas)
+
+
+def comprobar(esperado, obtenido, contexto):
+    assert len(esperado) == len(obtenido), f"{contexto}: {len(esperado)} clusters esperados, {len(obtenido)} obtenidos"
+    for columna in COLUMNAS_CLUSTER:
+        a, b = esperado[columna].to_numpy(), obtenido[columna].to_numpy()
+        if columna == 'Importe':
+            assert np.allclose(a, b, rtol=1e-9, atol=0.01), f"{contexto}: '{columna}' no coincide"
+        else:
+            assert (a == b).all(), f"{contexto}: '{columna}' no coincide"
+
+
+def simular(filas, dias, min_insiders, min_importe, lotes, semilla, verificar):
+    # Unas 250 compras por ticker en cinco años: hay ventanas con y sin suficientes insiders
+    df, _ = generar_transacciones(filas, n_tickers=max(1, filas // 500), n_insiders=max(10, filas // 20),
+                                  semilla=semilla)
+    df = df.sort_values(COLUMNA_FECHA, kind='stable', ignore_index=True)
+
+    inicio = time.perf_counter()
+    completo = detectar_clusters(df, dias, min_insiders, min_importe)
+    t_completo = time.perf_counter() - inicio
+
+    # Lotes contiguos en orden de fecha, como llegarían en sucesivos sondeos; uno de cada cuatro
+    # lotes trae también compras atrasadas, que se quitan del lote en que les tocaba
+    rng = np.random.default_rng(semilla)
+    partes = np.array_split(np.arange(len(df)), lotes)
+    atrasadas = {}
+    for i in range(0, len(partes) - 1, 4):
+        elegidas = rng.choice(partes[i], size=len(partes[i]) // 10, replace=False)
+        destino = int(rng.integers(i + 1, len(partes)))
+        atrasadas.setdefault(destino, []).extend(elegidas.tolist())
+        partes[i] = np.setdiff1d(partes[i], elegidas)
+    detector = DetectorClusters(dias, min_insiders, min_importe)
+    t_lotes = 0.0
+    for i, parte in enumerate(partes):
+        bloque = df.iloc[np.concatenate([parte, np.array(atrasadas.get(i, []), dtype=np.int64)])]
+        inicio = time.perf_counter()
+        detector.actualizar(bloque)
+        t_lotes += time.perf_counter() - inicio
+    incremental = detector.clusters()
+
+    if verificar:
+        comprobar(clusters_fuerza_bruta(df, dias, min_insiders, min_importe), completo, 'Fuerza bruta')
+        comprobar(completo, incremental, 'Incremental')
+    return len(completo), t_completo, t_lotes / len(partes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detección de compras en grupo: fuerza bruta, lote e incremental')
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--dias', type=int, default=14)
+    parser.add_argument('--insiders', type=int, default=3)
+    parser.add_argument('--importe', type=float, default=0.0)
+    parser.add_argument('--lotes', type=int, default=20)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--sin-verificar', action='store_true', help='Solo mide tiempos')
+    args = parser.parse_args()
+
+    print(f"{'filas':>12} {'clusters':>9} {'completo (s)':>13} {'lote (ms)':>10}")
+    for filas in args.filas:
+        clusters, completo, lote = simular(filas, args.dias, args.insiders, args.importe, args.lotes, args.semilla,
+                                           not args.sin_verificar)
+        print(f"{filas:>12,} {clusters:>9,} {completo:>13.3f} {lote * 1000:>10.2f}")
+    if not args.sin_verificar:
+        print("Los clusters coinciden con la fuerza bruta y con el detector actualizado por lotes.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# Micro-benchmark del motor de resúmenes: compara el crear_resumen original (apply fila a fila)
+# con insider.resumen y muestra el tiempo por fila para comprobar que escala linealmente.
+#
+#   python -m benchmarks.bench_resumen --filas 10000 100000 1000000 3000000
+import argparse
+import time
+
+from benchmarks.sintetico import generar_transacciones
+from insider.resumen import resumir_transacciones
+
+
+# Implementación original de crear_resumen, conservada solo como referencia
+def resumen_legado(df_compras, df_ventas, total_acciones):
+    def procesar_resumen(df, tipo):
+        resumen = df.groupby('Ticker', observed=True).agg({'Cantidad': 'sum', 'Precio de Transacción': 'mean'}).reset_index()
+        resumen['Total Acciones'] = resumen['Ticker'].apply(lambda x: total_acciones.get(x, 0))
+        resumen[f'Porcentaje {tipo}'] = resumen.apply(
+            lambda row: (abs(row['Cantidad']) / row['Total Acciones']) * 100 if row['Total Acciones'] > 0 else 0,
+            axis=1
+        )
+        return resumen
+    return procesar_resumen(df_compras, 'Comprado'), procesar_resumen(df_ventas, 'Vendido')
+
+
+def cronometrar(funcion, repeticiones=3):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del motor de resúmenes')
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'filas':>12} {'legado (s)':>12} {'vectorizado (s)':>16} {'ns/fila':>10}")
+    for filas in args.filas:
+        df, total_acciones = generar_transacciones(filas)
+        compras, ventas = df[df['Cantidad'] > 0], df[df['Cantidad'] < 0]
+        legado = cronometrar(lambda: resumen_legado(compras, ventas, total_acciones), args.repeticiones)
+        nuevo = cronometrar(lambda: resumir_transacciones(df, total_acciones), args.repeticiones)
+        print(f"{filas:>12,} {legado:>12.4f} {nuevo:>16.4f} {nuevo / filas * 1e9:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
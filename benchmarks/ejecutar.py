@@ -0,0 +1,141 @@
+# Suite de benchmarks del pipeline completo sin acceso a Finnhub ni a Yahoo. Mide el tiempo y el pico
+# de memoria (tracemalloc) de cada etapa:
+#   - con datos sintéticos de 1k a 10M filas (ingesta, división, filtro, formato y resumen, y la cadena
+#     completa frente a la consulta fusionada);
+#   - reproduciendo fixtures grabadas con latencia simulada (descarga y acciones en circulación).
+#
+#   python -m benchmarks.ejecutar --filas 1000 100000 1000000 10000000
+#   python -m benchmarks.ejecutar --fixtures fixtures --latencia 0.08 --json actual.json --comparar base.json
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+from benchmarks.replay import InfoReplay, ServidorReplay, tickers_fixtures
+from benchmarks.sintetico import cargas_repetidas
+from insider import descarga
+from insider.acciones import ResolutorAcciones
+from insider.consulta import Consulta
+from insider.ingesta import construir_transacciones
+from insider.pipeline import (crear_resumen, dividir_compras_ventas, filtrar_por_fecha, formatear_fecha,
+                              obtener_acciones_totales, obtener_transacciones_multiples_tickers)
+
+
+# Ejecuta `funcion` y devuelve su resultado junto con el tiempo y el pico de memoria de la etapa
+def medir(resultados, escenario, etapa, funcion, memoria=True):
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    valor = funcion()
+    segundos = time.perf_counter() - inicio
+    pico = 0
+    if memoria:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    resultados.append({'escenario': escenario, 'etapa': etapa, 'segundos': segundos, 'pico_mb': pico / 2**20})
+    return valor
+
+
+# Etapas que no dependen de la red, comunes a ambos escenarios
+def etapas_locales(resultados, escenario, df, total_acciones, dias, memoria):
+    compras, ventas = medir(resultados, escenario, 'dividir_compras_ventas', lambda: dividir_compras_ventas(df), memoria)
+    compras, ventas = medir(resultados, escenario, 'filtrar_por_fecha',
+                            lambda: (filtrar_por_fecha(compras, dias), filtrar_por_fecha(ventas, dias)), memoria)
+    medir(resultados, escenario, 'crear_resumen', lambda: crear_resumen(compras, ventas, total_acciones), memoria)
+    medir(resultados, escenario, 'formatear_fecha', lambda: (formatear_fecha(compras), formatear_fecha(ventas)), memoria)
+
+    # La misma salida con la cadena de etapas completa y con la consulta fusionada (pico de memoria comparable)
+    def cadena():
+        compras, ventas = dividir_compras_ventas(df)
+        compras, ventas = filtrar_por_fecha(compras, dias), filtrar_por_fecha(ventas, dias)
+        return formatear_fecha(compras), formatear_fecha(ventas), *crear_resumen(compras, ventas, total_acciones)
+
+    medir(resultados, escenario, 'cadena completa', cadena, memoria)
+    medir(resultados, escenario, 'consulta fusionada', lambda: Consulta(df).ventana(dias).salidas(
+        'compras', 'ventas', 'resumen_compras', 'resumen_ventas').ejecutar(total_acciones), memoria)
+
+
+def escenario_sintetico(resultados, filas, n_tickers, dias, memoria):
+    escenario = f'sintetico-{filas}'
+    cargas = cargas_repetidas(filas, n_tickers)
+    df = medir(resultados, escenario, 'ingesta', lambda: construir_transacciones(cargas), memoria)
+    total_acciones = {str(t): 1_000_000_000 for t in df['Ticker'].cat.categories}
+    etapas_locales(resultados, escenario, df, total_acciones, dias, memoria)
+
+
+def escenario_replay(resultados, directorio, latencia, dias, memoria, hilos):
+    escenario = f'replay-{latencia * 1000:.0f}ms'
+    tickers = tickers_fixtures(directorio)
+    with ServidorReplay(directorio, latencia) as servidor:
+        url_original = descarga.FINNHUB_URL
+        descarga.FINNHUB_URL = servidor.url
+        try:
+            df = medir(resultados, escenario, 'obtener_transacciones_insiders', lambda: obtener_transacciones_multiples_tickers(
+                tickers, max_workers=hilos, llamadas_por_minuto=1_000_000, api_key='replay'), memoria)
+        finally:
+            descarga.FINNHUB_URL = url_original
+
+    resolutor = ResolutorAcciones(':memory:', obtener_info=InfoReplay(directorio, latencia), max_workers=hilos)
+    medir(resultados, escenario, 'obtener_acciones_totales (frío)', lambda: obtener_acciones_totales(tickers, resolutor), memoria)
+    total_acciones = medir(resultados, escenario, 'obtener_acciones_totales (caliente)',
+                           lambda: obtener_acciones_totales(tickers, resolutor), memoria)
+    resolutor.cerrar()
+    etapas_locales(resultados, escenario, df, total_acciones, dias, memoria)
+
+
+def imprimir(resultados):
+    print(f"{'escenario':<22} {'etapa':<38} {'segundos':>10} {'pico MB':>10}")
+    for r in resultados:
+        print(f"{r['escenario']:<22} {r['etapa']:<38} {r['segundos']:>10.4f} {r['pico_mb']:>10.1f}")
+
+
+# Compara con una ejecución anterior y devuelve las etapas que empeoran más de `tolerancia`
+def regresiones(resultados, base, tolerancia):
+    anteriores = {(r['escenario'], r['etapa']): r for r in base}
+    encontradas = []
+    for r in resultados:
+        previo = anteriores.get((r['escenario'], r['etapa']))
+        if previo and previo['segundos'] > 0 and r['segundos'] > previo['segundos'] * (1 + tolerancia):
+            encontradas.append((r['escenario'], r['etapa'], previo['segundos'], r['segundos']))
+    return encontradas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks del pipeline sin red')
+    parser.add_argument('--filas', type=int, nargs='*', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--tickers', type=int, default=500, help='Tickers de los escenarios sintéticos')
+    parser.add_argument('--fixtures', help='Directorio de fixtures para el escenario de reproducción')
+    parser.add_argument('--latencia', type=float, default=0.05, help='Latencia simulada media (s) por petición')
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--sin-memoria', action='store_true', help='No medir memoria (tracemalloc ralentiza)')
+    parser.add_argument('--json', help='Guarda los resultados en este fichero')
+    parser.add_argument('--comparar', help='Resultados anteriores con los que detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Empeoramiento relativo admitido')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    memoria = not args.sin_memoria
+    resultados = []
+    for filas in args.filas:
+        escenario_sintetico(resultados, filas, args.tickers, args.dias, memoria)
+    if args.fixtures:
+        escenario_replay(resultados, args.fixtures, args.latencia, args.dias, memoria, args.hilos)
+    imprimir(resultados)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            encontradas = regresiones(resultados, json.load(f), args.tolerancia)
+        for escenario, etapa, antes, ahora in encontradas:
+            print(f"REGRESIÓN {escenario} / {etapa}: {antes:.4f} s -> {ahora:.4f} s")
+        if encontradas:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
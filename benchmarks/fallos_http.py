@@ -0,0 +1,132 @@
+# Comprueba el comportamiento del cliente de Finnhub (insider.http) ante fallos inyectados por el
+# servidor de replay: reintentos tras 429 (respetando Retry-After) y 503, tiempo de espera ante
+# respuestas lentas o cortadas, apertura del cortacircuitos tras fallos seguidos, rechazo inmediato
+# mientras está abierto y cierre (o reapertura) tras la petición de prueba, y un token del limitador
+# por cada intento. También carga el universo de tickers a través del cliente. No necesita red ni
+# clave de API.
+#
+#   python -m benchmarks.fallos_http --fixtures fixtures
+import argparse
+import os
+import tempfile
+import time
+from functools import partial
+
+from benchmarks.replay import ServidorReplay, generar_fixtures
+from insider.descarga import descargar_concurrente
+from insider.http import CircuitoAbierto, ClienteFinnhub, Cortacircuitos, ErrorTransitorio
+from insider.universo import cargar_universo
+
+
+# Limitador que no espera y solo cuenta los tokens pedidos
+class LimitadorContador:
+    def __init__(self):
+        self.tokens = 0
+
+    def adquirir(self):
+        self.tokens += 1
+        return 0.0
+
+
+def _cliente(servidor, timeout, umbral_fallos=3, segundos_apertura=0.5):
+    return ClienteFinnhub('prueba', base_url=servidor.url, timeout=timeout, reintentos=4, espera_inicial=0.01,
+                          espera_maxima=0.05, cortacircuitos=Cortacircuitos(umbral_fallos, segundos_apertura))
+
+
+# Ejecuta `funcion` y devuelve (resultado o excepción, peticiones que ha recibido el servidor, segundos)
+def _medir(servidor, funcion):
+    antes = servidor.peticiones
+    inicio = time.perf_counter()
+    try:
+        resultado = funcion()
+    except Exception as e:
+        resultado = e
+    return resultado, servidor.peticiones - antes, time.perf_counter() - inicio
+
+
+def comprobar(directorio, ticker, lentitud, timeout):
+    with ServidorReplay(directorio, lentitud=lentitud, retry_after=0) as servidor:
+        cliente = _cliente(servidor, timeout)
+        pedir = partial(cliente.transacciones_insiders, ticker)
+        esperadas, _, _ = _medir(servidor, pedir)
+        assert isinstance(esperadas, list) and esperadas, "Sin fallos, la petición debe devolver las fixtures"
+
+        servidor.inyectar(429, 429)
+        resultado, peticiones, _ = _medir(servidor, pedir)
+        assert resultado == esperadas and peticiones == 3, "Un 429 con Retry-After se reintenta"
+        assert cliente.cortacircuitos.estado == 'cerrado', "Un 429 no cuenta para abrir el circuito"
+        print(f"429 x2:     {peticiones} peticiones, correcto")
+
+        servidor.inyectar(503, 503)
+        resultado, peticiones, _ = _medir(servidor, pedir)
+        assert resultado == esperadas and peticiones == 3, "Un 503 se reintenta"
+        print(f"503 x2:     {peticiones} peticiones, correcto")
+
+        servidor.inyectar('lento')
+        resultado, peticiones, segundos = _medir(servidor, pedir)
+        assert resultado == esperadas and peticiones == 2, "Una respuesta lenta agota el tiempo y se reintenta"
+        assert segundos < lentitud, "El cliente no debe esperar a la respuesta lenta"
+        print(f"lenta:      {peticiones} peticiones en {segundos:.2f} s (el servidor tardaba {lentitud} s), correcto")
+
+        servidor.inyectar(*[503] * cliente.cortacircuitos.umbral_fallos)
+        resultado, peticiones, _ = _medir(servidor, pedir)
+        assert isinstance(resultado, (ErrorTransitorio, CircuitoAbierto)), "Tras agotar los reintentos se propaga el error"
+        assert cliente.cortacircuitos.estado == 'abierto', "`umbral_fallos` fallos seguidos abren el circuito"
+        print(f"503 x{peticiones}:     {peticiones} peticiones, {type(resultado).__name__}, circuito abierto")
+
+        resultado, peticiones, _ = _medir(servidor, pedir)
+        assert isinstance(resultado, CircuitoAbierto) and peticiones == 0, "Con el circuito abierto no se pide nada"
+        print(f"abierto:    {peticiones} peticiones, {type(resultado).__name__}")
+
+        # Una prueba que falla con un error que no es de conexión (cuerpo cortado) reabre el circuito
+        time.sleep(cliente.cortacircuitos.segundos_apertura)
+        servidor.inyectar('cortado')
+        resultado, peticiones, _ = _medir(servidor, pedir)
+        assert peticiones == 1 and cliente.cortacircuitos.estado == 'abierto', "Una prueba fallida reabre el circuito"
+        assert not cliente.cortacircuitos.prueba_en_curso, "La prueba fallida no queda en curso"
+        print(f"prueba cortada: {peticiones} petición, {type(resultado).__name__}, circuito reabierto")
+
+        time.sleep(cliente.cortacircuitos.segundos_apertura)
+        resultado, peticiones, _ = _medir(servidor, pedir)
+        assert resultado == esperadas and peticiones == 1, "La petición de prueba pasa al cerrarse el plazo"
+        assert cliente.cortacircuitos.estado == 'cerrado', "Una prueba correcta cierra el circuito"
+        print(f"semiabierto: {peticiones} petición de prueba, circuito cerrado")
+
+        servidor.inyectar('cortado')
+        resultado, peticiones, _ = _medir(servidor, pedir)
+        assert resultado == esperadas and peticiones == 2, "Un cuerpo cortado se reintenta"
+        print(f"cortada:    {peticiones} peticiones, correcto")
+
+        # Dentro de `descargar_concurrente`, cada intento (también los reintentos) consume un token
+        limitador = LimitadorContador()
+        servidor.inyectar(503, 429)
+        resultados, peticiones, _ = _medir(servidor, partial(descargar_concurrente, [ticker], cliente.transacciones_insiders,
+                                                             limitador=limitador))
+        assert resultados[0].ok and limitador.tokens == peticiones == 3, "Cada intento consume un token"
+        print(f"limitador:  {limitador.tokens} tokens para {peticiones} peticiones")
+
+        servidor.inyectar(503, 'lento')
+        tickers, peticiones, _ = _medir(servidor, partial(cargar_universo, cliente=cliente))
+        assert isinstance(tickers, list) and ticker in tickers and peticiones == 3, "El universo se carga con reintentos"
+        print(f"universo:   {len(tickers)} tickers en {peticiones} peticiones, correcto")
+        cliente.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reintentos, tiempos de espera y cortacircuitos ante fallos inyectados')
+    parser.add_argument('--fixtures', help='Directorio de fixtures (por defecto, unas sintéticas temporales)')
+    parser.add_argument('--lentitud', type=float, default=1.0, help='Segundos que tarda una respuesta lenta')
+    parser.add_argument('--timeout', type=float, default=0.3, help='Tiempo de espera de lectura del cliente')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporal:
+        directorio = args.fixtures or temporal
+        if not os.path.isdir(os.path.join(directorio, 'finnhub')):
+            generar_fixtures(directorio, 2_000, 20)
+        ticker = sorted(f[:-len('.json')] for f in os.listdir(os.path.join(directorio, 'finnhub')))[0]
+        comprobar(directorio, ticker, args.lentitud, (1.0, args.timeout))
+    print("El cliente reintenta, agota los tiempos de espera y abre y cierra el cortacircuitos como se espera.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# Grabación y reproducción de respuestas de Finnhub y yfinance para medir el pipeline sin red.
+#
+# Estructura del directorio de fixtures:
+#   finnhub/<TICKER>.json   respuesta completa de /stock/insider-transactions
+#   yfinance/<TICKER>.json  diccionario `.info` de yf.Ticker
+#
+#   python -m benchmarks.replay grabar AAPL MSFT --fixtures fixtures   (requiere red y clave)
+#   python -m benchmarks.replay sintetico --filas 100000 --tickers 150 --fixtures fixtures
+#
+# `ServidorReplay` también puede inyectar fallos (429, 5xx o respuestas lentas) para comprobar los
+# reintentos, los tiempos de espera y el cortacircuitos del cliente: python -m benchmarks.fallos_http
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from benchmarks.sintetico import info_ticker, iterar_registros
+
+
+def _ruta(directorio, fuente, ticker):
+    return os.path.join(directorio, fuente, f'{ticker}.json')
+
+
+def _guardar(ruta, datos):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+
+
+# Graba las respuestas reales de Finnhub y yfinance de los tickers indicados
+def grabar_fixtures(tickers, directorio, api_key=None):
+    from insider.acciones import _obtener_info_yfinance
+    from insider.pipeline import descargar
+    for ticker in tickers:
+        _guardar(_ruta(directorio, 'finnhub', ticker), {'data': descargar(ticker, api_key=api_key), 'symbol': ticker})
+        _guardar(_ruta(directorio, 'yfinance', ticker), _obtener_info_yfinance(ticker))
+
+
+# Escribe fixtures sintéticas con `filas` transacciones repartidas entre `n_tickers`
+def generar_fixtures(directorio, filas, n_tickers, semilla=0):
+    rng = np.random.default_rng(semilla)
+    tickers = []
+    for ticker, registros in iterar_registros(filas, n_tickers, semilla=semilla):
+        _guardar(_ruta(directorio, 'finnhub', ticker), {'data': registros, 'symbol': ticker})
+        _guardar(_ruta(directorio, 'yfinance', ticker), info_ticker(ticker, rng))
+        tickers.append(ticker)
+    return tickers
+
+
+def tickers_fixtures(directorio):
+    return sorted(f[:-len('.json')] for f in os.listdir(os.path.join(directorio, 'finnhub')) if f.endswith('.json'))
+
+
+def _latencia(media, variacion):
+    if media > 0:
+        time.sleep(max(0.0, random.gauss(media, variacion * media)))
+
+
+# Servidor HTTP local que imita /stock/insider-transactions devolviendo las fixtures grabadas (y
+# /stock/symbol con sus tickers), con una latencia simulada de `latencia` segundos de media
+# (± `variacion` relativa). Las primeras peticiones pueden fallar según `fallos`, en orden: un código
+# HTTP (429 lleva Retry-After si `retry_after` no es None), 'lento', que responde tras `lentitud`
+# segundos, o 'cortado', que corta el cuerpo de la respuesta. `fallos` puede ampliarse con `inyectar`;
+# `peticiones` cuenta las recibidas.
+class ServidorReplay:
+    def __init__(self, directorio, latencia=0.0, variacion=0.2, fallos=(), lentitud=1.0, retry_after=None):
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fallo = servidor._siguiente_fallo()
+                if fallo == 'lento':
+                    time.sleep(servidor.lentitud)
+                elif fallo == 'cortado':
+                    # Anuncia un cuerpo más largo del que envía y cierra la conexión
+                    self.send_response(200)
+                    self.send_header('Content-Length', '1000')
+                    self.end_headers()
+                    self.wfile.write(b'{"data": [')
+                    self.close_connection = True
+                    return
+                elif fallo is not None:
+                    self.send_response(fallo)
+                    if fallo == 429 and servidor.retry_after is not None:
+                        self.send_header('Retry-After', str(servidor.retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                _latencia(servidor.latencia, servidor.variacion)
+                url = urlparse(self.path)
+                if url.path.endswith('/stock/symbol'):
+                    cuerpo = json.dumps([{'symbol': t, 'type': 'Common Stock'}
+                                         for t in tickers_fixtures(servidor.directorio)]).encode()
+                else:
+                    ruta = _ruta(servidor.directorio, 'finnhub', parse_qs(url.query).get('symbol', [''])[0])
+                    cuerpo = b'{"data": []}'
+                    if os.path.exists(ruta):
+                        with open(ruta, 'rb') as f:
+                            cuerpo = f.read()
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(cuerpo)))
+                    self.end_headers()
+                    self.wfile.write(cuerpo)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente dejó de esperar (p. ej. tras una respuesta lenta inyectada)
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.directorio = directorio
+        self.latencia = latencia
+        self.variacion = variacion
+        self.fallos = list(fallos)
+        self.lentitud = lentitud
+        self.retry_after = retry_after
+        self.peticiones = 0
+        self.lock = threading.Lock()
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        self.http.daemon_threads = True
+        self.hilo = threading.Thread(target=self.http.serve_forever, daemon=True)
+
+    def _siguiente_fallo(self):
+        with self.lock:
+            self.peticiones += 1
+            return self.fallos.pop(0) if self.fallos else None
+
+    def inyectar(self, *fallos):
+        with self.lock:
+            self.fallos.extend(fallos)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.http.server_port}'
+
+    def __enter__(self):
+        self.hilo.start()
+        return self
+
+    def __exit__(self, *args):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+# Sustituto de `yf.Ticker(t).info` que lee las fixtures (para ResolutorAcciones(obtener_info=...))
+class InfoReplay:
+    def __init__(self, directorio, latencia=0.0, variacion=0.2):
+        self.directorio = directorio
+        self.latencia = latencia
+        self.variacion = variacion
+
+    def __call__(self, ticker):
+        _latencia(self.latencia, self.variacion)
+        with open(_ruta(self.directorio, 'yfinance', ticker), encoding='utf-8') as f:
+            return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Grabación de fixtures para los benchmarks')
+    sub = parser.add_subparsers(dest='orden', required=True)
+    grabar = sub.add_parser('grabar', help='Graba respuestas reales de Finnhub y yfinance')
+    grabar.add_argument('tickers', nargs='+')
+    sintetico = sub.add_parser('sintetico', help='Genera fixtures sintéticas')
+    sintetico.add_argument('--filas', type=int, default=100_000)
+    sintetico.add_argument('--tickers', type=int, default=150)
+    for p in (grabar, sintetico):
+        p.add_argument('--fixtures', default='fixtures')
+    args = parser.parse_args(argv)
+
+    if args.orden == 'grabar':
+        grabar_fixtures([t.upper() for t in args.tickers], args.fixtures)
+    else:
+        generar_fixtures(args.fixtures, args.filas, args.tickers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+# Libro de Google Sheets en memoria con la parte de la API de gspread que usa
+# `insider.exportar.SumideroGoogleSheets` (`worksheet`, `get_all_values`, `batch_update`, `append_rows`,
+# `row_count`, `col_count` y `resize`), que además cuenta las llamadas. Como módulo, comprueba con él
+# que el destino de Sheets deja cada hoja igual que la composición de sus tablas enviando solo las
+# filas que cambian. No necesita red ni credenciales.
+#
+#   python -m benchmarks.sheets_falso --filas 2000
+import argparse
+import re
+
+from benchmarks.sintetico import generar_transacciones
+from insider.exportar import DISPOSICION_SHEETS, SumideroGoogleSheets, componer_hoja
+from insider.pipeline import dividir_compras_ventas
+from insider.resumen import resumir_transacciones
+
+_RANGO = re.compile(r'^([A-Z]+)(\d+):([A-Z]+)(\d+)$')
+
+
+def _numero_columna(letras):
+    numero = 0
+    for letra in letras:
+        numero = numero * 26 + ord(letra) - 64
+    return numero
+
+
+# Hoja en memoria; como en Sheets, escribir fuera de la cuadrícula es un error y hay que redimensionar
+class HojaFalsa:
+    def __init__(self, titulo, filas=1000, columnas=26):
+        self.title = titulo
+        self.row_count = filas
+        self.col_count = columnas
+        self.celdas = []
+        self.llamadas = {}
+
+    def _contar(self, metodo):
+        self.llamadas[metodo] = self.llamadas.get(metodo, 0) + 1
+
+    def _escribir(self, fila, columna, valores):
+        for i, valores_fila in enumerate(valores):
+            if fila + i >= self.row_count or columna + len(valores_fila) > self.col_count:
+                raise ValueError(f"Rango fuera de la cuadrícula de '{self.title}' ({self.row_count}x{self.col_count})")
+            while len(self.celdas) <= fila + i:
+                self.celdas.append([])
+            actual = self.celdas[fila + i]
+            actual.extend([''] * (columna + len(valores_fila) - len(actual)))
+            actual[columna:columna + len(valores_fila)] = ['' if v is None else str(v) for v in valores_fila]
+
+    # Como gspread: sin las filas y columnas vacías del final
+    def get_all_values(self):
+        self._contar('get_all_values')
+        filas = [list(f) for f in self.celdas]
+        while filas and not any(filas[-1]):
+            filas.pop()
+        ancho = max((max((i + 1 for i, v in enumerate(f) if v), default=0) for f in filas), default=0)
+        return [f[:ancho] + [''] * (ancho - len(f[:ancho])) for f in filas]
+
+    def batch_update(self, datos, value_input_option=None):
+        self._contar('batch_update')
+        for cambio in datos:
+            columna, fila, _, _ = _RANGO.match(cambio['range']).groups()
+            self._escribir(int(fila) - 1, _numero_columna(columna) - 1, cambio['values'])
+
+    # Añade las filas debajo de la última fila con datos de la columna A (la tabla que empieza en A1)
+    def append_rows(self, valores, value_input_option=None, table_range=None):
+        self._contar('append_rows')
+        ultima = max((i + 1 for i, f in enumerate(self.celdas) if f and f[0] != ''), default=0)
+        if ultima + len(valores) > self.row_count:
+            self.row_count = ultima + len(valores)
+        self._escribir(ultima, 0, valores)
+
+    def resize(self, rows=None, cols=None):
+        self._contar('resize')
+        self.row_count = rows if rows is not None else self.row_count
+        self.col_count = cols if cols is not None else self.col_count
+        self.celdas = [f[:self.col_count] for f in self.celdas[:self.row_count]]
+
+
+class LibroFalso:
+    def __init__(self, hojas=tuple(DISPOSICION_SHEETS), filas=1000, columnas=26):
+        self.hojas = {nombre: HojaFalsa(nombre, filas, columnas) for nombre in hojas}
+
+    def worksheet(self, nombre):
+        return self.hojas[nombre]
+
+    def llamadas(self, metodo):
+        return sum(hoja.llamadas.get(metodo, 0) for hoja in self.hojas.values())
+
+
+def _tablas(df, total_acciones):
+    df_compras, df_ventas = dividir_compras_ventas(df)
+    resumen_compras, resumen_ventas, _ = resumir_transacciones(df, total_acciones)
+    return {'Compras': df_compras, 'Ventas': df_ventas,
+            'Resumen Compras': resumen_compras, 'Resumen Ventas': resumen_ventas}
+
+
+def _igual(libro, tablas):
+    for nombre, componentes in DISPOSICION_SHEETS.items():
+        esperado = [[str(v) for v in fila] for fila in componer_hoja([tablas[t] for t in componentes if t in tablas])]
+        obtenido = libro.worksheet(nombre).get_all_values()
+        ancho = max([len(f) for f in esperado] + [len(f) for f in obtenido] + [0])
+        esperado = [f + [''] * (ancho - len(f)) for f in esperado]
+        while esperado and not any(esperado[-1]):
+            esperado.pop()
+        obtenido = [f + [''] * (ancho - len(f)) for f in obtenido]
+        assert esperado == obtenido, f"La hoja '{nombre}' no coincide con sus tablas"
+
+
+def comprobar(filas, semilla):
+    df, total_acciones = generar_transacciones(filas, n_tickers=20, semilla=semilla)
+    df = df.reset_index(drop=True)
+    libro = LibroFalso(columnas=10)
+    sumidero = SumideroGoogleSheets(libro)
+
+    tablas = _tablas(df, total_acciones)
+    sumidero.escribir(tablas)
+    _igual(libro, tablas)
+    assert libro.llamadas('resize') >= 1, "Tablas mayores que la cuadrícula obligan a redimensionar"
+    print(f"primera escritura: {libro.llamadas('batch_update')} batch_update, {libro.llamadas('resize')} resize")
+
+    antes = libro.llamadas('batch_update')
+    sumidero.escribir(tablas)
+    assert libro.llamadas('batch_update') == antes, "Sin cambios no se escribe nada"
+    print("sin cambios:       0 batch_update")
+
+    # Unas pocas filas cambian: una sola llamada por hoja afectada, con solo esas filas
+    cambiado = df.copy()
+    cambiado.loc[cambiado.index[:3], 'Precio de Transacción'] += 1.0
+    tablas = _tablas(cambiado, total_acciones)
+    antes = libro.llamadas('batch_update')
+    sumidero.escribir(tablas)
+    _igual(libro, tablas)
+    assert libro.llamadas('batch_update') - antes <= len(DISPOSICION_SHEETS), "Una llamada por hoja como máximo"
+    print(f"3 filas cambiadas: {libro.llamadas('batch_update') - antes} batch_update")
+
+    # Menos filas: las que sobran quedan vacías
+    tablas = _tablas(cambiado.iloc[:len(cambiado) // 2], total_acciones)
+    sumidero.escribir(tablas)
+    _igual(libro, tablas)
+    print("tablas más cortas: filas sobrantes vaciadas")
+
+    # Un destino nuevo sobre el mismo libro (reinicio del proceso) lee cada hoja una vez y no reescribe
+    otro = SumideroGoogleSheets(libro)
+    antes, lecturas = libro.llamadas('batch_update'), libro.llamadas('get_all_values')
+    otro.escribir(tablas)
+    assert libro.llamadas('batch_update') == antes, "Tras reiniciar, lo ya escrito no se reenvía"
+    print(f"reinicio:          {libro.llamadas('get_all_values') - lecturas} get_all_values, 0 batch_update")
+
+    # `anadir` agrega filas bajo la primera tabla y la siguiente escritura vuelve a leer la hoja
+    nuevas = cambiado.iloc[len(cambiado) // 2:len(cambiado) // 2 + 10]
+    df_compras, df_ventas = dividir_compras_ventas(nuevas)
+    otro.anadir({'Compras': df_compras, 'Ventas': df_ventas})
+    primera = [str(v) for v in componer_hoja([df_compras])[1]]
+    anadida = libro.worksheet('Compras').get_all_values()[len(tablas['Compras']) + 1]
+    assert anadida[:len(primera)] == primera and not any(anadida[len(primera):]), "Las filas se añaden bajo la tabla"
+    tablas = _tablas(cambiado.iloc[:len(cambiado) // 2 + 10], total_acciones)
+    lecturas = libro.llamadas('get_all_values')
+    otro.escribir(tablas)
+    assert libro.llamadas('get_all_values') > lecturas, "Tras añadir, la hoja se vuelve a leer"
+    _igual(libro, tablas)
+    print(f"añadir:            {len(df_compras)} compras y {len(df_ventas)} ventas añadidas y reescritas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Destino de Google Sheets contra un libro en memoria')
+    parser.add_argument('--filas', type=int, default=2000)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+    comprobar(args.filas, args.semilla)
+    print("El destino de Sheets deja cada hoja igual que sus tablas enviando solo las filas que cambian.")
+
+
+if __name__ == '__main__':
+    main()
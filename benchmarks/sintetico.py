@@ -0,0 +1,79 @@
+# Generadores de datos sintéticos para los benchmarks: cargas con la forma de la respuesta de
+# Finnhub (/stock/insider-transactions) y frames ya ingeridos, de 1k a 10M filas.
+import numpy as np
+import pandas as pd
+
+CODIGOS = np.array(['P', 'S', 'M', 'A', 'F'])
+
+
+def _tickers(n_tickers):
+    return [f'T{i:04d}' for i in range(n_tickers)]
+
+
+# Genera los registros en bruto de un ticker
+def registros_ticker(ticker, filas, rng, n_insiders=200, dias=1800, hoy=None):
+    hoy = pd.Timestamp(hoy or pd.Timestamp.today().normalize())
+    fechas = (hoy - pd.to_timedelta(rng.integers(0, dias, filas), unit='D')).strftime('%Y-%m-%d')
+    cantidades = rng.integers(1, 50_000, filas) * rng.choice([-1, 1], filas)
+    precios = rng.uniform(1, 500, filas).round(2)
+    restantes = rng.integers(0, 10_000_000, filas)
+    codigos = CODIGOS[rng.integers(0, len(CODIGOS), filas)]
+    insiders = rng.integers(0, n_insiders, filas)
+    return [{
+        'id': f'{ticker}-{i}',
+        'symbol': ticker,
+        'name': f'APELLIDO{insiders[i]} NOMBRE{insiders[i] % 37}',
+        'change': int(cantidades[i]),
+        'transactionPrice': float(precios[i]),
+        'share': int(restantes[i]),
+        'transactionDate': fechas[i],
+        'filingDate': fechas[i],
+        'transactionCode': str(codigos[i]),
+    } for i in range(filas)]
+
+
+# Itera pares (ticker, registros) repartiendo `filas` entre `n_tickers`, generando un ticker cada vez
+# para que la memoria de la carga en bruto no crezca con el total de filas
+def iterar_registros(filas, n_tickers=500, semilla=0, **kwargs):
+    rng = np.random.default_rng(semilla)
+    base, resto = divmod(filas, n_tickers)
+    for i, ticker in enumerate(_tickers(n_tickers)):
+        yield ticker, registros_ticker(ticker, base + (1 if i < resto else 0), rng, **kwargs)
+
+
+# Respuesta de yfinance `.info` sintética para un ticker
+def info_ticker(ticker, rng):
+    opcion = rng.integers(0, 4)
+    total = int(rng.integers(1_000_000, 10_000_000_000))
+    if opcion == 0:
+        return {'sharesOutstanding': total}
+    if opcion == 1:
+        return {'floatShares': total}
+    if opcion == 2:
+        return {'marketCap': total * 50.0, 'currentPrice': 50.0}
+    return {}
+
+
+# Genera directamente un frame con el esquema de insider.ingesta y `filas` transacciones aleatorias
+def generar_transacciones(filas, n_tickers=500, n_insiders=5000, semilla=0):
+    rng = np.random.default_rng(semilla)
+    tickers = _tickers(n_tickers)
+    insiders = [f'Insider {i}' for i in range(n_insiders)]
+    cantidad = rng.integers(1, 50_000, filas) * rng.choice([-1, 1], filas)
+    return pd.DataFrame({
+        'Nombre': pd.Categorical.from_codes(rng.integers(0, n_insiders, filas), insiders),
+        'Cantidad': cantidad.astype('int64'),
+        'Precio de Transacción': rng.uniform(1, 500, filas).round(2),
+        'Restantes': rng.integers(0, 10_000_000, filas),
+        'Fecha de Transacción': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1800, filas), unit='D'),
+        'Ticker': pd.Categorical.from_codes(rng.integers(0, n_tickers, filas), tickers),
+    }), {t: int(rng.integers(1_000_000, 10_000_000_000)) for t in tickers}
+
+
+# Pares (ticker, registros) con `filas` transacciones en total en los que todos los tickers comparten
+# el mismo bloque de registros: la carga ocupa la memoria de un solo ticker aunque se pidan 10M filas
+def cargas_repetidas(filas, n_tickers=500, semilla=0):
+    rng = np.random.default_rng(semilla)
+    por_ticker = max(1, filas // n_tickers)
+    bloque = registros_ticker('SINT', por_ticker, rng)
+    return [(ticker, bloque) for ticker in _tickers(max(1, filas // por_ticker))]
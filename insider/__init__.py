@@ -0,0 +1 @@
+# Paquete con los componentes reutilizables del Insider Trading Tracker
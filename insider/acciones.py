@@ -0,0 +1,153 @@
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from insider.descarga import descargar_concurrente
+from insider.metricas import METRICAS
+
+# Campos de `.info` de yfinance que se prueban en orden, de más a menos fiable
+CAMPOS_ACCIONES = ['sharesOutstanding', 'totalSharesOutstanding', 'floatShares']
+FUENTE_ESTIMADA = 'marketCap/currentPrice'
+
+
+# Centinelas tipados para los tickers cuyo total de acciones no se pudo resolver.
+# Se evalúan como falsos para que `if total:` siga funcionando como con el antiguo 0.
+@dataclass(frozen=True)
+class AccionesNoDisponibles:
+    def __bool__(self):
+        return False
+
+
+@dataclass(frozen=True)
+class SinDatosAcciones(AccionesNoDisponibles):
+    pass
+
+
+@dataclass(frozen=True)
+class ErrorAcciones(AccionesNoDisponibles):
+    mensaje: str = ''
+
+
+# Total de acciones resuelto para un ticker junto con el campo que lo produjo
+@dataclass
+class AccionesResueltas:
+    ticker: str
+    total: object
+    fuente: Optional[str]
+    obtenido: float
+
+
+# Convierte un valor del diccionario de acciones en número (0 si es un centinela)
+def acciones_como_numero(valor):
+    if isinstance(valor, AccionesNoDisponibles) or valor is None:
+        return 0
+    return int(valor)
+
+
+# Aplica la cadena de alternativas sobre un único diccionario `.info`
+def resolver_desde_info(info):
+    for campo in CAMPOS_ACCIONES:
+        valor = info.get(campo)
+        if valor is not None:
+            return int(valor), campo
+    market_cap = info.get('marketCap')
+    current_price = info.get('currentPrice')
+    if market_cap is not None and current_price:
+        return int(market_cap / current_price), FUENTE_ESTIMADA
+    return SinDatosAcciones(), None
+
+
+def _obtener_info_yfinance(ticker):
+    import yfinance as yf
+    return yf.Ticker(ticker).info
+
+
+# Resolutor de acciones en circulación con caché persistente (SQLite).
+# Los valores válidos caducan a los `ttl_dias` y los centinelas a las `ttl_error_horas`, de modo que
+# en ejecuciones en caliente no se hace ninguna llamada de red. Los tickers que faltan se piden en
+# paralelo leyendo `.info` una única vez por ticker.
+class ResolutorAcciones:
+    def __init__(self, ruta='insider_acciones.db', ttl_dias=7, ttl_error_horas=1, max_workers=8, obtener_info=None):
+        self.ttl_dias = ttl_dias
+        self.ttl_error_horas = ttl_error_horas
+        self.max_workers = max_workers
+        self.obtener_info = obtener_info or _obtener_info_yfinance
+        self.lock = threading.Lock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.execute('''
+            CREATE TABLE IF NOT EXISTS acciones (
+                ticker TEXT PRIMARY KEY,
+                total INTEGER,
+                fuente TEXT,
+                error TEXT,
+                obtenido REAL NOT NULL
+            )
+        ''')
+
+    def cerrar(self):
+        with self.lock:
+            self.conexion.close()
+
+    def _vigente(self, resuelto, ahora):
+        ttl = self.ttl_dias * 86400 if not isinstance(resuelto.total, AccionesNoDisponibles) else self.ttl_error_horas * 3600
+        return ahora - resuelto.obtenido < ttl
+
+    def _leer_cache(self, tickers):
+        if not tickers:
+            return {}
+        with self.lock:
+            filas = self.conexion.execute(
+                f'SELECT ticker, total, fuente, error, obtenido FROM acciones WHERE ticker IN ({", ".join("?" * len(tickers))})',
+                tickers
+            ).fetchall()
+        cache = {}
+        for ticker, total, fuente, error, obtenido in filas:
+            if error is not None:
+                total = ErrorAcciones(error)
+            elif total is None:
+                total = SinDatosAcciones()
+            cache[ticker] = AccionesResueltas(ticker, total, fuente, obtenido)
+        return cache
+
+    def _guardar_cache(self, resueltos):
+        filas = []
+        for r in resueltos:
+            total = r.total if not isinstance(r.total, AccionesNoDisponibles) else None
+            error = r.total.mensaje if isinstance(r.total, ErrorAcciones) else None
+            filas.append((r.ticker, total, r.fuente, error, r.obtenido))
+        with self.lock, self.conexion:
+            self.conexion.executemany('INSERT OR REPLACE INTO acciones VALUES (?, ?, ?, ?, ?)', filas)
+
+    # Devuelve un AccionesResueltas por ticker, consultando la red solo para los que faltan o caducaron
+    def resolver(self, tickers, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        tickers = list(dict.fromkeys(tickers))
+        cache = self._leer_cache(tickers)
+        resultado = {t: cache[t] for t in tickers if t in cache and self._vigente(cache[t], ahora)}
+        pendientes = [t for t in tickers if t not in resultado]
+        logging.info(f"Acciones en circulación: {len(resultado)} desde caché, {len(pendientes)} por consultar.")
+        METRICAS.contar('insider_cache_aciertos_total', len(resultado), cache='acciones')
+        METRICAS.contar('insider_cache_fallos_total', len(pendientes), cache='acciones')
+
+        nuevos = []
+        for r in descargar_concurrente(pendientes, self.obtener_info, max_workers=self.max_workers):
+            if r.ok:
+                total, fuente = resolver_desde_info(r.datos or {})
+            else:
+                total, fuente = ErrorAcciones(str(r.error)), None
+            if fuente is not None:
+                logging.info(f"Total de acciones ('{fuente}') obtenido para {r.ticker}: {total}")
+            elif r.ok:
+                logging.warning(f"No se encontró información sobre el total de acciones para {r.ticker}.")
+            nuevos.append(AccionesResueltas(r.ticker, total, fuente, ahora))
+        if nuevos:
+            self._guardar_cache(nuevos)
+        resultado.update({r.ticker: r for r in nuevos})
+        return {t: resultado[t] for t in tickers}
+
+    # Diccionario ticker -> total de acciones (o centinela), compatible con `crear_resumen`
+    def totales(self, tickers):
+        return {ticker: r.total for ticker, r in self.resolver(tickers).items()}
@@ -0,0 +1,202 @@
+import heapq
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from insider.fechas import COLUMNA_FECHA
+from insider.metricas import medir_etapa
+from insider.resumen import resumir_agregados
+
+_DIA = np.datetime64(0, 'D')
+
+
+# Número de día (desde 1970) de una fecha; admite date, datetime, Timestamp o texto, y None es hoy
+def _dia(fecha):
+    return int((np.datetime64(pd.Timestamp(fecha or datetime.now()).date(), 'D') - _DIA).astype(np.int64))
+
+
+# Agregados por (ticker, lado) de las transacciones de los últimos `dias` días, mantenidos por deltas:
+# `anadir` suma las transacciones nuevas, `quitar` resta las que se retiran y `avanzar` resta las que
+# salen de la ventana al pasar los días. Cada operación cuesta en proporción a las filas que entran o
+# salen, no al histórico. `agregados()` devuelve lo mismo que `resumen.agregar_por_ticker` sobre el
+# frame de la ventana, así que los resúmenes (con el porcentaje sobre `total_acciones`) son idénticos
+# a los de recalcularlo todo.
+#
+# Las filas de la ventana se guardan agrupadas por día (un montículo con los días pendientes) para
+# saber qué restar al avanzar. Los insiders distintos se cuentan con un contador por (ticker, lado,
+# insider). Las filas con fecha nula nunca entran, igual que en `fechas.ventana_dias`.
+class AgregadosVentana:
+    def __init__(self, dias, hoy=None):
+        self.dias = dias
+        self.limite = _dia(hoy) - dias
+        self.indice_ticker = {}
+        self.tickers = []
+        self.indice_nombre = {}
+        self.transacciones = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros(0, dtype=np.int64)
+        self.importe = np.zeros(0, dtype=np.float64)
+        self.volumen_precio = np.zeros(0, dtype=np.float64)
+        self.insiders = np.zeros(0, dtype=np.int64)
+        self.pares = {}
+        self.por_dia = {}
+        self.pendientes = []
+
+    # Códigos estables de tickers e insiders (solo se consulta el diccionario una vez por valor distinto)
+    @staticmethod
+    def _internar(valores, indice, lista=None):
+        posiciones, unicos = pd.factorize(valores, use_na_sentinel=False)
+        codigos = np.empty(len(unicos), dtype=np.int64)
+        for i, valor in enumerate(unicos):
+            if valor not in indice:
+                indice[valor] = len(indice)
+                if lista is not None:
+                    lista.append(valor)
+            codigos[i] = indice[valor]
+        return codigos[posiciones]
+
+    def _crecer(self):
+        necesarias = len(self.tickers) * 2
+        if necesarias <= len(self.transacciones):
+            return
+        tamano = max(necesarias, len(self.transacciones) * 2)
+        for nombre in ('transacciones', 'total', 'importe', 'volumen_precio', 'insiders'):
+            actual = getattr(self, nombre)
+            nuevo = np.zeros(tamano, dtype=actual.dtype)
+            nuevo[:len(actual)] = actual
+            setattr(self, nombre, nuevo)
+
+    # Arrays de las filas del frame que cuentan para la ventana actual, con las mismas reglas que
+    # `agregar_arrays`: clave = ticker * 2 + (1 si es venta), importe solo con precio conocido
+    def _arrays(self, df):
+        cantidad = df['Cantidad'].to_numpy()
+        fechas = df[COLUMNA_FECHA].to_numpy().astype('datetime64[D]')
+        dias = (fechas - _DIA).astype(np.int64)
+        validas = (cantidad != 0) & ~np.isnat(fechas) & df['Ticker'].notna().to_numpy() & (dias >= self.limite)
+        if not validas.any():
+            return None
+        cantidad = cantidad[validas].astype(np.int64)
+        precio = df['Precio de Transacción'].to_numpy(dtype=np.float64)[validas]
+        codigos_ticker = self._internar(df['Ticker'].to_numpy()[validas], self.indice_ticker, self.tickers)
+        self._crecer()
+        nombres = self._internar(df['Nombre'].astype(object).to_numpy()[validas], self.indice_nombre)
+        volumen = np.abs(cantidad).astype(np.float64)
+        con_precio = ~np.isnan(precio)
+        return {
+            'dia': dias[validas],
+            'clave': codigos_ticker * 2 + (cantidad < 0),
+            'nombre': nombres,
+            'cantidad': cantidad,
+            'importe': np.where(con_precio, volumen * np.where(con_precio, precio, 0.0), 0.0),
+            'volumen_precio': np.where(con_precio, volumen, 0.0),
+        }
+
+    # Suma (signo 1) o resta (signo -1) un bloque de filas en los agregados
+    def _aplicar(self, filas, signo):
+        np.add.at(self.transacciones, filas['clave'], signo)
+        np.add.at(self.total, filas['clave'], signo * filas['cantidad'])
+        np.add.at(self.importe, filas['clave'], signo * filas['importe'])
+        np.add.at(self.volumen_precio, filas['clave'], signo * filas['volumen_precio'])
+        pares, cuentas = np.unique(np.stack([filas['clave'], filas['nombre']], axis=1), axis=0, return_counts=True)
+        for (clave, nombre), cuenta in zip(pares.tolist(), cuentas.tolist()):
+            antes = self.pares.get((clave, nombre), 0)
+            despues = antes + signo * cuenta
+            if despues:
+                self.pares[(clave, nombre)] = despues
+            else:
+                del self.pares[(clave, nombre)]
+            self.insiders[clave] += (despues > 0) - (antes > 0)
+        # Sin transacciones, los importes vuelven a cero exacto (sin restos de redondeo acumulados)
+        vacias = np.unique(filas['clave'])
+        vacias = vacias[self.transacciones[vacias] == 0]
+        self.importe[vacias] = 0.0
+        self.volumen_precio[vacias] = 0.0
+
+    # Añade transacciones nuevas (las anteriores a la ventana se ignoran). Devuelve cuántas entran.
+    @medir_etapa('agregados')
+    def anadir(self, df):
+        filas = self._arrays(df)
+        if filas is None:
+            return 0
+        self._aplicar(filas, 1)
+        orden = np.argsort(filas['dia'], kind='stable')
+        dias, inicios = np.unique(filas['dia'][orden], return_index=True)
+        for dia, bloque in zip(dias.tolist(), np.split(orden, inicios[1:])):
+            if dia not in self.por_dia:
+                self.por_dia[dia] = []
+                heapq.heappush(self.pendientes, dia)
+            self.por_dia[dia].append({columna: valores[bloque] for columna, valores in filas.items()})
+        return len(filas['clave'])
+
+    # Retira transacciones que se añadieron antes (p. ej. corregidas o anuladas en origen)
+    @medir_etapa('agregados')
+    def quitar(self, df):
+        filas = self._arrays(df)
+        if filas is None:
+            return 0
+        self._aplicar(filas, -1)
+        # Se descuentan también de sus días para no restarlas otra vez al salir de la ventana
+        for dia in np.unique(filas['dia']).tolist():
+            en_dia = filas['dia'] == dia
+            retiradas = {}
+            for clave, nombre, cantidad in zip(filas['clave'][en_dia].tolist(), filas['nombre'][en_dia].tolist(),
+                                               filas['cantidad'][en_dia].tolist()):
+                retiradas[(clave, nombre, cantidad)] = retiradas.get((clave, nombre, cantidad), 0) + 1
+            bloques = []
+            for bloque in self.por_dia.get(dia, []):
+                conservar = np.ones(len(bloque['clave']), dtype=bool)
+                for i, fila in enumerate(zip(bloque['clave'].tolist(), bloque['nombre'].tolist(),
+                                             bloque['cantidad'].tolist())):
+                    if retiradas.get(fila):
+                        retiradas[fila] -= 1
+                        conservar[i] = False
+                bloques.append({columna: valores[conservar] for columna, valores in bloque.items()})
+            if dia in self.por_dia:
+                self.por_dia[dia] = bloques
+        return len(filas['clave'])
+
+    # Mueve la ventana hasta `hoy` y resta las transacciones que han quedado fuera. Devuelve cuántas salen.
+    @medir_etapa('agregados')
+    def avanzar(self, hoy=None):
+        self.limite = max(self.limite, _dia(hoy) - self.dias)
+        salientes = 0
+        while self.pendientes and self.pendientes[0] < self.limite:
+            for bloque in self.por_dia.pop(heapq.heappop(self.pendientes)):
+                if len(bloque['clave']):
+                    self._aplicar(bloque, -1)
+                    salientes += len(bloque['clave'])
+        if salientes:
+            logging.info(f"Agregados: {salientes} transacciones salen de la ventana de {self.dias} días.")
+        return salientes
+
+    # Agregados actuales con el mismo formato que `resumen.agregar_por_ticker`
+    def agregados(self):
+        presentes = np.flatnonzero(self.transacciones)
+        etiquetas = np.array(self.tickers + [''], dtype=object)[presentes // 2]
+        orden = np.lexsort((presentes % 2, etiquetas.astype(str)))
+        presentes, etiquetas = presentes[orden], etiquetas[orden]
+        vwap = np.full(len(presentes), np.nan)
+        np.divide(self.importe[presentes], self.volumen_precio[presentes], out=vwap,
+                  where=self.volumen_precio[presentes] > 0)
+        indice = pd.MultiIndex.from_arrays(
+            [pd.Index(etiquetas, dtype=object), np.where(presentes % 2 == 1, -1, 1)], names=['Ticker', 'Lado']
+        )
+        return pd.DataFrame({
+            'Total': self.total[presentes],
+            'Importe': self.importe[presentes],
+            'Transacciones': self.transacciones[presentes],
+            'Insiders': self.insiders[presentes],
+            'VWAP': vwap.round(2),
+        }, index=indice)
+
+    # Resúmenes de compras, ventas y saldo neto de la ventana actual
+    def resumenes(self, total_acciones):
+        return resumir_agregados(self.agregados(), total_acciones)
+
+
+# Ventana inicial de unos agregados a partir de un frame de transacciones (p. ej. las del almacén)
+def agregados_desde(df, dias, hoy=None):
+    agregados = AgregadosVentana(dias, hoy=hoy)
+    agregados.anadir(df)
+    return agregados
@@ -0,0 +1,219 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from insider.descarga import descargar_concurrente
+from insider.metricas import METRICAS
+
+CAMPOS = ['name', 'change', 'transactionPrice', 'share', 'transactionDate', 'filingDate', 'transactionCode']
+
+# Fuente por defecto de las transacciones guardadas (el relleno desde EDGAR usa 'sec')
+ORIGEN_FINNHUB = 'finnhub'
+
+_NO_ALFANUMERICO = re.compile(r'[^A-Z0-9 ]+')
+_MAX_PARAMETROS = 900
+
+
+# Identidad estable de una transacción: el `id` de Finnhub o, si falta, un hash de sus campos
+def identidad_transaccion(registro):
+    if registro.get('id'):
+        return str(registro['id'])
+    clave = '|'.join(str(registro.get(campo)) for campo in CAMPOS)
+    return hashlib.sha1(clave.encode('utf-8')).hexdigest()
+
+
+# Huella del contenido de una transacción, independiente de la fuente: insider (sin puntuación ni
+# mayúsculas), fecha, cantidad y precio. Sirve para reconocer la misma operación llegada de Finnhub
+# y de los formularios de la SEC, que usan identificadores distintos.
+def huella_transaccion(registro):
+    nombre = ' '.join(_NO_ALFANUMERICO.sub(' ', str(registro.get('name') or '').upper()).split())
+    precio = registro.get('transactionPrice')
+    cantidad = registro.get('change')
+    return '|'.join([nombre, str(registro.get('transactionDate') or '')[:10],
+                     '' if cantidad is None else f'{float(cantidad):.0f}',
+                     '' if precio is None else f'{float(precio):.4f}'])
+
+
+# Almacén local (SQLite) de transacciones en bruto de Finnhub, con una marca de agua por ticker.
+# `ttl_horas` indica cuánto tiempo se consideran vigentes los datos de un ticker antes de volver a
+# consultar la API y `retencion_dias` cuánto histórico se conserva al purgar.
+class AlmacenTransacciones:
+    def __init__(self, ruta='insider_transacciones.db', ttl_horas=6, retencion_dias=None):
+        self.ruta = ruta
+        self.ttl_horas = ttl_horas
+        self.retencion_dias = retencion_dias
+        self.lock = threading.Lock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.executescript('''
+            CREATE TABLE IF NOT EXISTS transacciones (
+                ticker TEXT NOT NULL,
+                id TEXT NOT NULL,
+                name TEXT,
+                change REAL,
+                transactionPrice REAL,
+                share REAL,
+                transactionDate TEXT,
+                filingDate TEXT,
+                transactionCode TEXT,
+                PRIMARY KEY (ticker, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_transacciones_fecha ON transacciones (ticker, transactionDate);
+            CREATE TABLE IF NOT EXISTS marcas (
+                ticker TEXT PRIMARY KEY,
+                ultima_fecha TEXT,
+                actualizado REAL NOT NULL
+            );
+        ''')
+        self._migrar()
+
+    # Los almacenes anteriores no tienen fuente ni huella: se añaden las columnas y se calculan una vez
+    def _migrar(self):
+        columnas = {fila[1] for fila in self.conexion.execute('PRAGMA table_info(transacciones)')}
+        with self.conexion:
+            if 'origen' not in columnas:
+                self.conexion.execute(f"ALTER TABLE transacciones ADD COLUMN origen TEXT NOT NULL DEFAULT '{ORIGEN_FINNHUB}'")
+            if 'huella' not in columnas:
+                self.conexion.execute('ALTER TABLE transacciones ADD COLUMN huella TEXT')
+            filas = self.conexion.execute(
+                f'SELECT ticker, id, {", ".join(CAMPOS)} FROM transacciones WHERE huella IS NULL').fetchall()
+            self.conexion.executemany('UPDATE transacciones SET huella = ? WHERE ticker = ? AND id = ?',
+                                      [(huella_transaccion(dict(zip(CAMPOS, f[2:]))), f[0], f[1]) for f in filas])
+            self.conexion.execute('CREATE INDEX IF NOT EXISTS idx_transacciones_huella ON transacciones (ticker, huella)')
+
+    def cerrar(self):
+        with self.lock:
+            self.conexion.close()
+
+    # Fecha de la transacción más reciente guardada para el ticker (o None si no hay datos)
+    def marca_agua(self, ticker):
+        with self.lock:
+            fila = self.conexion.execute('SELECT ultima_fecha FROM marcas WHERE ticker = ?', (ticker,)).fetchone()
+        return fila[0] if fila else None
+
+    # Indica si el ticker se ha refrescado dentro del TTL configurado
+    def vigente(self, ticker, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        with self.lock:
+            fila = self.conexion.execute('SELECT actualizado FROM marcas WHERE ticker = ?', (ticker,)).fetchone()
+        return fila is not None and ahora - fila[0] < self.ttl_horas * 3600
+
+    # Huellas de `huellas` ya guardadas para el ticker, desde cualquier fuente o, si se indica
+    # `excepto_origen`, desde una fuente distinta de esa
+    def _huellas_guardadas(self, ticker, huellas, excepto_origen=None):
+        huellas = list(set(huellas))
+        condicion, parametros = ('AND origen != ? ', [excepto_origen]) if excepto_origen is not None else ('', [])
+        encontradas = set()
+        for i in range(0, len(huellas), _MAX_PARAMETROS):
+            tramo = huellas[i:i + _MAX_PARAMETROS]
+            encontradas.update(fila[0] for fila in self.conexion.execute(
+                f'SELECT huella FROM transacciones WHERE ticker = ? {condicion}'
+                f'AND huella IN ({", ".join("?" * len(tramo))})', [ticker, *parametros, *tramo]))
+        return encontradas
+
+    # Inserta los registros nuevos de un ticker (ignorando duplicados) y actualiza su marca de agua.
+    # Las transacciones que ya llegaron de otra fuente (misma huella, otro `origen`) no se repiten;
+    # dentro de una misma fuente cuentan los identificadores, así que dos lotes iguales se conservan.
+    # Con `huella_unica` tampoco se repite una huella ya guardada desde la misma fuente (la SEC, donde
+    # el mismo formulario puede llegar otra vez con otro identificador).
+    def guardar(self, ticker, registros, ahora=None, origen=ORIGEN_FINNHUB, huella_unica=False):
+        ahora = time.time() if ahora is None else ahora
+        huellas = [huella_transaccion(r) for r in registros]
+        with self.lock, self.conexion:
+            repetidas = self._huellas_guardadas(ticker, huellas, excepto_origen=None if huella_unica else origen)
+            filas = [(ticker, identidad_transaccion(r), *(r.get(campo) for campo in CAMPOS), origen, huella)
+                     for r, huella in zip(registros, huellas) if huella not in repetidas]
+            if len(filas) < len(registros):
+                logging.info(f"{len(registros) - len(filas)} transacciones de {ticker} ya guardadas con la misma huella.")
+            antes = self.conexion.total_changes
+            self.conexion.executemany(
+                f'INSERT OR IGNORE INTO transacciones (ticker, id, {", ".join(CAMPOS)}, origen, huella) '
+                f'VALUES ({", ".join("?" * (len(CAMPOS) + 4))})',
+                filas
+            )
+            insertadas = self.conexion.total_changes - antes
+            self.conexion.execute('''
+                INSERT INTO marcas (ticker, ultima_fecha, actualizado)
+                VALUES (?, (SELECT MAX(transactionDate) FROM transacciones WHERE ticker = ?), ?)
+                ON CONFLICT(ticker) DO UPDATE SET ultima_fecha = excluded.ultima_fecha, actualizado = excluded.actualizado
+            ''', (ticker, ticker, ahora))
+        logging.info(f"{insertadas} transacciones nuevas guardadas para {ticker}.")
+        return insertadas
+
+    # Lee del almacén, sin tocar la red, las transacciones de los tickers dentro de [desde, hasta]
+    def leer_ventana(self, tickers, desde=None, hasta=None):
+        tickers = list(tickers)
+        consulta = f'SELECT ticker, id, {", ".join(CAMPOS)} FROM transacciones WHERE ticker IN ({", ".join("?" * len(tickers))})'
+        parametros = list(tickers)
+        if desde is not None:
+            consulta += ' AND transactionDate >= ?'
+            parametros.append(str(desde))
+        if hasta is not None:
+            consulta += ' AND transactionDate <= ?'
+            parametros.append(str(hasta))
+        consulta += ' ORDER BY ticker, transactionDate'
+        resultado = {ticker: [] for ticker in tickers}
+        with self.lock:
+            filas = self.conexion.execute(consulta, parametros).fetchall()
+        for fila in filas:
+            resultado[fila[0]].append(dict(zip(['id'] + CAMPOS, fila[1:])))
+        return resultado
+
+    # Identidades (ticker, id) ya guardadas para los tickers indicados
+    def identidades(self, tickers):
+        tickers = list(tickers)
+        with self.lock:
+            filas = self.conexion.execute(
+                f'SELECT ticker, id FROM transacciones WHERE ticker IN ({", ".join("?" * len(tickers))})', tickers
+            ).fetchall()
+        return set(filas)
+
+    # Elimina las transacciones anteriores a la política de retención
+    def purgar(self, hoy=None):
+        if self.retencion_dias is None:
+            return 0
+        hoy = hoy or date.today()
+        limite = str(hoy - timedelta(days=self.retencion_dias))
+        with self.lock, self.conexion:
+            borradas = self.conexion.execute('DELETE FROM transacciones WHERE transactionDate < ?', (limite,)).rowcount
+        logging.info(f"{borradas} transacciones anteriores a {limite} eliminadas del almacén.")
+        return borradas
+
+
+# Refresca en el almacén solo los tickers caducados, pidiendo a la API las transacciones posteriores
+# a su marca de agua. `solapamiento_dias` vuelve a pedir unos días ya vistos para recoger los
+# formularios presentados con retraso (los duplicados se descartan por su identidad).
+# `descargar(ticker, desde)` debe devolver la lista de registros en bruto.
+def refrescar_incremental(almacen, tickers, descargar, max_workers=8, limitador=None,
+                          solapamiento_dias=7, dias_iniciales=None, hoy=None):
+    hoy = hoy or date.today()
+    unicos = list(dict.fromkeys(tickers))
+    pendientes = [ticker for ticker in unicos if not almacen.vigente(ticker)]
+    METRICAS.contar('insider_cache_aciertos_total', len(unicos) - len(pendientes), cache='almacen')
+    METRICAS.contar('insider_cache_fallos_total', len(pendientes), cache='almacen')
+    if not pendientes:
+        logging.info("Todos los tickers están vigentes en el almacén; no se consulta la API.")
+        return []
+
+    desde = {}
+    for ticker in pendientes:
+        marca = almacen.marca_agua(ticker)
+        if marca:
+            desde[ticker] = datetime.strptime(marca[:10], '%Y-%m-%d').date() - timedelta(days=solapamiento_dias)
+        elif dias_iniciales is not None:
+            desde[ticker] = hoy - timedelta(days=dias_iniciales)
+        else:
+            desde[ticker] = None
+
+    resultados = descargar_concurrente(
+        pendientes, lambda ticker: descargar(ticker, desde[ticker]),
+        max_workers=max_workers, limitador=limitador
+    )
+    for resultado in resultados:
+        if resultado.ok:
+            almacen.guardar(resultado.ticker, resultado.datos)
+    logging.info(f"Refresco incremental completado para {len(pendientes)} tickers.")
+    return resultados
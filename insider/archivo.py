@@ -0,0 +1,155 @@
+import logging
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from insider.fechas import COLUMNA_FECHA, indexar_por_fecha
+from insider.ingesta import COLUMNAS
+from insider.metricas import medir_etapa
+
+# Esquema de los ficheros del archivo. Ticker y Mes (AAAA-MM) no se guardan en los ficheros: son
+# las carpetas de la partición (Ticker=AAPL/Mes=2024-05/...). Lado: 1 compra, -1 venta. Id es la
+# identidad de la transacción dentro de su ticker (`identidad_transaccion`), que no cambia aunque el
+# índice de insiders renombre al insider; los archivos anteriores no la tienen (queda nula).
+ESQUEMA = pa.schema([
+    ('Nombre', pa.string()),
+    ('Cantidad', pa.int64()),
+    ('Precio de Transacción', pa.float64()),
+    ('Restantes', pa.int64()),
+    (COLUMNA_FECHA, pa.timestamp('ns')),
+    ('Lado', pa.int8()),
+    ('Id', pa.string()),
+])
+PARTICION = ds.partitioning(pa.schema([('Ticker', pa.string()), ('Mes', pa.string())]), flavor='hive')
+
+# Mes de las transacciones sin fecha (quedan fuera de cualquier consulta por rango de fechas)
+MES_DESCONOCIDO = 'desconocido'
+
+LADOS = {'compras': 1, 'ventas': -1}
+
+FILAS_POR_GRUPO = 64 * 1024
+
+
+# Mes AAAA-MM de cada fecha; se formatea una vez por mes distinto
+def _meses(fechas):
+    codigos, unicos = pd.factorize(fechas.to_numpy().astype('datetime64[M]'))
+    textos = np.append(np.datetime_as_string(unicos, unit='M').astype(object), MES_DESCONOCIDO)
+    return textos[codigos]
+
+
+# Clave de las filas sin Id (frames sin la columna y filas de archivos anteriores): los campos de la
+# transacción salvo el nombre, que el índice de insiders puede cambiar de un archivado a otro
+def _clave_contenido(df):
+    fechas = pd.Series(df[COLUMNA_FECHA].to_numpy()).dt.strftime('%Y-%m-%d').fillna('')
+    return ('~' + fechas + '|' + pd.Series(df['Cantidad'].to_numpy()).astype(str)
+            + '|' + pd.Series(df['Precio de Transacción'].to_numpy()).round(4).astype(str)
+            + '|' + pd.Series(df['Restantes'].to_numpy()).astype(str)).to_numpy(dtype=object)
+
+
+# Histórico de transacciones limpias en un dataset Parquet particionado por ticker y mes. Cada
+# `anadir` reescribe solo las particiones afectadas (sin duplicar filas ya archivadas) y las consultas
+# empujan los filtros de ticker, fechas y lado hasta los ficheros: las particiones que no coinciden no
+# se abren y, dentro de cada fichero, las estadísticas de los grupos de filas descartan el resto.
+class ArchivoHistorico:
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self.sistema = fs.LocalFileSystem(use_mmap=True)
+
+    def _dataset(self):
+        return ds.dataset(self.directorio, schema=ESQUEMA.append(pa.field('Ticker', pa.string()))
+                          .append(pa.field('Mes', pa.string())), format='parquet',
+                          partitioning=PARTICION, filesystem=self.sistema)
+
+    # Añade un frame de transacciones (esquema de `construir_transacciones`, a poder ser con `con_id`).
+    # Cada transacción se guarda una vez por (Ticker, Id); si ya estaba, queda la versión nueva (por
+    # ejemplo, con el nombre unificado actual). Devuelve las filas nuevas.
+    @medir_etapa('archivo')
+    def anadir(self, df):
+        if df.empty:
+            return 0
+        contenido = _clave_contenido(df)
+        nuevas = pd.DataFrame({
+            'Nombre': df['Nombre'].astype(str).to_numpy(),
+            'Cantidad': df['Cantidad'].to_numpy(dtype=np.int64),
+            'Precio de Transacción': df['Precio de Transacción'].to_numpy(dtype=np.float64),
+            'Restantes': df['Restantes'].to_numpy(dtype=np.int64),
+            COLUMNA_FECHA: df[COLUMNA_FECHA].to_numpy(),
+            'Lado': np.sign(df['Cantidad'].to_numpy()).astype(np.int8),
+            'Id': df['Id'].to_numpy(dtype=object) if 'Id' in df else np.full(len(df), None, dtype=object),
+            'Ticker': df['Ticker'].astype(str).to_numpy(),
+            'Mes': _meses(df[COLUMNA_FECHA]),
+        })
+
+        # Particiones afectadas: se leen, se combinan con lo nuevo y se reescriben enteras
+        particiones = nuevas[['Ticker', 'Mes']].drop_duplicates()
+        filtro = ds.field('Ticker').isin(particiones['Ticker'].unique()) & ds.field('Mes').isin(particiones['Mes'].unique())
+        existentes = self._dataset().to_table(filter=filtro).to_pandas()
+        existentes = existentes.merge(particiones, on=['Ticker', 'Mes'])
+        archivadas = len(existentes)
+        # Las filas sin Id (de frames sin la columna o de archivos anteriores) se emparejan por contenido
+        # dentro de su ticker: una archivada sin Id se sustituye por la nueva y una nueva sin Id toma el Id
+        # de la archivada. Las que siguen sin Id se guardan con su clave de contenido.
+        clave_nuevas = pd.MultiIndex.from_arrays([nuevas['Ticker'], contenido])
+        clave_existentes = pd.MultiIndex.from_arrays([existentes['Ticker'], _clave_contenido(existentes)])
+        ids = existentes['Id']
+        sin_id = (ids.isna() | ids.str.startswith('~', na=False)).to_numpy()
+        nuevas_sin_id = nuevas['Id'].isna().to_numpy()
+        if nuevas_sin_id.any():
+            conocidos = pd.Series(ids.to_numpy()[~sin_id], index=clave_existentes[~sin_id])
+            conocidos = conocidos[~conocidos.index.duplicated()]
+            encontrados = conocidos.reindex(clave_nuevas[nuevas_sin_id]).to_numpy()
+            nuevas.loc[nuevas_sin_id, 'Id'] = np.where(pd.isna(encontrados), contenido[nuevas_sin_id], encontrados)
+        if sin_id.any():
+            existentes['Id'] = np.where(sin_id, clave_existentes.get_level_values(1), ids.to_numpy())
+            existentes = existentes[~(sin_id & clave_existentes.isin(clave_nuevas))]
+        combinadas = pd.concat([existentes, nuevas], ignore_index=True)
+        combinadas = combinadas.drop_duplicates(['Ticker', 'Id'], keep='last', ignore_index=True)
+        combinadas = combinadas.sort_values(['Ticker', 'Mes', COLUMNA_FECHA], kind='stable', ignore_index=True)
+
+        ds.write_dataset(
+            pa.Table.from_pandas(combinadas, preserve_index=False), self.directorio, format='parquet',
+            partitioning=PARTICION, existing_data_behavior='delete_matching',
+            basename_template='parte-{i}.parquet', max_rows_per_group=FILAS_POR_GRUPO,
+            min_rows_per_group=min(FILAS_POR_GRUPO, len(combinadas)), filesystem=self.sistema,
+            # pyarrow admite por defecto 1024 particiones por escritura; un lote de muchos tickers y meses las supera
+            max_partitions=max(len(particiones), 1024),
+        )
+        anadidas = len(combinadas) - archivadas
+        logging.info(f"Archivo: {anadidas} transacciones nuevas en {len(particiones)} particiones de {self.directorio}.")
+        return anadidas
+
+    # Tabla Arrow (respaldada por ficheros mapeados en memoria) con las transacciones que cumplen los
+    # filtros. `desde` y `hasta` son fechas incluidas; `lado` es 'compras' o 'ventas'.
+    def consultar(self, tickers=None, desde=None, hasta=None, lado=None, columnas=None):
+        filtro = None
+
+        def y(expresion):
+            return expresion if filtro is None else filtro & expresion
+
+        if tickers is not None:
+            filtro = y(ds.field('Ticker').isin([str(t) for t in tickers]))
+        if desde is not None:
+            desde = pd.Timestamp(desde).normalize()
+            filtro = y((ds.field('Mes') >= desde.strftime('%Y-%m')) & (ds.field(COLUMNA_FECHA) >= desde.as_unit('ns')))
+        if hasta is not None:
+            hasta = pd.Timestamp(hasta).normalize()
+            filtro = y((ds.field('Mes') <= hasta.strftime('%Y-%m'))
+                       & (ds.field(COLUMNA_FECHA) < (hasta + timedelta(days=1)).as_unit('ns')))
+        if lado is not None:
+            if lado not in LADOS:
+                raise ValueError(f"Lado desconocido: {lado!r} (usa 'compras' o 'ventas')")
+            filtro = y(ds.field('Lado') == LADOS[lado])
+        return self._dataset().to_table(columns=columnas, filter=filtro)
+
+    # Igual que `consultar`, pero como frame con el esquema de `construir_transacciones`
+    def consultar_frame(self, tickers=None, desde=None, hasta=None, lado=None):
+        df = self.consultar(tickers, desde, hasta, lado, columnas=COLUMNAS).to_pandas()
+        df['Nombre'] = df['Nombre'].astype('category')
+        df['Ticker'] = df['Ticker'].astype('category')
+        return indexar_por_fecha(df)
@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+
+from insider.metricas import METRICAS
+
+
+# Caché en memoria con caducidad (TTL) y con peticiones agrupadas: si varios hilos piden a la vez
+# una clave que falta, solo uno la calcula y el resto espera su resultado. Pensada para vivir una
+# vez por proceso (por ejemplo con `st.cache_resource`) y compartirse entre todas las sesiones.
+class CacheTTL:
+    def __init__(self, ttl_segundos, max_entradas=None, nombre='cache'):
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.nombre = nombre
+        self.lock = threading.Lock()
+        self.valores = {}
+        self.en_curso = {}
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _vigente(self, clave, ahora):
+        entrada = self.valores.get(clave)
+        return entrada is not None and ahora - entrada[0] < self.ttl_segundos
+
+    def _guardar(self, clave, valor, ahora):
+        self.valores[clave] = (ahora, valor)
+        if self.max_entradas is not None and len(self.valores) > self.max_entradas:
+            # Se descarta la entrada más antigua
+            del self.valores[min(self.valores, key=lambda c: self.valores[c][0])]
+
+    def invalidar(self, clave=None):
+        with self.lock:
+            if clave is None:
+                self.valores.clear()
+            else:
+                self.valores.pop(clave, None)
+
+    # Devuelve el valor de cada clave; `calcular_varios(claves)` recibe solo las que faltan y devuelve
+    # un diccionario. Las claves que no aparezcan en él (errores) no se guardan ni se devuelven.
+    def obtener_varios(self, claves, calcular_varios):
+        claves = list(dict.fromkeys(claves))
+        ahora = time.monotonic()
+        propias, ajenas, resultado = [], {}, {}
+        with self.lock:
+            for clave in claves:
+                if self._vigente(clave, ahora):
+                    resultado[clave] = self.valores[clave][1]
+                elif clave in self.en_curso:
+                    ajenas[clave] = self.en_curso[clave]
+                else:
+                    self.en_curso[clave] = threading.Event()
+                    propias.append(clave)
+            self.aciertos += len(resultado)
+            self.fallos += len(propias)
+        n_aciertos = len(resultado)
+        METRICAS.contar('insider_cache_aciertos_total', n_aciertos, cache=self.nombre)
+        METRICAS.contar('insider_cache_fallos_total', len(propias), cache=self.nombre)
+
+        if propias:
+            calculados = {}
+            try:
+                calculados = calcular_varios(propias) or {}
+            finally:
+                with self.lock:
+                    ahora = time.monotonic()
+                    for clave in propias:
+                        if clave in calculados:
+                            self._guardar(clave, calculados[clave], ahora)
+                        self.en_curso.pop(clave).set()
+            resultado.update({c: calculados[c] for c in propias if c in calculados})
+
+        for clave, evento in ajenas.items():
+            evento.wait()
+            with self.lock:
+                entrada = self.valores.get(clave)
+            if entrada is not None:
+                resultado[clave] = entrada[1]
+
+        logging.info(f"Caché '{self.nombre}': {n_aciertos} aciertos, "
+                     f"{len(propias)} calculados, {len(ajenas)} compartidos con otra petición.")
+        return {c: resultado[c] for c in claves if c in resultado}
+
+    # Versión para una sola clave: `calcular()` produce el valor
+    def obtener(self, clave, calcular):
+        return self.obtener_varios([clave], lambda claves: {clave: calcular()}).get(clave)
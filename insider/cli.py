@@ -0,0 +1,153 @@
+import argparse
+import logging
+
+import pandas as pd
+
+from insider.almacen import AlmacenTransacciones
+from insider.archivo import ArchivoHistorico
+from insider.agregados import AgregadosVentana
+from insider.clusters import (DIAS_CLUSTER, MIN_IMPORTE, MIN_INSIDERS, DetectorClusters, detectar_clusters,
+                              presentar_clusters)
+from insider.config import configurar_logging
+from insider.exportar import crear_sumidero, exportar
+from insider.identidades import IndiceInsiders
+from insider.metricas import METRICAS, activar
+from insider.consulta import Consulta
+from insider.pipeline import (DIAS_POR_DEFECTO, RUTA_INSIDERS, RUTA_PRECIOS, formatear_fecha,
+                              obtener_acciones_totales, obtener_rentabilidades, obtener_transacciones_multiples_tickers)
+from insider.rentabilidades import CachePrecios, ampliar_resumen, resumen_rentabilidades
+
+# Punto de entrada del proceso por lotes: python -m insider [TICKERS...] [--dias N] [--salida DESTINO] [--demonio]
+
+# Tickers por defecto
+TICKERS = ['ASML', 'ULTA', 'TXN', 'POOL', 'MSFT', 'MC', 'DHR', 'AAPL', 'SOM', 'NVDA', 'GOOGL']
+
+# Almacén local de transacciones para refrescos incrementales
+RUTA_ALMACEN = 'insider_transacciones.db'
+
+
+# Ejecutar el proceso
+def automatizar_proceso(tickers, dias=DIAS_POR_DEFECTO, ruta_almacen=RUTA_ALMACEN, salidas=('sheets',), archivo=None,
+                        dias_cluster=DIAS_CLUSTER, min_insiders=MIN_INSIDERS, min_importe=MIN_IMPORTE,
+                        rentabilidades=False, retencion_dias=None):
+    almacen = AlmacenTransacciones(ruta_almacen, retencion_dias=retencion_dias)
+    try:
+        # Paso 1: Obtener transacciones (solo las nuevas desde la última ejecución) y descartar del
+        # almacén las que ya no entran en la retención
+        df_transacciones = obtener_transacciones_multiples_tickers(tickers, almacen=almacen, dias=dias,
+                                                                   con_id=bool(archivo))
+        almacen.purgar()
+        # Las variantes del nombre de un insider cuentan como una sola persona en resúmenes y clusters
+        indice = IndiceInsiders(RUTA_INSIDERS)
+        try:
+            df_transacciones = indice.unificar(df_transacciones)
+        finally:
+            indice.cerrar()
+        if archivo:
+            # Un fallo del archivo no impide exportar; las filas se archivan en la próxima ejecución
+            try:
+                ArchivoHistorico(archivo).anadir(df_transacciones)
+            except Exception as e:
+                logging.error(f"Error al archivar las transacciones en {archivo}: {e}")
+            df_transacciones = df_transacciones.drop(columns='Id')
+
+        # Verificación de datos de compras y ventas
+        if not (df_transacciones['Cantidad'] != 0).any():
+            logging.warning("No hay datos en df_compras ni en df_ventas.")
+            return
+
+        # Paso 2: Obtener total de acciones
+        total_acciones = obtener_acciones_totales(tickers)
+        if not total_acciones:
+            logging.error("total_acciones está vacío. Revisa la función obtener_acciones_totales.")
+            return
+
+        # Paso 3-4: Compras y ventas de la ventana y sus resúmenes en una sola pasada
+        resultado = Consulta(df_transacciones).ventana(dias).salidas(
+            'compras', 'ventas', 'resumen_compras', 'resumen_ventas', formatear=False).ejecutar(total_acciones)
+        df_compras, df_ventas = resultado['compras'], resultado['ventas']
+        resumen_compras, resumen_ventas = resultado['resumen_compras'], resultado['resumen_ventas']
+
+        # Paso 5: Detectar compras en grupo (varios insiders comprando el mismo ticker en pocos días)
+        clusters = detectar_clusters(df_compras, dias=dias_cluster, min_insiders=min_insiders, min_importe=min_importe)
+
+        # Paso 6 (opcional): Rentabilidad posterior de cada transacción y resúmenes por ticker e insider
+        tablas_rentabilidad = {}
+        if rentabilidades:
+            cache_precios = CachePrecios(RUTA_PRECIOS)
+            # Compras y ventas se enriquecen juntas (una sola consulta de cierres) y se separan después
+            try:
+                df_enriquecido = obtener_rentabilidades(pd.concat([df_compras, df_ventas]), cache_precios)
+            finally:
+                cache_precios.cerrar()
+            df_compras, df_ventas = df_enriquecido.iloc[:len(df_compras)], df_enriquecido.iloc[len(df_compras):]
+            por_ticker = resumen_rentabilidades(df_enriquecido, 'Ticker')
+            resumen_compras = ampliar_resumen(resumen_compras, por_ticker, 'Comprado')
+            resumen_ventas = ampliar_resumen(resumen_ventas, por_ticker, 'Vendido')
+            tablas_rentabilidad['Rentabilidad Insiders'] = resumen_rentabilidades(df_enriquecido, 'Nombre')
+
+        # Paso 7: Formatear fechas y guardar resultados en los destinos configurados (Google Sheets por defecto)
+        tablas = {
+            'Compras': formatear_fecha(df_compras),
+            'Ventas': formatear_fecha(df_ventas),
+            'Resumen Compras': resumen_compras,
+            'Resumen Ventas': resumen_ventas,
+            'Clusters': presentar_clusters(clusters),
+            **tablas_rentabilidad,
+        }
+        sumideros = [s for s in (crear_sumidero(salida) for salida in salidas) if s is not None]
+        exportar(tablas, sumideros)
+        logging.info("Proceso de automatización completado exitosamente.")
+    except Exception as e:
+        logging.error(f"Error en el proceso de automatización: {e}")
+    finally:
+        almacen.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resumen de transacciones de insiders exportado a Google Sheets')
+    parser.add_argument('tickers', nargs='*', default=TICKERS, help='Tickers a procesar')
+    parser.add_argument('--dias', type=int, default=DIAS_POR_DEFECTO, help='Número de días a incluir')
+    parser.add_argument('--salida', action='append',
+                        help="Destino de exportación: sheets, csv:DIR, parquet:DIR o sqlite:RUTA (repetible; por defecto sheets)")
+    parser.add_argument('--cluster-dias', type=int, default=DIAS_CLUSTER,
+                        help='Ventana en días para detectar compras en grupo')
+    parser.add_argument('--cluster-insiders', type=int, default=MIN_INSIDERS,
+                        help='Mínimo de insiders distintos en una compra en grupo')
+    parser.add_argument('--cluster-importe', type=float, default=MIN_IMPORTE,
+                        help='Importe mínimo conjunto de una compra en grupo')
+    parser.add_argument('--rentabilidades', action='store_true',
+                        help='Añade la rentabilidad a +5, +20 y +60 sesiones de cada transacción (usa --dias amplio '
+                             'para los horizontes largos)')
+    parser.add_argument('--archivo', help='Carpeta del histórico Parquet particionado al que se añaden las transacciones')
+    parser.add_argument('--retencion-dias', type=int,
+                        help='Días de histórico que se conservan en el almacén local (por defecto, todo)')
+    parser.add_argument('--demonio', action='store_true',
+                        help='Modo residente: sondea periódicamente y exporta solo las transacciones nuevas')
+    parser.add_argument('--intervalo', type=float, default=900, help='Segundos entre sondeos en modo demonio')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Variación aleatoria relativa del intervalo')
+    parser.add_argument('--metricas', help='Exporta métricas por etapa a este fichero (.prom o .json)')
+    parser.add_argument('--log', default='insider_trading.log', help='Archivo de log')
+    args = parser.parse_args(argv)
+
+    configurar_logging(args.log)
+    if args.metricas:
+        activar()
+    if args.demonio:
+        from insider.demonio import Demonio
+        sumideros = [s for s in (crear_sumidero(salida) for salida in args.salida or ['sheets']) if s is not None]
+        Demonio([ticker.upper() for ticker in args.tickers], sumideros, intervalo_segundos=args.intervalo,
+                jitter=args.jitter, ruta_metricas=args.metricas, archivo=args.archivo,
+                detector=DetectorClusters(args.cluster_dias, args.cluster_insiders, args.cluster_importe),
+                agregados=AgregadosVentana(args.dias), retencion_dias=args.retencion_dias).ejecutar()
+        return
+    automatizar_proceso([ticker.upper() for ticker in args.tickers], dias=args.dias, salidas=args.salida or ['sheets'],
+                        archivo=args.archivo, dias_cluster=args.cluster_dias, min_insiders=args.cluster_insiders,
+                        min_importe=args.cluster_importe, rentabilidades=args.rentabilidades,
+                        retencion_dias=args.retencion_dias)
+    if args.metricas:
+        METRICAS.exportar(args.metricas)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import logging
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from insider.fechas import COLUMNA_FECHA, texto_fechas
+from insider.metricas import medir_etapa
+
+# Parámetros por defecto: al menos 3 insiders distintos comprando el mismo ticker en 14 días
+DIAS_CLUSTER = 14
+MIN_INSIDERS = 3
+MIN_IMPORTE = 0.0
+
+COLUMNAS_CLUSTER = ['Ticker', 'Inicio', 'Fin', 'Insiders', 'Transacciones', 'Acciones', 'Importe', 'Nombres']
+
+
+# Arrays de las compras de un frame de transacciones: días (enteros), insider, acciones e importe
+def _arrays_compras(df):
+    compras = df[df['Cantidad'] > 0]
+    fechas = compras[COLUMNA_FECHA].to_numpy()
+    validas = ~np.isnat(fechas)
+    compras = compras[validas]
+    acciones = compras['Cantidad'].to_numpy(dtype=np.float64)
+    precio = np.nan_to_num(compras['Precio de Transacción'].to_numpy(dtype=np.float64))
+    return (compras['Ticker'].astype(str).to_numpy(), fechas[validas].astype('datetime64[D]').astype(np.int64),
+            compras['Nombre'].astype(str).to_numpy(), acciones, acciones * precio)
+
+
+# Historial de compras de un ticker ordenado por fecha y, para cada fila r, si la ventana de `dias`
+# días que termina en ella cumple las condiciones (`valida[r]`) y dónde empieza (`izquierda[r]`).
+# Las columnas son vistas de búferes con capacidad de sobra, de modo que insertar compras solo mueve
+# las filas posteriores a la primera insertada (en un sondeo, las últimas).
+class _HistorialTicker:
+    COLUMNAS = (('dias', np.int64), ('insiders', np.int64), ('acciones', np.float64), ('importes', np.float64),
+                ('izquierda', np.int64), ('valida', bool))
+
+    def __init__(self):
+        self.filas = 0
+        self.buferes = {nombre: np.empty(0, dtype=tipo) for nombre, tipo in self.COLUMNAS}
+        self._vistas()
+
+    def _vistas(self):
+        for nombre, bufer in self.buferes.items():
+            setattr(self, nombre, bufer[:self.filas])
+
+    # Amplía los búferes (al menos al doble) si no caben `filas` filas
+    def _reservar(self, filas):
+        capacidad = len(self.buferes['dias'])
+        if filas <= capacidad:
+            return
+        capacidad = max(filas, 2 * capacidad, 64)
+        for nombre, bufer in self.buferes.items():
+            nuevo = np.empty(capacidad, dtype=bufer.dtype)
+            nuevo[:self.filas] = bufer[:self.filas]
+            self.buferes[nombre] = nuevo
+
+    # Inserta compras nuevas (pueden llegar con fechas anteriores a las ya vistas) en su sitio, buscado
+    # con searchsorted, y devuelve la primera fila cuyas ventanas pueden haber cambiado. Las compras de
+    # un mismo día quedan detrás de las ya vistas.
+    def insertar(self, dias, insiders, acciones, importes):
+        orden = np.argsort(dias, kind='stable')
+        posiciones = self.dias.searchsorted(dias[orden], side='right')
+        inicio, anteriores, nuevas = int(posiciones[0]), self.filas, len(dias)
+        self._reservar(anteriores + nuevas)
+        # Cada fila posterior a `inicio` se desplaza tantas posiciones como compras nuevas van antes
+        cola = np.arange(inicio, anteriores)
+        destino_cola = cola + np.searchsorted(posiciones, cola, side='right')
+        destino_nuevas = posiciones + np.arange(nuevas)
+        for nombre, valores in (('dias', dias), ('insiders', insiders), ('acciones', acciones), ('importes', importes)):
+            bufer = self.buferes[nombre]
+            bufer[destino_cola] = bufer[inicio:anteriores].copy()
+            bufer[destino_nuevas] = valores[orden]
+        self.filas = anteriores + nuevas
+        self.buferes['izquierda'][inicio:self.filas] = 0
+        self.buferes['valida'][inicio:self.filas] = False
+        self._vistas()
+        return inicio
+
+    # Ventana deslizante con dos punteros desde la fila `inicio`: el puntero izquierdo solo avanza y el
+    # número de insiders distintos se mantiene con un contador por insider, así que el coste es lineal
+    # en las filas desde el comienzo de la ventana de `inicio`, no en todo el historial
+    def recalcular(self, inicio, dias_ventana, min_insiders, min_importe):
+        if inicio >= len(self.dias):
+            return
+        base = int(self.dias.searchsorted(self.dias[inicio] - dias_ventana + 1, side='left'))
+        dias, insiders, importes = (self.dias[base:].tolist(), self.insiders[base:].tolist(),
+                                    self.importes[base:].tolist())
+        izquierda = 0
+        cuentas = {}
+        importe = 0.0
+        for j in range(inicio - base):
+            cuentas[insiders[j]] = cuentas.get(insiders[j], 0) + 1
+            importe += importes[j]
+        for r in range(inicio - base, len(dias)):
+            cuentas[insiders[r]] = cuentas.get(insiders[r], 0) + 1
+            importe += importes[r]
+            while dias[izquierda] <= dias[r] - dias_ventana:
+                insider = insiders[izquierda]
+                cuentas[insider] -= 1
+                if not cuentas[insider]:
+                    del cuentas[insider]
+                importe -= importes[izquierda]
+                izquierda += 1
+            self.izquierda[base + r] = base + izquierda
+            self.valida[base + r] = len(cuentas) >= min_insiders and importe >= min_importe
+
+    # Clusters como rangos de filas [primera, última]: unión de las ventanas válidas que se solapan,
+    # mirando solo las ventanas que terminan en `desde` o después (la primera abre un cluster). Cada
+    # rango va con la fila de su primera ventana válida: (primera, apertura, última).
+    def rangos(self, desde=0):
+        finales = np.flatnonzero(self.valida[desde:]) + desde
+        if not len(finales):
+            return []
+        izquierdas = self.izquierda[finales]
+        # Empieza un cluster nuevo cuando la ventana no alcanza a la anterior ventana válida
+        nuevos = np.concatenate([[True], izquierdas[1:] > finales[:-1]])
+        primeras = izquierdas[nuevos]
+        ultimas = np.append(finales[np.flatnonzero(nuevos)[1:] - 1], finales[-1])
+        return list(zip(primeras.tolist(), finales[nuevos].tolist(), ultimas.tolist()))
+
+
+# Detector incremental de compras en grupo ("clusters"): periodos en los que al menos `min_insiders`
+# insiders distintos compran el mismo ticker dentro de `dias` días por un importe conjunto de al menos
+# `min_importe`. Cada `actualizar` solo recalcula, en los tickers que reciben compras nuevas, las
+# ventanas que terminan en o después de la compra nueva más antigua.
+class DetectorClusters:
+    def __init__(self, dias=DIAS_CLUSTER, min_insiders=MIN_INSIDERS, min_importe=MIN_IMPORTE):
+        if dias < 1 or min_insiders < 1:
+            raise ValueError("La ventana y el mínimo de insiders deben ser al menos 1.")
+        self.dias = dias
+        self.min_insiders = min_insiders
+        self.min_importe = min_importe
+        self.historiales = {}
+        self.codigos_nombre = {}
+        self.nombres = []
+        self.cache = {}
+        self.aperturas = {}
+        self.ultimas = {}
+
+    # Código estable de cada insider (solo se consulta el diccionario una vez por nombre distinto)
+    def _codigos(self, nombres):
+        posiciones, unicos = pd.factorize(nombres)
+        codigos = np.empty(len(unicos), dtype=np.int64)
+        for i, nombre in enumerate(unicos):
+            if nombre not in self.codigos_nombre:
+                self.codigos_nombre[nombre] = len(self.nombres)
+                self.nombres.append(nombre)
+            codigos[i] = self.codigos_nombre[nombre]
+        return codigos[posiciones]
+
+    # Añade un frame de transacciones (solo cuentan las compras) y devuelve los clusters de los tickers
+    # afectados que son nuevos o han cambiado
+    @medir_etapa('clusters')
+    def actualizar(self, df):
+        tickers, dias, nombres, acciones, importes = _arrays_compras(df)
+        if not len(tickers):
+            return _a_frame([])
+        codigos = self._codigos(nombres)
+        codigos_ticker, etiquetas = pd.factorize(tickers)
+        orden = np.argsort(codigos_ticker, kind='stable')
+        limites = np.flatnonzero(np.diff(codigos_ticker[orden])) + 1
+        cambiados = []
+        for filas in np.split(orden, limites):
+            ticker = etiquetas[codigos_ticker[filas[0]]]
+            historial = self.historiales.setdefault(ticker, _HistorialTicker())
+            inicio = historial.insertar(dias[filas], codigos[filas], acciones[filas], importes[filas])
+            historial.recalcular(inicio, self.dias, self.min_insiders, self.min_importe)
+
+            # Los clusters que terminan antes de la primera ventana recalculada no cambian. El siguiente
+            # se rehace desde su primera ventana válida, que sigue abriendo un cluster si es anterior a
+            # `inicio`; si no, ninguna ventana válida alcanza a `corte` y los clusters empiezan en él
+            corte = int(historial.izquierda[inicio])
+            anteriores = self.cache.get(ticker, [])
+            ultimas = self.ultimas.get(ticker, [])
+            conservados = bisect_left(ultimas, corte)
+            aperturas = self.aperturas.get(ticker, [])
+            desde = min(aperturas[conservados], corte) if conservados < len(aperturas) else corte
+            recalculados, nuevas_aperturas, nuevas_ultimas = self._clusters_ticker(ticker, historial, desde)
+            previos = set(anteriores[conservados:])
+            cambiados.extend(fila for fila in recalculados if fila not in previos)
+            self.cache[ticker] = anteriores[:conservados] + recalculados
+            self.aperturas[ticker] = aperturas[:conservados] + nuevas_aperturas
+            self.ultimas[ticker] = ultimas[:conservados] + nuevas_ultimas
+        resultado = _a_frame(cambiados)
+        logging.info(f"Clusters: {len(resultado)} nuevos o actualizados en {len(limites) + 1} tickers.")
+        return resultado
+
+    # Clusters del ticker a partir de la ventana válida `desde_fila`, con la fila de su primera y de su
+    # última ventana válida
+    def _clusters_ticker(self, ticker, historial, desde_fila=0):
+        filas, aperturas, ultimas = [], [], []
+        for primera, apertura, ultima in historial.rangos(desde_fila):
+            aperturas.append(apertura)
+            ultimas.append(ultima)
+            tramo = slice(primera, ultima + 1)
+            insiders = np.unique(historial.insiders[tramo])
+            filas.append((ticker, int(historial.dias[primera]), int(historial.dias[ultima]), len(insiders),
+                          ultima - primera + 1, float(historial.acciones[tramo].sum()),
+                          float(historial.importes[tramo].sum()),
+                          ', '.join(sorted(self.nombres[i] for i in insiders.tolist()))))
+        return filas, aperturas, ultimas
+
+    # Todos los clusters conocidos, de los más recientes a los más antiguos
+    def clusters(self):
+        return _a_frame([fila for filas in self.cache.values() for fila in filas])
+
+
+def _a_frame(filas):
+    df = pd.DataFrame(filas, columns=COLUMNAS_CLUSTER).astype({
+        'Inicio': 'int64', 'Fin': 'int64', 'Insiders': 'int64', 'Transacciones': 'int64',
+        'Acciones': 'float64', 'Importe': 'float64',
+    })
+    for columna in ('Inicio', 'Fin'):
+        df[columna] = df[columna].to_numpy(dtype='int64').astype('datetime64[D]').astype('datetime64[ns]')
+    df['Acciones'] = df['Acciones'].round().astype('int64')
+    df['Importe'] = df['Importe'].round(2)
+    return df.sort_values(['Fin', 'Ticker', 'Inicio'], ascending=[False, True, False], kind='stable', ignore_index=True)
+
+
+# Clusters de un frame completo de transacciones (para el proceso por lotes y la aplicación)
+def detectar_clusters(df, dias=DIAS_CLUSTER, min_insiders=MIN_INSIDERS, min_importe=MIN_IMPORTE):
+    detector = DetectorClusters(dias, min_insiders, min_importe)
+    detector.actualizar(df)
+    return detector.clusters()
+
+
+# Fechas de inicio y fin como texto d/m/Y para mostrar o exportar
+def presentar_clusters(df):
+    df = df.copy()
+    df['Inicio'] = texto_fechas(df['Inicio'])
+    df['Fin'] = texto_fechas(df['Fin'])
+    return df
@@ -0,0 +1,39 @@
+import logging
+import os
+
+FORMATO_LOG = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+# Configuración de logging a fichero. Solo la llaman los puntos de entrada (app y CLI), nunca
+# los módulos de la librería, para que importar el paquete no tenga efectos secundarios.
+def configurar_logging(archivo='insider_trading.log', nivel=logging.INFO):
+    logging.basicConfig(filename=archivo, level=nivel, format=FORMATO_LOG)
+
+
+# Lee un secreto de las variables de entorno (cargando `.env` si existe) o, si no está, de
+# `st.secrets`. Streamlit y python-dotenv solo se importan si hacen falta.
+def leer_secreto(nombre):
+    valor = os.getenv(nombre)
+    if valor:
+        return valor
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(os.getcwd(), '.env'))
+        valor = os.getenv(nombre)
+    except ImportError:
+        pass
+    if valor:
+        return valor
+    try:
+        import streamlit as st
+        return st.secrets[nombre]
+    except Exception:
+        return None
+
+
+# Clave de la API de Finnhub
+def obtener_api_key():
+    api_key = leer_secreto('Finnhub_API')
+    if not api_key:
+        logging.error("No se encontró la clave 'Finnhub_API' ni en el entorno/.env ni en st.secrets.")
+    return api_key
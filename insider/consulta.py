@@ -0,0 +1,112 @@
+import copy
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from insider.fechas import COLUMNA_FECHA, indexar_por_fecha, inicio_ventana, texto_fechas
+from insider.metricas import medir_etapa
+from insider.resumen import _codificar, agregar_arrays, resumir_agregados
+
+LADOS = ('compras', 'ventas')
+SALIDAS = ('compras', 'ventas', 'resumen_compras', 'resumen_ventas', 'resumen_neto')
+
+
+# Consulta diferida sobre las transacciones: registra tickers, lado, ventana de días y salidas pedidas,
+# y no hace nada hasta `ejecutar`. Entonces recorre una sola vez los arrays de la ventana (búsqueda
+# binaria sobre el frame ordenado por fecha más una máscara sobre los códigos de los categóricos) y solo
+# materializa las tablas pedidas: cada tabla de transacciones es una única selección por posiciones y
+# los resúmenes se calculan sobre los arrays enmascarados, sin copias intermedias del frame.
+#
+#   Consulta(df).tickers(['AAPL']).ventana(29).salidas('compras', 'resumen_compras').ejecutar(total_acciones)
+#
+# Si el origen es un `ArchivoHistorico`, los filtros de ticker, fechas y lado se empujan al escaneo de
+# Arrow y solo se leen los grupos de filas que pueden coincidir.
+class Consulta:
+    def __init__(self, origen):
+        self.origen = origen
+        self.filtro_tickers = None
+        self.filtro_lado = None
+        self.dias = None
+        self.hoy = None
+        self.pedidas = SALIDAS
+        self.formatear = True
+
+    def _con(self, **cambios):
+        nueva = copy.copy(self)
+        nueva.__dict__.update(cambios)
+        return nueva
+
+    def tickers(self, tickers):
+        return self._con(filtro_tickers=tuple(str(t) for t in tickers))
+
+    def lado(self, lado):
+        if lado is not None and lado not in LADOS:
+            raise ValueError(f"Lado desconocido: {lado!r} (usa 'compras' o 'ventas')")
+        return self._con(filtro_lado=lado)
+
+    def ventana(self, dias, hoy=None):
+        return self._con(dias=dias, hoy=hoy)
+
+    # Tablas a materializar. Con `formatear` las de transacciones salen como hasta ahora para mostrarse:
+    # más recientes primero y fechas d/m/Y; sin él, en orden cronológico y con fechas datetime64.
+    def salidas(self, *nombres, formatear=True):
+        desconocidas = set(nombres) - set(SALIDAS)
+        if desconocidas:
+            raise ValueError(f"Salidas desconocidas: {sorted(desconocidas)}")
+        return self._con(pedidas=nombres or SALIDAS, formatear=formatear)
+
+    def _frame(self):
+        if isinstance(self.origen, pd.DataFrame):
+            return indexar_por_fecha(self.origen)
+        desde = None
+        if self.dias is not None:
+            desde = ((self.hoy or datetime.now()) - timedelta(days=self.dias)).date()
+        return self.origen.consultar_frame(tickers=self.filtro_tickers, desde=desde, lado=self.filtro_lado)
+
+    def _materializar(self, df, posiciones):
+        if self.formatear:
+            tabla = df.take(posiciones[::-1]).reset_index(drop=True)
+            tabla[COLUMNA_FECHA] = texto_fechas(tabla[COLUMNA_FECHA])
+        else:
+            tabla = df.take(posiciones).reset_index(drop=True)
+            tabla.attrs['ordenado_por_fecha'] = True
+        return tabla
+
+    # Ejecuta la consulta y devuelve {salida: DataFrame} con las salidas pedidas. `total_acciones` solo
+    # hace falta para los resúmenes.
+    @medir_etapa('consulta')
+    def ejecutar(self, total_acciones=None):
+        df = self._frame()
+        inicio = inicio_ventana(df, self.dias, self.hoy) if self.dias is not None else 0
+
+        cantidad = df['Cantidad'].to_numpy()[inicio:]
+        mascara = cantidad != 0
+        codigos_ticker, etiquetas = _codificar(df['Ticker'])
+        codigos_ticker = codigos_ticker[inicio:]
+        if self.filtro_tickers is not None:
+            seleccion = np.flatnonzero(etiquetas.astype(str).isin(self.filtro_tickers))
+            mascara &= np.isin(codigos_ticker, seleccion)
+        if self.filtro_lado == 'compras':
+            mascara &= cantidad > 0
+        elif self.filtro_lado == 'ventas':
+            mascara &= cantidad < 0
+        filas = np.flatnonzero(mascara)
+        cantidad = cantidad[filas]
+        posiciones = inicio + filas
+
+        resultado = {}
+        if 'compras' in self.pedidas:
+            resultado['compras'] = self._materializar(df, posiciones[cantidad > 0])
+        if 'ventas' in self.pedidas:
+            resultado['ventas'] = self._materializar(df, posiciones[cantidad < 0])
+        if {'resumen_compras', 'resumen_ventas', 'resumen_neto'} & set(self.pedidas):
+            codigos_nombre, _ = _codificar(df['Nombre'])
+            agregados = agregar_arrays(cantidad, df['Precio de Transacción'].to_numpy(dtype='float64')[posiciones],
+                                       codigos_ticker[filas], etiquetas, codigos_nombre[posiciones])
+            resumenes = dict(zip(('resumen_compras', 'resumen_ventas', 'resumen_neto'),
+                                 resumir_agregados(agregados, total_acciones or {})))
+            resultado.update({nombre: tabla for nombre, tabla in resumenes.items() if nombre in self.pedidas})
+        logging.info(f"Consulta ejecutada: {len(filas)} transacciones seleccionadas.")
+        return resultado
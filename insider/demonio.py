@@ -0,0 +1,176 @@
+import logging
+import random
+import signal
+import threading
+from datetime import date, datetime, timedelta
+from functools import partial
+
+import pandas as pd
+
+from insider.acciones import ResolutorAcciones
+from insider.almacen import AlmacenTransacciones, identidad_transaccion, refrescar_incremental
+from insider.archivo import ArchivoHistorico
+from insider.clusters import presentar_clusters
+from insider.config import obtener_api_key
+from insider.descarga import LimitadorTokens
+from insider.http import ClienteFinnhub
+from insider.identidades import IndiceInsiders
+from insider.ingesta import construir_transacciones
+from insider.metricas import METRICAS
+from insider.pipeline import (RUTA_ACCIONES, RUTA_INSIDERS, dividir_compras_ventas, descargar, formatear_fecha,
+                              obtener_acciones_totales)
+
+
+# Proceso residente que sondea Finnhub cada `intervalo_segundos` (± `jitter` en proporción) y envía
+# a los destinos solo las transacciones que no ha visto antes. Mantiene en memoria el cliente HTTP,
+# el limitador, el almacén y el conjunto de transacciones vistas, y cada sondeo pide a la API solo
+# lo posterior a la marca de agua de cada ticker (o los últimos `dias_iniciales` si aún no tiene datos),
+# de modo que su coste depende de los datos nuevos.
+class Demonio:
+    def __init__(self, tickers, sumideros, intervalo_segundos=900, jitter=0.1, ruta_almacen='insider_transacciones.db',
+                 llamadas_por_minuto=60, max_workers=8, api_key=None, dias_iniciales=30, ruta_metricas=None,
+                 archivo=None, detector=None, agregados=None, ruta_insiders=RUTA_INSIDERS, retencion_dias=None):
+        self.tickers = list(dict.fromkeys(tickers))
+        self.sumideros = list(sumideros)
+        self.intervalo_segundos = intervalo_segundos
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.dias_iniciales = dias_iniciales
+        self.ruta_metricas = ruta_metricas
+        self.archivo = ArchivoHistorico(archivo) if archivo else None
+        self.cliente = ClienteFinnhub(api_key or obtener_api_key(), tam_pool=max_workers)
+        self.limitador = LimitadorTokens(llamadas_por_minuto)
+        # TTL 0: en cada sondeo se consultan todos los tickers, pero solo desde su marca de agua
+        self.almacen = AlmacenTransacciones(ruta_almacen, ttl_horas=0, retencion_dias=retencion_dias)
+        # Día de la última purga del almacén: se purga como mucho una vez al día
+        self.purgado = None
+        self.descargar = partial(descargar, cliente=self.cliente)
+        # Lo que ya está en el almacén se considera visto, para no reenviar el histórico al reiniciar
+        self.vistos = self.almacen.identidades(self.tickers)
+        # Índice de insiders: las variantes del nombre de una persona cuentan como una en resúmenes y clusters
+        self.indice = IndiceInsiders(ruta_insiders)
+        # Acciones en circulación para los resúmenes, con su caché abierta mientras dure el demonio
+        self.resolutor = ResolutorAcciones(RUTA_ACCIONES)
+        # Detector de compras en grupo, partiendo de las compras recientes ya almacenadas
+        self.detector = detector
+        if detector is not None:
+            desde = (datetime.now() - timedelta(days=detector.dias)).date()
+            detector.actualizar(self._transacciones(self.almacen.leer_ventana(self.tickers, desde=desde)))
+        # Resúmenes de compras y ventas de la ventana (`AgregadosVentana`), mantenidos por deltas en cada sondeo
+        self.agregados = agregados
+        if agregados is not None:
+            desde = (datetime.now() - timedelta(days=agregados.dias)).date()
+            agregados.anadir(self._transacciones(self.almacen.leer_ventana(self.tickers, desde=desde)))
+        # Transacciones cuyo archivado falló; se reintentan en el siguiente sondeo
+        self.pendientes_archivo = []
+        self.parada = threading.Event()
+
+    def _transacciones(self, registros, con_id=False):
+        return self.indice.unificar(construir_transacciones(registros, con_id=con_id))
+
+    # Un ciclo de sondeo: devuelve el frame de transacciones nuevas enviadas a los destinos
+    def sondear(self):
+        resultados = refrescar_incremental(self.almacen, self.tickers, self.descargar,
+                                           max_workers=self.max_workers, limitador=self.limitador,
+                                           dias_iniciales=self.dias_iniciales)
+        if self.purgado != date.today():
+            self.almacen.purgar()
+            self.purgado = date.today()
+        nuevas = {}
+        claves = set()
+        for resultado in resultados:
+            if not resultado.ok:
+                continue
+            for registro in resultado.datos:
+                clave = (resultado.ticker, identidad_transaccion(registro))
+                if clave not in self.vistos and clave not in claves:
+                    claves.add(clave)
+                    nuevas.setdefault(resultado.ticker, []).append(registro)
+
+        df_nuevas = self._transacciones(nuevas, con_id=self.archivo is not None)
+        logging.info(f"Sondeo completado: {len(df_nuevas)} transacciones nuevas.")
+        if self.archivo is not None:
+            # El archivo usa el Id como clave; los destinos no lo muestran
+            self._archivar(df_nuevas)
+            df_nuevas = df_nuevas.drop(columns='Id')
+        if not df_nuevas.empty:
+            df_compras, df_ventas = dividir_compras_ventas(df_nuevas)
+            tablas = {'Compras': formatear_fecha(df_compras), 'Ventas': formatear_fecha(df_ventas)}
+            if self.detector is not None:
+                clusters = self.detector.actualizar(df_nuevas)
+                for cluster in clusters.itertuples(index=False):
+                    logging.warning(f"Compra en grupo en {cluster.Ticker}: {cluster.Insiders} insiders, "
+                                    f"{cluster.Importe:,.0f} entre {cluster.Inicio:%d/%m/%Y} y {cluster.Fin:%d/%m/%Y}.")
+                if not clusters.empty:
+                    tablas['Clusters'] = presentar_clusters(clusters)
+            for sumidero in self.sumideros:
+                try:
+                    sumidero.anadir(tablas)
+                except Exception as e:
+                    logging.error(f"Error al enviar transacciones nuevas con {type(sumidero).__name__}: {e}")
+        if self.agregados is not None:
+            self._actualizar_resumenes(df_nuevas)
+        # Solo se dan por vistas una vez enviadas; si el sondeo falla antes, se reenvían en el siguiente
+        self.vistos.update(claves)
+        return df_nuevas
+
+    # Añade al archivo las transacciones nuevas y las que quedaron pendientes. Un fallo del archivo no
+    # detiene el envío a los destinos: las filas se guardan para reintentarlo en el siguiente sondeo
+    # (`anadir` no duplica las que ya estén archivadas).
+    def _archivar(self, df_nuevas):
+        lotes = self.pendientes_archivo + ([df_nuevas] if not df_nuevas.empty else [])
+        if not lotes:
+            return
+        df = pd.concat(lotes) if len(lotes) > 1 else lotes[0]
+        try:
+            self.archivo.anadir(df)
+            self.pendientes_archivo = []
+        except Exception as e:
+            logging.error(f"Error al archivar {len(df)} transacciones (se reintentará): {e}")
+            self.pendientes_archivo = [df]
+
+    # Aplica a los agregados las transacciones nuevas y las que salen de la ventana y, si algo cambia,
+    # reescribe los resúmenes en los destinos que permiten sustituir una tabla suelta
+    def _actualizar_resumenes(self, df_nuevas):
+        cambios = self.agregados.avanzar() + self.agregados.anadir(df_nuevas)
+        if not cambios:
+            return
+        totales = obtener_acciones_totales(self.tickers, resolutor=self.resolutor)
+        resumen_compras, resumen_ventas, _ = self.agregados.resumenes(totales)
+        tablas = {'Resumen Compras': resumen_compras, 'Resumen Ventas': resumen_ventas}
+        for sumidero in self.sumideros:
+            if not sumidero.escritura_por_tabla:
+                continue
+            try:
+                sumidero.escribir(tablas)
+            except Exception as e:
+                logging.error(f"Error al actualizar los resúmenes con {type(sumidero).__name__}: {e}")
+
+    def _espera(self):
+        return max(0.0, self.intervalo_segundos * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def detener(self, *_):
+        logging.info("Parada solicitada; el demonio terminará tras el ciclo en curso.")
+        self.parada.set()
+
+    # Bucle principal hasta recibir SIGINT/SIGTERM o `detener()`
+    def ejecutar(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.detener)
+            signal.signal(signal.SIGTERM, self.detener)
+        logging.info(f"Demonio iniciado para {len(self.tickers)} tickers cada {self.intervalo_segundos} s.")
+        try:
+            while not self.parada.is_set():
+                try:
+                    self.sondear()
+                except Exception as e:
+                    logging.error(f"Error en el sondeo: {e}")
+                if self.ruta_metricas:
+                    METRICAS.exportar(self.ruta_metricas)
+                self.parada.wait(self._espera())
+        finally:
+            self.cliente.cerrar()
+            self.almacen.cerrar()
+            self.indice.cerrar()
+            self.resolutor.cerrar()
+            logging.info("Demonio detenido.")
@@ -0,0 +1,95 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from insider.metricas import METRICAS
+
+# URL base de la API; se puede sustituir (por ejemplo por un servidor local de pruebas) con la variable FINNHUB_URL
+FINNHUB_URL = os.getenv('FINNHUB_URL', 'https://finnhub.io/api/v1')
+
+
+# Limitador "token bucket" compartido entre hilos para respetar la cuota por minuto de Finnhub.
+# La tasa de recarga descuenta la ráfaga inicial, de modo que en cualquier ventana de 60 segundos
+# nunca se hacen más de `llamadas_por_minuto` peticiones. El estado (`estado[0]` = tokens disponibles,
+# `estado[1]` = instante de la última recarga según `reloj`) y el cerrojo se crean en `_crear_estado`,
+# que las subclases sustituyen para compartirlos entre procesos.
+class LimitadorTokens:
+    reloj = staticmethod(time.monotonic)
+
+    def __init__(self, llamadas_por_minuto=60, rafaga=None):
+        if llamadas_por_minuto <= 0:
+            raise ValueError("llamadas_por_minuto debe ser mayor que 0")
+        self.capacidad = rafaga if rafaga is not None else max(1, llamadas_por_minuto // 10)
+        self.capacidad = min(self.capacidad, llamadas_por_minuto)
+        self.tasa = max(llamadas_por_minuto - self.capacidad, 1) / 60.0
+        self.estado, self.lock = self._crear_estado([float(self.capacidad), self.reloj()])
+
+    def _crear_estado(self, inicial):
+        return inicial, threading.Lock()
+
+    def _recargar(self, ahora):
+        self.estado[0] = min(self.capacidad, self.estado[0] + (ahora - self.estado[1]) * self.tasa)
+        self.estado[1] = ahora
+
+    # Bloquea hasta disponer de un token y devuelve los segundos esperados
+    def adquirir(self):
+        esperado = 0.0
+        while True:
+            with self.lock:
+                self._recargar(self.reloj())
+                if self.estado[0] >= 1:
+                    self.estado[0] -= 1
+                    if esperado:
+                        METRICAS.contar('insider_limitador_espera_segundos_total', esperado)
+                    return esperado
+                espera = (1 - self.estado[0]) / self.tasa
+            time.sleep(espera)
+            esperado += espera
+
+
+_hilo = threading.local()
+
+
+# Limitador de la descarga que está haciendo este hilo dentro de `descargar_concurrente` (o None). El
+# cliente HTTP lo usa para que también los reintentos consuman un token.
+def limitador_actual():
+    return getattr(_hilo, 'limitador', None)
+
+
+# Resultado de la descarga de un ticker: o bien datos, o bien el error que se produjo
+@dataclass
+class ResultadoTicker:
+    ticker: str
+    datos: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+# Ejecuta `funcion(ticker)` para todos los tickers en paralelo, respetando el limitador.
+# Los resultados se devuelven en el mismo orden que los tickers de entrada y el fallo de un
+# ticker no afecta al resto.
+def descargar_concurrente(tickers, funcion, max_workers=8, limitador=None):
+    def tarea(ticker):
+        if limitador is not None:
+            limitador.adquirir()
+        _hilo.limitador = limitador
+        try:
+            return ResultadoTicker(ticker, datos=funcion(ticker))
+        except Exception as e:
+            logging.error(f"Error al obtener datos para {ticker}: {e}")
+            return ResultadoTicker(ticker, error=e)
+        finally:
+            _hilo.limitador = None
+
+    tickers = list(tickers)
+    if not tickers:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as ejecutor:
+        return list(ejecutor.map(tarea, tickers))
@@ -0,0 +1,242 @@
+import logging
+import math
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from insider.metricas import medir_etapa
+
+# Disposición por defecto del libro de Google Sheets: cada hoja muestra las transacciones y, a su
+# derecha (dejando una columna en blanco), el resumen correspondiente. Las compras en grupo van a la
+# derecha del resumen de compras
+DISPOSICION_SHEETS = {
+    'Compras': ['Compras', 'Resumen Compras', 'Clusters'],
+    'Ventas': ['Ventas', 'Resumen Ventas'],
+}
+
+
+# Interfaz común de los destinos de exportación. `escribir` recibe {nombre_tabla: DataFrame}
+# y sustituye el contenido anterior; `anadir` agrega filas nuevas sin tocar las existentes.
+# `escritura_por_tabla` indica si `escribir` con solo algunas tablas deja intactas las demás.
+class Sumidero(ABC):
+    escritura_por_tabla = True
+
+    @abstractmethod
+    def escribir(self, tablas):
+        ...
+
+    @abstractmethod
+    def anadir(self, tablas):
+        ...
+
+
+class SumideroCSV(Sumidero):
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, f'{nombre}.csv')
+
+    def escribir(self, tablas):
+        for nombre, df in tablas.items():
+            df.to_csv(self._ruta(nombre), index=False)
+        logging.info(f"{len(tablas)} tablas exportadas a CSV en {self.directorio}.")
+
+    def anadir(self, tablas):
+        for nombre, df in tablas.items():
+            ruta = self._ruta(nombre)
+            df.to_csv(ruta, mode='a', header=not os.path.exists(ruta), index=False)
+
+
+class SumideroParquet(Sumidero):
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    def escribir(self, tablas):
+        for nombre, df in tablas.items():
+            df.to_parquet(os.path.join(self.directorio, f'{nombre}.parquet'), index=False)
+        logging.info(f"{len(tablas)} tablas exportadas a Parquet en {self.directorio}.")
+
+    # Parquet no admite añadir filas a un fichero: cada lote nuevo va a un fichero de la carpeta de la tabla
+    def anadir(self, tablas):
+        for nombre, df in tablas.items():
+            carpeta = os.path.join(self.directorio, nombre)
+            os.makedirs(carpeta, exist_ok=True)
+            df.to_parquet(os.path.join(carpeta, f'{pd.Timestamp.now():%Y%m%dT%H%M%S%f}.parquet'), index=False)
+
+
+class SumideroSQLite(Sumidero):
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def _volcar(self, tablas, modo):
+        with sqlite3.connect(self.ruta) as conexion:
+            for nombre, df in tablas.items():
+                df.to_sql(nombre, conexion, if_exists=modo, index=False)
+
+    def escribir(self, tablas):
+        self._volcar(tablas, 'replace')
+        logging.info(f"{len(tablas)} tablas exportadas a SQLite en {self.ruta}.")
+
+    def anadir(self, tablas):
+        self._volcar(tablas, 'append')
+
+
+# Convierte una celda a un valor serializable por la API de Sheets ('' para nulos)
+def _valor_celda(valor):
+    if valor is None or valor is pd.NaT:
+        return ''
+    if isinstance(valor, (float, np.floating)) and math.isnan(valor):
+        return ''
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, pd.Timestamp):
+        return valor.strftime('%Y-%m-%d')
+    return valor
+
+
+# Cuadrícula (lista de filas) con la cabecera y los valores de un DataFrame
+def _cuadricula(df):
+    filas = [[str(c) for c in df.columns]]
+    filas.extend([_valor_celda(v) for v in fila] for fila in df.itertuples(index=False, name=None))
+    return filas
+
+
+# Coloca varias tablas una al lado de otra, separadas por una columna vacía
+def componer_hoja(tablas):
+    bloques = [_cuadricula(df) for df in tablas]
+    alto = max((len(b) for b in bloques), default=0)
+    hoja = [[] for _ in range(alto)]
+    for indice, bloque in enumerate(bloques):
+        ancho = len(bloque[0]) if bloque else 0
+        for fila in range(alto):
+            hoja[fila].extend(bloque[fila] if fila < len(bloque) else [''] * ancho)
+            if indice < len(bloques) - 1:
+                hoja[fila].append('')
+    return hoja
+
+
+def _letra_columna(col):
+    letras = ''
+    while col > 0:
+        col, resto = divmod(col - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+# Rangos A1 con las filas que cambian entre dos cuadrículas. Las filas contiguas se agrupan en un
+# solo rango y las celdas que ya no existen se sobrescriben con '' para vaciarlas.
+def diferencias(anterior, nueva):
+    ancho = max([len(f) for f in anterior] + [len(f) for f in nueva] + [0])
+    alto = max(len(anterior), len(nueva))
+    if ancho == 0:
+        return []
+
+    def normalizar(filas, i):
+        fila = list(filas[i]) if i < len(filas) else []
+        return fila + [''] * (ancho - len(fila))
+
+    def comparable(fila):
+        return [str(v) for v in fila]
+
+    rangos, bloque, inicio = [], [], None
+    for i in range(alto):
+        fila_nueva = normalizar(nueva, i)
+        if comparable(normalizar(anterior, i)) != comparable(fila_nueva):
+            if inicio is None:
+                inicio = i
+            bloque.append(fila_nueva)
+        elif inicio is not None:
+            rangos.append((inicio, bloque))
+            bloque, inicio = [], None
+    if inicio is not None:
+        rangos.append((inicio, bloque))
+
+    return [{
+        'range': f'A{inicio + 1}:{_letra_columna(ancho)}{inicio + len(filas)}',
+        'values': filas,
+    } for inicio, filas in rangos]
+
+
+# Destino Google Sheets con escritura por diferencias: recuerda lo último que escribió en cada hoja
+# (la primera vez lo lee con una sola llamada) y envía únicamente las filas que cambian en una sola
+# `batch_update` por hoja, sin vaciar la hoja antes. Funciona con cualquier objeto que ofrezca la API
+# de gspread (`worksheet`, `get_all_values`, `batch_update`, `row_count`, `col_count`, `resize`).
+class SumideroGoogleSheets(Sumidero):
+    # Cada hoja se compone con todas sus tablas: escribir solo una borraría las otras de la hoja
+    escritura_por_tabla = False
+
+    def __init__(self, libro, disposicion=None):
+        self.libro = libro
+        self.disposicion = disposicion or DISPOSICION_SHEETS
+        self.hojas = {}
+        self.ultimo = {}
+
+    def _hoja(self, nombre):
+        if nombre not in self.hojas:
+            self.hojas[nombre] = self.libro.worksheet(nombre)
+        return self.hojas[nombre]
+
+    def _actualizar_hoja(self, nombre, cuadricula):
+        hoja = self._hoja(nombre)
+        if nombre not in self.ultimo:
+            self.ultimo[nombre] = hoja.get_all_values()
+        cambios = diferencias(self.ultimo[nombre], cuadricula)
+        if not cambios:
+            logging.info(f"Hoja '{nombre}' sin cambios; no se escribe nada.")
+            return 0
+
+        filas = max(len(cuadricula), len(self.ultimo[nombre]))
+        columnas = max([len(f) for f in cuadricula] + [len(f) for f in self.ultimo[nombre]])
+        if filas > hoja.row_count or columnas > hoja.col_count:
+            hoja.resize(rows=max(filas, hoja.row_count), cols=max(columnas, hoja.col_count))
+        hoja.batch_update(cambios, value_input_option='USER_ENTERED')
+        self.ultimo[nombre] = [list(f) for f in cuadricula]
+        logging.info(f"Hoja '{nombre}': {sum(len(c['values']) for c in cambios)} filas actualizadas en una sola llamada.")
+        return len(cambios)
+
+    def escribir(self, tablas):
+        for nombre, componentes in self.disposicion.items():
+            presentes = [tablas[t] for t in componentes if t in tablas]
+            if presentes:
+                self._actualizar_hoja(nombre, componer_hoja(presentes))
+
+    # Añade filas nuevas debajo de la primera tabla de cada hoja
+    def anadir(self, tablas):
+        for nombre, componentes in self.disposicion.items():
+            if componentes[0] not in tablas or tablas[componentes[0]].empty:
+                continue
+            filas = _cuadricula(tablas[componentes[0]])[1:]
+            self._hoja(nombre).append_rows(filas, value_input_option='USER_ENTERED', table_range='A1')
+            self.ultimo.pop(nombre, None)
+
+
+# Crea un destino a partir de una especificación de texto: 'sheets', 'csv:DIR', 'parquet:DIR' o 'sqlite:RUTA'
+def crear_sumidero(especificacion):
+    tipo, _, destino = especificacion.partition(':')
+    if tipo == 'sheets':
+        from insider.sheets import abrir_libro
+        libro = abrir_libro(destino or None)
+        return SumideroGoogleSheets(libro) if libro is not None else None
+    if tipo == 'csv':
+        return SumideroCSV(destino or 'salida')
+    if tipo == 'parquet':
+        return SumideroParquet(destino or 'salida')
+    if tipo == 'sqlite':
+        return SumideroSQLite(destino or 'insider_salida.db')
+    raise ValueError(f"Destino de exportación desconocido: {especificacion}")
+
+
+# Escribe las tablas en todos los destinos; el fallo de uno no impide escribir en los demás
+@medir_etapa('exportacion')
+def exportar(tablas, sumideros):
+    for sumidero in sumideros:
+        try:
+            sumidero.escribir(tablas)
+        except Exception as e:
+            logging.error(f"Error al exportar con {type(sumidero).__name__}: {e}")
@@ -0,0 +1,52 @@
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+COLUMNA_FECHA = 'Fecha de Transacción'
+FORMATO_PRESENTACION = '%d/%m/%Y'
+
+
+# Ordena el frame una sola vez por fecha ascendente (las fechas nulas al principio) y lo marca
+# como ordenado. Si la columna aún no es datetime64 (datos antiguos), se parsea aquí.
+def indexar_por_fecha(df):
+    if df.attrs.get('ordenado_por_fecha'):
+        return df
+    df = df.copy()
+    if not pd.api.types.is_datetime64_any_dtype(df[COLUMNA_FECHA]):
+        df[COLUMNA_FECHA] = pd.to_datetime(df[COLUMNA_FECHA], errors='coerce')
+    df = df.sort_values(COLUMNA_FECHA, kind='stable', na_position='first', ignore_index=True)
+    df.attrs['ordenado_por_fecha'] = True
+    return df
+
+
+# Devuelve las transacciones de los últimos `dias` días con una búsqueda binaria sobre la columna
+# ordenada (NaT equivale al mínimo int64, por lo que las fechas nulas quedan siempre fuera).
+def ventana_dias(df, dias, hoy=None):
+    df = indexar_por_fecha(df)
+    return df.iloc[inicio_ventana(df, dias, hoy):]
+
+
+# Primera fila de la ventana de los últimos `dias` días en un frame ya ordenado por fecha
+def inicio_ventana(df, dias, hoy=None):
+    hoy = hoy or datetime.now()
+    limite = pd.Timestamp((hoy - timedelta(days=dias)).date())
+    fechas = df[COLUMNA_FECHA].to_numpy().view('i8')
+    return int(fechas.searchsorted(limite.as_unit('ns').value, side='left'))
+
+
+# Fechas como texto d/m/Y. Solo se formatea cada fecha distinta una vez (hay muchas menos fechas
+# que transacciones) y el resultado se reparte con los códigos de factorize.
+def texto_fechas(serie):
+    codigos, unicas = pd.factorize(serie)
+    textos = np.append(pd.DatetimeIndex(unicas).strftime(FORMATO_PRESENTACION).to_numpy(dtype=object), '')
+    return pd.Series(textos[codigos], index=serie.index, name=serie.name)
+
+
+# Capa de presentación: más recientes primero y fechas en formato d/m/Y como texto
+def presentar_fechas(df):
+    df = indexar_por_fecha(df).iloc[::-1].reset_index(drop=True)
+    df[COLUMNA_FECHA] = texto_fechas(df[COLUMNA_FECHA])
+    logging.info("Fechas formateadas a d/m/y.")
+    return df
@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+
+from insider import descarga
+from insider.descarga import limitador_actual
+from insider.metricas import METRICAS
+
+# Códigos de respuesta que indican un problema transitorio del servidor
+CODIGOS_REINTENTABLES = frozenset([429, 500, 502, 503, 504])
+
+# Errores de red que merecen reintento (un cuerpo cortado llega como ChunkedEncodingError)
+ERRORES_REINTENTABLES = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                         requests.exceptions.ChunkedEncodingError)
+
+
+# El cortacircuitos está abierto: Finnhub se considera caído y no se hace la petición
+class CircuitoAbierto(Exception):
+    pass
+
+
+# Respuesta transitoria (429 o 5xx) que merece reintento; `retry_after` en segundos si el servidor lo indicó
+class ErrorTransitorio(requests.exceptions.HTTPError):
+    def __init__(self, mensaje, response=None, retry_after=None):
+        super().__init__(mensaje, response=response)
+        self.retry_after = retry_after
+
+
+# Interpreta la cabecera Retry-After (segundos o fecha HTTP)
+def segundos_retry_after(valor, ahora=None):
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    ahora = ahora or datetime.now(timezone.utc)
+    return max(0.0, (fecha - ahora).total_seconds())
+
+
+# Cortacircuitos: tras `umbral_fallos` fallos seguidos se abre durante `segundos_apertura` y todas las
+# peticiones fallan al instante; pasado ese tiempo deja pasar una petición de prueba (semiabierto) y
+# se cierra si tiene éxito
+class Cortacircuitos:
+    def __init__(self, umbral_fallos=5, segundos_apertura=30.0):
+        self.umbral_fallos = umbral_fallos
+        self.segundos_apertura = segundos_apertura
+        self.lock = threading.Lock()
+        self.fallos = 0
+        self.abierto_hasta = None
+        self.prueba_en_curso = False
+
+    @property
+    def estado(self):
+        with self.lock:
+            if self.abierto_hasta is None:
+                return 'cerrado'
+            return 'abierto' if time.monotonic() < self.abierto_hasta else 'semiabierto'
+
+    def permitir(self):
+        with self.lock:
+            if self.abierto_hasta is None:
+                return
+            if time.monotonic() < self.abierto_hasta or self.prueba_en_curso:
+                METRICAS.contar('insider_cortacircuitos_rechazos_total')
+                raise CircuitoAbierto("Finnhub no está disponible; el cortacircuitos está abierto.")
+            self.prueba_en_curso = True
+
+    def exito(self):
+        with self.lock:
+            self.fallos = 0
+            self.abierto_hasta = None
+            self.prueba_en_curso = False
+
+    def fallo(self):
+        with self.lock:
+            self.fallos += 1
+            if self.prueba_en_curso or self.fallos >= self.umbral_fallos:
+                if self.abierto_hasta is None or self.prueba_en_curso:
+                    logging.warning(f"Cortacircuitos abierto durante {self.segundos_apertura} s tras {self.fallos} fallos.")
+                    METRICAS.contar('insider_cortacircuitos_aperturas_total')
+                self.abierto_hasta = time.monotonic() + self.segundos_apertura
+                self.prueba_en_curso = False
+
+
+# Cliente HTTP de Finnhub con conexiones persistentes (pool del tamaño de la concurrencia), tiempos
+# de espera explícitos, reintentos con espera exponencial que respetan Retry-After y cortacircuitos.
+class ClienteFinnhub:
+    def __init__(self, api_key, base_url=None, timeout=(3.05, 15), reintentos=4, espera_inicial=1.0,
+                 espera_maxima=60.0, tam_pool=16, cortacircuitos=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.cortacircuitos = cortacircuitos or Cortacircuitos()
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tam_pool, max_retries=0)
+        self.sesion.mount('https://', adaptador)
+        self.sesion.mount('http://', adaptador)
+
+    def cerrar(self):
+        self.sesion.close()
+
+    def _espera(self, estado):
+        retry_after = getattr(estado.outcome.exception(), 'retry_after', None)
+        if retry_after is not None:
+            return min(retry_after, self.espera_maxima)
+        return wait_exponential_jitter(initial=self.espera_inicial, max=self.espera_maxima,
+                                       jitter=self.espera_inicial)(estado)
+
+    # Un intento: comprueba el cortacircuitos, toma un token del limitador (cada reintento consume
+    # cuota como una petición más), hace la petición y clasifica el resultado. Cualquier error de la
+    # petición cuenta como fallo, de modo que una petición de prueba siempre cierra o reabre el circuito.
+    def _intento(self, url, params, limitador=None):
+        self.cortacircuitos.permitir()
+        inicio = time.perf_counter()
+        try:
+            if limitador is not None:
+                limitador.adquirir()
+                inicio = time.perf_counter()
+            respuesta = self.sesion.get(url, params=params, timeout=self.timeout)
+        except Exception:
+            self.cortacircuitos.fallo()
+            raise
+        finally:
+            METRICAS.observar('insider_http_latencia_segundos', time.perf_counter() - inicio, host=urlparse(url).hostname)
+
+        if respuesta.status_code in CODIGOS_REINTENTABLES:
+            METRICAS.contar('insider_http_reintentables_total', codigo=respuesta.status_code)
+            # Un 429 es la cuota, no una caída: no cuenta para abrir el circuito
+            if respuesta.status_code != 429:
+                self.cortacircuitos.fallo()
+            else:
+                self.cortacircuitos.exito()
+            raise ErrorTransitorio(f"{respuesta.status_code} de {urlparse(url).hostname}", response=respuesta,
+                                   retry_after=segundos_retry_after(respuesta.headers.get('Retry-After')))
+        self.cortacircuitos.exito()
+        respuesta.raise_for_status()
+        return respuesta.json()
+
+    # `limitador` (por defecto, el de la descarga en curso en este hilo) da un token a cada reintento;
+    # el del primer intento ya lo tomó `descargar_concurrente`
+    def get(self, ruta, params=None, limitador=None):
+        url = f'{self.base_url or descarga.FINNHUB_URL}{ruta}'
+        params = dict(params or {}, token=self.api_key)
+        limitador = limitador or limitador_actual()
+        intentos = []
+
+        def intento():
+            intentos.append(None)
+            return self._intento(url, params, limitador if len(intentos) > 1 else None)
+
+        reintentos = Retrying(
+            stop=stop_after_attempt(self.reintentos),
+            wait=self._espera,
+            retry=retry_if_exception_type((ErrorTransitorio,) + ERRORES_REINTENTABLES),
+            before_sleep=lambda estado: logging.warning(
+                f"Reintentando {ruta} ({params.get('symbol', '')}) tras: {estado.outcome.exception()}"),
+            reraise=True,
+        )
+        return reintentos(intento)
+
+    # Registros en bruto de /stock/insider-transactions para un ticker
+    def transacciones_insiders(self, ticker, desde=None, hasta=None):
+        params = {'symbol': ticker}
+        if desde is not None:
+            params['from'] = str(desde)
+        if hasta is not None:
+            params['to'] = str(hasta)
+        return self.get('/stock/insider-transactions', params).get('data', []) or []
+
+
+_clientes = {}
+_lock_clientes = threading.Lock()
+
+
+# Cliente compartido por proceso para cada clave de API, para reutilizar las conexiones
+def cliente_compartido(api_key):
+    with _lock_clientes:
+        if api_key not in _clientes:
+            _clientes[api_key] = ClienteFinnhub(api_key)
+        return _clientes[api_key]
@@ -0,0 +1,220 @@
+import logging
+import re
+import sqlite3
+import threading
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from insider.almacen import identidad_transaccion
+from insider.fechas import COLUMNA_FECHA, indexar_por_fecha
+from insider.ingesta import CODIGOS_TRANSACCION, COLUMNAS, normalizar_nombre
+
+# Sufijos que no distinguen a una persona en los formularios ("COOK TIMOTHY D JR")
+SUFIJOS = frozenset(['JR', 'SR', 'II', 'III', 'IV', 'MD', 'PHD', 'ESQ', 'CPA'])
+
+_NO_LETRAS = re.compile(r'[^A-Z0-9 ]+')
+
+
+# Clave de un nombre tal como lo publica la SEC/Finnhub ("APELLIDO NOMBRE [SEGUNDO]"): mayúsculas sin
+# acentos ni puntuación y sin sufijos. Devuelve (apellido, nombres) o None si el nombre está vacío.
+@lru_cache(maxsize=65536)
+def partes_nombre(nombre):
+    texto = unicodedata.normalize('NFKD', nombre if isinstance(nombre, str) else '')
+    texto = _NO_LETRAS.sub(' ', texto.encode('ascii', 'ignore').decode().upper())
+    partes = [parte for parte in texto.split() if parte not in SUFIJOS]
+    if not partes:
+        return None
+    return partes[0], tuple(partes[1:])
+
+
+# Texto de la clave ("COOK TIMOTHY D"); es lo que se guarda como variante
+def clave_nombre(nombre):
+    partes = partes_nombre(nombre)
+    return ' '.join((partes[0],) + partes[1]) if partes else ''
+
+
+# Nombre que se muestra, como en la columna 'Nombre' pero sin sufijos ("Arthur D Levinson")
+def _presentar(nombre):
+    return ' '.join(parte for parte in normalizar_nombre(nombre).split() if parte.upper().strip('.') not in SUFIJOS)
+
+
+# Vuelve a poner el apellido delante en un nombre ya presentado ("Timothy D Cook" -> "Cook Timothy D"),
+# el orden en que lo espera `partes_nombre`; deshace `ingesta.invertir_nombre`
+def _orden_formulario(nombre):
+    partes = nombre.split() if isinstance(nombre, str) else []
+    return ' '.join(partes[-1:] + partes[:-1])
+
+
+# Dos listas de nombres de pila son de la misma persona si cada nombre es prefijo del otro
+# ("TIM" y "TIMOTHY", "T" y "TIMOTHY"); si solo una trae segundo nombre, no se contradicen. Un apellido
+# suelto ("COOK") no basta para unir a nadie: ambas tienen que traer al menos un nombre de pila.
+def compatibles(nombres, otros):
+    return bool(nombres) and bool(otros) and all(a.startswith(b) or b.startswith(a) for a, b in zip(nombres, otros))
+
+
+# Índice persistente (SQLite) de identidades de insiders. Asigna un identificador estable a cada persona
+# y reúne bajo él las variantes con que aparece su nombre ("COOK TIMOTHY D", "Cook Tim"); además guarda,
+# agrupadas por persona, sus transacciones de compra y venta en todos los tickers indexados.
+#
+# Las variantes ya vistas se resuelven con un diccionario en memoria. Una variante nueva se asigna a la
+# única persona con el mismo apellido y nombres compatibles; si no hay ninguna, o hay varias posibles,
+# se crea una persona nueva. Las transacciones se guardan con clave primaria (insider, ticker, id) en
+# una tabla sin rowid, así que las de una persona son un único tramo contiguo del índice.
+class IndiceInsiders:
+    def __init__(self, ruta='insider_insiders.db'):
+        self.lock = threading.Lock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.executescript('''
+            CREATE TABLE IF NOT EXISTS insiders (
+                id INTEGER PRIMARY KEY,
+                apellido TEXT NOT NULL,
+                nombres TEXT NOT NULL,
+                nombre TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS variantes (
+                variante TEXT PRIMARY KEY,
+                insider INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS apariciones (
+                insider INTEGER NOT NULL,
+                ticker TEXT NOT NULL,
+                id TEXT NOT NULL,
+                name TEXT,
+                change REAL,
+                transactionPrice REAL,
+                share REAL,
+                transactionDate TEXT,
+                PRIMARY KEY (insider, ticker, id)
+            ) WITHOUT ROWID;
+        ''')
+        self.variantes = dict(self.conexion.execute('SELECT variante, insider FROM variantes'))
+        self.nombres = {}
+        self.por_apellido = {}
+        for identificador, apellido, nombres, nombre in self.conexion.execute('SELECT * FROM insiders'):
+            self.nombres[identificador] = nombre
+            self.por_apellido.setdefault(apellido, []).append([identificador, tuple(nombres.split())])
+        # Recuento por persona de `insiders()`; se rehace solo cuando cambian las apariciones o las variantes
+        self.recuento = None
+
+    def cerrar(self):
+        with self.lock:
+            self.conexion.close()
+
+    # Persona a la que corresponde una variante nueva (creándola si hace falta)
+    def _asignar(self, nombre, nuevas):
+        partes = partes_nombre(nombre)
+        if partes is None:
+            return -1
+        apellido, nombres = partes
+        candidatas = [c for c in self.por_apellido.get(apellido, []) if compatibles(nombres, c[1])]
+        if len(candidatas) == 1:
+            candidata = candidatas[0]
+            # La variante más completa da el nombre que se muestra ("Timothy D Cook" mejor que "Tim Cook")
+            if sum(map(len, nombres)) > sum(map(len, candidata[1])):
+                candidata[1] = nombres
+                self.nombres[candidata[0]] = _presentar(nombre)
+                nuevas['insiders'][candidata[0]] = (candidata[0], apellido, ' '.join(nombres),
+                                                    self.nombres[candidata[0]])
+            return candidata[0]
+        identificador = max(self.nombres, default=0) + 1
+        self.nombres[identificador] = _presentar(nombre)
+        self.por_apellido.setdefault(apellido, []).append([identificador, nombres])
+        nuevas['insiders'][identificador] = (identificador, apellido, ' '.join(nombres), self.nombres[identificador])
+        return identificador
+
+    # Identificador de cada nombre (-1 para los vacíos). Solo se trabaja una vez por nombre distinto.
+    def resolver(self, nombres):
+        codigos, unicos = pd.factorize(pd.Series(nombres, dtype='object'), use_na_sentinel=False)
+        nuevas = {'insiders': {}, 'variantes': []}
+        identificadores = np.empty(len(unicos), dtype=np.int64)
+        with self.lock:
+            for i, nombre in enumerate(unicos):
+                variante = clave_nombre(nombre)
+                if variante not in self.variantes:
+                    self.variantes[variante] = self._asignar(nombre, nuevas)
+                    if self.variantes[variante] >= 0:
+                        nuevas['variantes'].append((variante, self.variantes[variante]))
+                identificadores[i] = self.variantes[variante]
+            if nuevas['variantes']:
+                with self.conexion:
+                    self.conexion.executemany('INSERT OR REPLACE INTO insiders VALUES (?, ?, ?, ?)',
+                                              nuevas['insiders'].values())
+                    self.conexion.executemany('INSERT OR REPLACE INTO variantes VALUES (?, ?)', nuevas['variantes'])
+                self.recuento = None
+        return identificadores[codigos] if len(codigos) else np.empty(0, dtype=np.int64)
+
+    # Copia del frame con 'Nombre' (ya presentado, "Nombre Apellido") sustituido por el nombre de su
+    # persona en el índice, para que las variantes de un mismo insider cuenten como una en los
+    # resúmenes y en las compras en grupo
+    def unificar(self, df):
+        if df.empty:
+            return df
+        codigos, unicos = pd.factorize(df['Nombre'].astype(object), use_na_sentinel=False)
+        identificadores = self.resolver([_orden_formulario(nombre) for nombre in unicos])
+        nombres = np.array([self.nombres[i] if i >= 0 else nombre for i, nombre in zip(identificadores, unicos)],
+                           dtype=object)
+        unificado = df.copy()
+        unificado['Nombre'] = pd.Categorical(nombres[codigos])
+        return unificado
+
+    # Indexa registros en bruto de Finnhub (`{ticker: registros}`): cada compra o venta queda asociada a
+    # su insider. Devuelve cuántas apariciones nuevas se guardan.
+    def indexar(self, registros_por_ticker):
+        if isinstance(registros_por_ticker, dict):
+            registros_por_ticker = registros_por_ticker.items()
+        filas = [(ticker, registro) for ticker, registros in registros_por_ticker for registro in registros or ()
+                 if registro.get('transactionCode') in CODIGOS_TRANSACCION and registro.get('change') is not None]
+        identificadores = self.resolver([registro.get('name') for _, registro in filas])
+        valores = [(int(insider), ticker, identidad_transaccion(registro), registro.get('name'), registro.get('change'),
+                    registro.get('transactionPrice'), registro.get('share'), registro.get('transactionDate'))
+                   for insider, (ticker, registro) in zip(identificadores, filas) if insider >= 0]
+        with self.lock, self.conexion:
+            antes = self.conexion.total_changes
+            self.conexion.executemany('INSERT OR IGNORE INTO apariciones VALUES (?, ?, ?, ?, ?, ?, ?, ?)', valores)
+            insertadas = self.conexion.total_changes - antes
+            if insertadas:
+                self.recuento = None
+        logging.info(f"Índice de insiders: {insertadas} transacciones nuevas de {len(set(identificadores))} insiders.")
+        return insertadas
+
+    # Personas indexadas con sus tickers y su número de transacciones. Con `texto`, solo las que tienen
+    # alguna variante en la que cada palabra buscada empieza una palabra del nombre, en cualquier orden
+    # ("tim cook" encuentra "COOK TIMOTHY D")
+    def insiders(self, texto=None):
+        with self.lock:
+            if self.recuento is None:
+                filas = self.conexion.execute('''
+                    SELECT insider, COUNT(DISTINCT ticker), COUNT(*), GROUP_CONCAT(DISTINCT ticker)
+                    FROM apariciones GROUP BY insider
+                ''').fetchall()
+                df = pd.DataFrame(filas, columns=['Insider', 'Número de Tickers', 'Transacciones', 'Tickers'])
+                df.insert(1, 'Nombre', [self.nombres.get(i, '') for i in df['Insider']])
+                df['Tickers'] = df['Tickers'].map(lambda t: ', '.join(sorted(t.split(','))))
+                df = df.sort_values(['Transacciones', 'Nombre'], ascending=[False, True], ignore_index=True)
+                self.recuento = (df, [(insider, variante.split()) for variante, insider in self.variantes.items()])
+            df, variantes = self.recuento
+        buscadas = clave_nombre(texto).split() if texto else []
+        if buscadas:
+            coinciden = {insider for insider, palabras in variantes
+                         if all(any(palabra.startswith(b) for palabra in palabras) for b in buscadas)}
+            df = df[df['Insider'].isin(coinciden)].reset_index(drop=True)
+        return df
+
+    # Transacciones de una persona en todos los tickers, con el esquema de `construir_transacciones`
+    # (el nombre es el de la persona, no el de cada variante) y ordenadas por fecha
+    def transacciones(self, insider):
+        with self.lock:
+            filas = self.conexion.execute('''
+                SELECT change, transactionPrice, share, transactionDate, ticker
+                FROM apariciones WHERE insider = ?
+            ''', (int(insider),)).fetchall()
+        df = pd.DataFrame(filas, columns=COLUMNAS[1:])
+        df.insert(0, 'Nombre', pd.Categorical([self.nombres.get(int(insider), '')] * len(df)))
+        df = df.astype({'Cantidad': 'int64', 'Precio de Transacción': 'float64'})
+        df['Restantes'] = df['Restantes'].fillna(0).astype('int64')
+        df[COLUMNA_FECHA] = pd.to_datetime(df[COLUMNA_FECHA], format='%Y-%m-%d', errors='coerce')
+        df['Ticker'] = pd.Categorical(df['Ticker'])
+        return indexar_por_fecha(df)
@@ -0,0 +1,93 @@
+import logging
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from insider.almacen import identidad_transaccion
+from insider.fechas import indexar_por_fecha
+from insider.metricas import medir_etapa
+
+# Códigos de transacción de Finnhub que interesan: compras (P) y ventas (S) en mercado abierto
+CODIGOS_TRANSACCION = frozenset(['P', 'S'])
+
+COLUMNAS = ['Nombre', 'Cantidad', 'Precio de Transacción', 'Restantes', 'Fecha de Transacción', 'Ticker']
+
+_PUNTUACION = re.compile(r'[.,;]+')
+
+
+# Función para invertir el nombre de un directivo de Apellido Nombre -> Nombre Apellido
+def invertir_nombre(nombre):
+    partes = nombre.split()
+    if len(partes) > 1:
+        return ' '.join(partes[1:] + partes[:1])
+    return nombre
+
+
+# Los mismos directivos aparecen en muchas filas, así que la normalización se memoriza por nombre.
+# La puntuación y los espacios sobrantes se quitan antes de invertir ("COOK, TIMOTHY D." = "COOK TIMOTHY D").
+@lru_cache(maxsize=65536)
+def normalizar_nombre(nombre):
+    texto = nombre if isinstance(nombre, str) else ''
+    return invertir_nombre(' '.join(_PUNTUACION.sub(' ', texto).split())).title()
+
+
+# Columna 'Nombre' categórica a partir de los nombres en bruto: se normaliza una vez cada nombre
+# distinto y las filas reciben el código de su categoría, sin llamadas por fila
+def normalizar_nombres(nombres):
+    codigos, brutos = pd.factorize(pd.Series(nombres, dtype='object'), use_na_sentinel=False)
+    categorias, inversa = np.unique(np.array([normalizar_nombre(n) for n in brutos], dtype='object'),
+                                    return_inverse=True)
+    return pd.Categorical.from_codes(inversa[codigos] if len(codigos) else codigos, categories=categorias)
+
+
+# Frame vacío con el esquema definitivo, para que los pasos posteriores no dependan de si hubo datos
+def frame_vacio():
+    return construir_transacciones({})
+
+
+# Construye en una sola pasada un único DataFrame tipado a partir de los registros en bruto de
+# Finnhub de varios tickers (`{ticker: registros}` o pares `(ticker, registros)`).
+# El filtro de códigos P/S se aplica al parsear, sin crear frames intermedios por ticker, y el
+# resultado queda ordenado por fecha para poder recortar ventanas con búsqueda binaria.
+# Con `con_id` se añade la columna 'Id' (`identidad_transaccion`), que el archivo usa como clave.
+@medir_etapa('parseo')
+def construir_transacciones(registros_por_ticker, con_id=False):
+    if isinstance(registros_por_ticker, dict):
+        registros_por_ticker = registros_por_ticker.items()
+
+    nombres, cantidades, precios, restantes, fechas, tickers, ids = [], [], [], [], [], [], []
+    orden_tickers = []
+    for ticker, registros in registros_por_ticker:
+        orden_tickers.append(ticker)
+        for registro in registros or ():
+            if registro.get('transactionCode') not in CODIGOS_TRANSACCION:
+                continue
+            cantidad = registro.get('change')
+            if cantidad is None:
+                continue
+            precio = registro.get('transactionPrice')
+            restante = registro.get('share')
+            nombres.append(registro.get('name'))
+            cantidades.append(cantidad)
+            precios.append(np.nan if precio is None else precio)
+            restantes.append(0 if restante is None else restante)
+            fechas.append(registro.get('transactionDate'))
+            tickers.append(ticker)
+            if con_id:
+                ids.append(identidad_transaccion(registro))
+
+    df = pd.DataFrame({
+        'Nombre': normalizar_nombres(nombres),
+        'Cantidad': np.asarray(cantidades, dtype='int64'),
+        'Precio de Transacción': np.asarray(precios, dtype='float64'),
+        'Restantes': np.asarray(restantes, dtype='int64'),
+        'Fecha de Transacción': pd.to_datetime(pd.Series(fechas, dtype='object'), format='%Y-%m-%d', errors='coerce'),
+        'Ticker': pd.Categorical(tickers, categories=list(dict.fromkeys(orden_tickers))),
+    })
+    if con_id:
+        df['Id'] = pd.Series(ids, dtype='object')
+    df = indexar_por_fecha(df)
+    logging.info(f"{len(df)} transacciones de {len(orden_tickers)} tickers ingeridas.")
+    return df
@@ -0,0 +1,150 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Límites superiores (en segundos) de los cubos de los histogramas
+CUBOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Histograma:
+    def __init__(self):
+        self.cubos = [0] * len(CUBOS)
+        self.cuenta = 0
+        self.suma = 0.0
+
+    def observar(self, valor):
+        self.cuenta += 1
+        self.suma += valor
+        for i, limite in enumerate(CUBOS):
+            if valor <= limite:
+                self.cubos[i] += 1
+                break
+
+
+# Registro de métricas del pipeline: duración por etapa, latencia HTTP por host, aciertos de caché,
+# esperas del limitador y número de filas. Si está desactivado, cada punto de medida solo comprueba
+# un booleano, por lo que el coste es despreciable.
+class Metricas:
+    def __init__(self, activo=False):
+        self.activo = activo
+        self.lock = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+
+    def reiniciar(self):
+        with self.lock:
+            self.contadores.clear()
+            self.histogramas.clear()
+
+    def contar(self, nombre, valor=1, **etiquetas):
+        if not self.activo:
+            return
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self.lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        if not self.activo:
+            return
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self.lock:
+            if clave not in self.histogramas:
+                self.histogramas[clave] = _Histograma()
+            self.histogramas[clave].observar(valor)
+
+    @contextmanager
+    def etapa(self, nombre):
+        if not self.activo:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar('insider_etapa_segundos', time.perf_counter() - inicio, etapa=nombre)
+
+    # Exposición en el formato de texto de Prometheus (apto para el textfile collector de node_exporter)
+    def a_prometheus(self):
+        def etiquetas(pares, extra=()):
+            pares = list(pares) + list(extra)
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pares) + '}' if pares else ''
+
+        lineas = []
+        with self.lock:
+            for (nombre, pares), valor in sorted(self.contadores.items()):
+                lineas.append(f'{nombre}{etiquetas(pares)} {valor}')
+            for (nombre, pares), h in sorted(self.histogramas.items(), key=lambda x: x[0]):
+                acumulado = 0
+                for limite, n in zip(CUBOS, h.cubos):
+                    acumulado += n
+                    lineas.append(f'{nombre}_bucket{etiquetas(pares, [("le", limite)])} {acumulado}')
+                lineas.append(f'{nombre}_bucket{etiquetas(pares, [("le", "+Inf")])} {h.cuenta}')
+                lineas.append(f'{nombre}_sum{etiquetas(pares)} {h.suma}')
+                lineas.append(f'{nombre}_count{etiquetas(pares)} {h.cuenta}')
+        return '\n'.join(lineas) + '\n'
+
+    def a_json(self):
+        with self.lock:
+            return {
+                'contadores': [{'nombre': n, 'etiquetas': dict(p), 'valor': v} for (n, p), v in self.contadores.items()],
+                'histogramas': [{'nombre': n, 'etiquetas': dict(p), 'cuenta': h.cuenta, 'suma': h.suma,
+                                 'cubos': dict(zip(CUBOS, h.cubos))} for (n, p), h in self.histogramas.items()],
+            }
+
+    # Resumen tabular de los histogramas (cuenta, total y media), p. ej. para mostrarlo en Streamlit
+    def tabla(self):
+        with self.lock:
+            filas = [{'métrica': n, **dict(p), 'cuenta': h.cuenta, 'total (s)': round(h.suma, 4),
+                      'media (s)': round(h.suma / h.cuenta, 4) if h.cuenta else 0.0}
+                     for (n, p), h in self.histogramas.items()]
+            filas += [{'métrica': n, **dict(p), 'cuenta': v} for (n, p), v in self.contadores.items()]
+        return pd.DataFrame(filas)
+
+    # Escribe las métricas en `ruta` (.json o formato Prometheus) de forma atómica
+    def exportar(self, ruta):
+        contenido = json.dumps(self.a_json(), indent=2) if ruta.endswith('.json') else self.a_prometheus()
+        with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        os.replace(ruta + '.tmp', ruta)
+
+
+# Registro global del proceso; se activa con INSIDER_METRICAS=1 o con activar()
+METRICAS = Metricas(activo=os.getenv('INSIDER_METRICAS') == '1')
+
+
+def activar():
+    METRICAS.activo = True
+
+
+def desactivar():
+    METRICAS.activo = False
+
+
+def _filas(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    if isinstance(resultado, tuple):
+        return sum(len(r) for r in resultado if isinstance(r, pd.DataFrame))
+    return None
+
+
+# Decorador que mide la duración de una etapa y el número de filas que produce
+def medir_etapa(nombre):
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not METRICAS.activo:
+                return funcion(*args, **kwargs)
+            with METRICAS.etapa(nombre):
+                resultado = funcion(*args, **kwargs)
+            filas = _filas(resultado)
+            if filas is not None:
+                METRICAS.contar('insider_filas_total', filas, etapa=nombre)
+            return resultado
+        return envoltura
+    return decorador
@@ -0,0 +1,147 @@
+import logging
+from datetime import datetime, timedelta
+from functools import partial
+
+import pandas as pd
+import requests
+
+from insider.acciones import ResolutorAcciones
+from insider.almacen import refrescar_incremental
+from insider.config import obtener_api_key
+from insider.descarga import LimitadorTokens, descargar_concurrente
+from insider.fechas import presentar_fechas, ventana_dias
+from insider.http import CircuitoAbierto, cliente_compartido
+from insider.ingesta import construir_transacciones, frame_vacio, invertir_nombre  # noqa: F401
+from insider.metricas import medir_etapa
+from insider.rentabilidades import CachePrecios, anadir_rentabilidades
+from insider.resumen import resumir_transacciones
+
+# Núcleo sin efectos secundarios del pipeline: descarga, transformación y resúmenes.
+# La configuración (logging, secretos) y la exportación las hacen los puntos de entrada.
+
+# Número de días por defecto para filtrar transacciones
+DIAS_POR_DEFECTO = 29
+
+# Caché persistente del total de acciones en circulación
+RUTA_ACCIONES = 'insider_acciones.db'
+
+# Caché local de cierres diarios para las rentabilidades posteriores
+RUTA_PRECIOS = 'insider_precios.db'
+
+# Índice persistente de identidades de insiders y de sus transacciones en todos los tickers
+RUTA_INSIDERS = 'insider_insiders.db'
+
+
+# Función para limpiar los registros en bruto de Finnhub de un ticker
+def limpiar_transacciones(data, ticker):
+    if not data:
+        logging.info(f"No hay datos disponibles para {ticker}.")
+    return construir_transacciones({ticker: data})
+
+
+# Función de descarga en bruto de un ticker con el cliente HTTP compartido (conexiones persistentes,
+# reintentos y cortacircuitos). Si no se indica, la clave se lee de la configuración
+def descargar(ticker, desde=None, api_key=None, cliente=None):
+    cliente = cliente or cliente_compartido(api_key or obtener_api_key())
+    return cliente.transacciones_insiders(ticker, desde=desde)
+
+
+# Función para obtener y limpiar las transacciones de insiders para un ticker
+def obtener_transacciones_insiders(ticker, api_key=None):
+    try:
+        return limpiar_transacciones(descargar(ticker, api_key=api_key), ticker)
+    except CircuitoAbierto as e:
+        logging.error(f"No se consultan datos para {ticker}: {e}")
+        return frame_vacio()
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error de red al obtener datos para {ticker}: {e}")
+        return frame_vacio()
+    except ValueError:
+        logging.error(f"Error al decodificar JSON para {ticker}.")
+        return frame_vacio()
+    except Exception as e:
+        logging.error(f"Error desconocido para {ticker}: {e}")
+        return frame_vacio()
+
+
+# Función para descargar en paralelo los registros en bruto de varios tickers ({ticker: registros}).
+# Los tickers que fallan no aparecen en el resultado.
+def descargar_registros(tickers, max_workers=8, limitador=None, api_key=None):
+    funcion = partial(descargar, api_key=api_key or obtener_api_key())
+    resultados = descargar_concurrente(tickers, funcion, max_workers=max_workers, limitador=limitador)
+    return {r.ticker: r.datos for r in resultados if r.ok}
+
+
+# Función para obtener transacciones de múltiples tickers en paralelo respetando la cuota de Finnhub.
+# Si se indica un almacén, solo se descargan las transacciones nuevas y se leen de él las de los últimos `dias`.
+# Con `con_id`, el frame lleva la columna 'Id' que usa el archivo histórico.
+@medir_etapa('descarga')
+def obtener_transacciones_multiples_tickers(tickers, max_workers=8, llamadas_por_minuto=60, almacen=None, dias=None,
+                                            limitador=None, api_key=None, con_id=False):
+    logging.info(f"Obteniendo datos para {len(tickers)} tickers...")
+    limitador = limitador or LimitadorTokens(llamadas_por_minuto)
+
+    if almacen is not None:
+        funcion = partial(descargar, api_key=api_key or obtener_api_key())
+        refrescar_incremental(almacen, tickers, funcion, max_workers=max_workers, limitador=limitador)
+        desde = (datetime.now() - timedelta(days=dias)).date() if dias is not None else None
+        registros = almacen.leer_ventana(dict.fromkeys(tickers), desde=desde)
+    else:
+        registros = descargar_registros(tickers, max_workers=max_workers, limitador=limitador, api_key=api_key)
+    return construir_transacciones(registros, con_id=con_id)
+
+
+# Función para obtener acciones totales para múltiples tickers (con caché persistente y en paralelo).
+# Los tickers sin dato quedan marcados con un centinela `AccionesNoDisponibles` en lugar de un texto.
+@medir_etapa('acciones')
+def obtener_acciones_totales(tickers, resolutor=None):
+    propio = resolutor is None
+    resolutor = resolutor or ResolutorAcciones(RUTA_ACCIONES)
+    try:
+        return resolutor.totales(tickers)
+    finally:
+        if propio:
+            resolutor.cerrar()
+
+
+# Función para añadir a cada transacción la rentabilidad posterior del ticker (+5, +20 y +60 sesiones).
+# Los cierres se piden en bloque a Yahoo y se guardan en una caché local.
+def obtener_rentabilidades(df, cache=None):
+    propia = cache is None
+    cache = cache or CachePrecios(RUTA_PRECIOS)
+    try:
+        return anadir_rentabilidades(df, cache)
+    finally:
+        if propia:
+            cache.cerrar()
+
+
+# Función para dividir en compras y ventas
+@medir_etapa('division')
+def dividir_compras_ventas(df):
+    df_compras = df[df['Cantidad'] > 0]
+    df_ventas = df[df['Cantidad'] < 0]
+    logging.info("División de transacciones en compras y ventas completada.")
+    return df_compras, df_ventas
+
+
+# Función para filtrar transacciones por fecha
+@medir_etapa('filtro')
+def filtrar_por_fecha(df, dias=DIAS_POR_DEFECTO):
+    df_filtrado = ventana_dias(df, dias)
+    logging.info(f"Transacciones filtradas para los últimos {dias} días.")
+    return df_filtrado
+
+
+# Función para formatear la fecha a d/m/y (solo para presentar; los datos internos siguen en datetime64)
+@medir_etapa('formato')
+def formatear_fecha(df):
+    return presentar_fechas(df)
+
+
+# Función para crear resúmenes de compras y ventas con el motor vectorizado (un único groupby)
+@medir_etapa('resumen')
+def crear_resumen(df_compras, df_ventas, total_acciones):
+    df = pd.concat([df_compras, df_ventas], ignore_index=True)
+    resumen_compras, resumen_ventas, _ = resumir_transacciones(df, total_acciones)
+    return resumen_compras, resumen_ventas
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from insider.fechas import COLUMNA_FECHA, indexar_por_fecha, texto_fechas
+
+# Filas por página y puntos por serie que se envían al navegador, sea cual sea el tamaño del resultado
+FILAS_POR_PAGINA = 50
+PRESUPUESTO_PUNTOS = 400
+
+NANOS_DIA = 86_400 * 10**9
+
+
+# Filtra por texto (sin distinguir mayúsculas) sobre columnas categóricas. La búsqueda se hace en las
+# categorías, que son pocas, y las filas se seleccionan por código.
+def filtrar_texto(df, texto, columnas=('Ticker', 'Nombre')):
+    texto = (texto or '').strip().lower()
+    if not texto or df.empty:
+        return df
+    mascara = np.zeros(len(df), dtype=bool)
+    for columna in columnas:
+        serie = df[columna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            coinciden = np.flatnonzero(serie.cat.categories.str.lower().str.contains(texto, regex=False))
+            mascara |= np.isin(serie.cat.codes.to_numpy(), coinciden)
+        else:
+            mascara |= serie.astype(str).str.lower().str.contains(texto, regex=False).to_numpy()
+    return df[mascara]
+
+
+# Ordena en el servidor. El orden por fecha reutiliza el frame ya ordenado (sin volver a ordenar)
+def ordenar(df, columna=COLUMNA_FECHA, ascendente=False):
+    if columna == COLUMNA_FECHA:
+        df = indexar_por_fecha(df)
+        return df if ascendente else df.iloc[::-1]
+    return df.sort_values(columna, ascending=ascendente, kind='stable', na_position='last')
+
+
+def numero_paginas(total_filas, filas_por_pagina=FILAS_POR_PAGINA):
+    return max(1, math.ceil(total_filas / filas_por_pagina))
+
+
+# Devuelve solo las filas de la página indicada (empezando en 1), con las fechas ya como texto
+def pagina(df, numero, filas_por_pagina=FILAS_POR_PAGINA):
+    numero = min(max(1, numero), numero_paginas(len(df), filas_por_pagina))
+    inicio = (numero - 1) * filas_por_pagina
+    trozo = df.iloc[inicio:inicio + filas_por_pagina].reset_index(drop=True)
+    trozo[COLUMNA_FECHA] = texto_fechas(trozo[COLUMNA_FECHA])
+    return trozo
+
+
+# Serie temporal de actividad (importe y número de transacciones) con como mucho `presupuesto` puntos.
+# Las transacciones se agrupan en intervalos de días de la misma anchura, elegida para que el rango
+# completo quepa en el presupuesto; el coste es lineal y el tamaño del resultado no depende de las filas.
+def linea_temporal(df, presupuesto=PRESUPUESTO_PUNTOS):
+    columnas = [COLUMNA_FECHA, 'Importe', 'Transacciones']
+    fechas = df[COLUMNA_FECHA].to_numpy()
+    validas = ~np.isnat(fechas)
+    if not validas.any():
+        return pd.DataFrame(columns=columnas)
+    dias = fechas[validas].astype('datetime64[D]').astype(np.int64)
+    importe = (df['Cantidad'].to_numpy(dtype=np.float64) * df['Precio de Transacción'].to_numpy(dtype=np.float64))
+    importe = np.nan_to_num(np.abs(importe[validas]))
+
+    primero = dias.min()
+    anchura = max(1, math.ceil((dias.max() - primero + 1) / presupuesto))
+    cubos = (dias - primero) // anchura
+    importes = np.bincount(cubos, weights=importe)
+    cuentas = np.bincount(cubos)
+    ocupados = np.flatnonzero(cuentas)
+    inicio_cubos = (primero + ocupados * anchura).astype('datetime64[D]').astype('datetime64[ns]')
+    return pd.DataFrame({COLUMNA_FECHA: inicio_cubos, 'Importe': importes[ocupados], 'Transacciones': cuentas[ocupados]})
@@ -0,0 +1,229 @@
+import logging
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from insider.fechas import COLUMNA_FECHA
+from insider.metricas import METRICAS, medir_etapa
+from insider.resumen import _codificar
+
+# Horizontes de rentabilidad posterior, en sesiones bursátiles
+HORIZONTES = (5, 20, 60)
+
+# Margen en días naturales para cubrir el último horizonte (60 sesiones ~ 84 días) y la sesión anterior
+MARGEN_POSTERIOR = 95
+MARGEN_ANTERIOR = 7
+
+
+def columna_rentabilidad(horizonte):
+    return f'Rentabilidad {horizonte}d'
+
+
+# Cierres ajustados de varios tickers con una única llamada a yf.download, en formato largo
+def _descargar_yfinance(tickers, inicio, fin):
+    import yfinance as yf
+    datos = yf.download(list(tickers), start=str(inicio), end=str(fin + timedelta(days=1)), auto_adjust=True,
+                        progress=False, group_by='column', threads=True)
+    if datos is None or datos.empty:
+        return pd.DataFrame(columns=['ticker', 'fecha', 'cierre'])
+    cierres = datos['Close']
+    if isinstance(cierres, pd.Series):
+        cierres = cierres.to_frame(list(tickers)[0])
+    largo = cierres.rename_axis('fecha').reset_index().melt(id_vars='fecha', var_name='ticker', value_name='cierre')
+    largo = largo.dropna(subset=['cierre'])
+    largo['fecha'] = pd.to_datetime(largo['fecha']).dt.strftime('%Y-%m-%d')
+    return largo[['ticker', 'fecha', 'cierre']]
+
+
+# Caché persistente (SQLite) de cierres diarios. Guarda, por ticker, el rango de fechas ya consultado,
+# de modo que solo se descargan los tramos que faltan. Los tickers que necesitan el mismo tramo se
+# piden juntos en una sola llamada, así que un refresco diario es una única descarga.
+class CachePrecios:
+    def __init__(self, ruta='insider_precios.db', descargar=None):
+        self.descargar = descargar or _descargar_yfinance
+        self.lock = threading.Lock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        with self.conexion:
+            self.conexion.execute('''
+                CREATE TABLE IF NOT EXISTS precios (
+                    ticker TEXT NOT NULL,
+                    fecha TEXT NOT NULL,
+                    cierre REAL NOT NULL,
+                    PRIMARY KEY (ticker, fecha)
+                )
+            ''')
+            self.conexion.execute('''
+                CREATE TABLE IF NOT EXISTS cobertura (
+                    ticker TEXT PRIMARY KEY,
+                    desde TEXT NOT NULL,
+                    hasta TEXT NOT NULL
+                )
+            ''')
+
+    def cerrar(self):
+        with self.lock:
+            self.conexion.close()
+
+    def _cobertura(self, tickers):
+        with self.lock:
+            filas = self.conexion.execute(
+                f'SELECT ticker, desde, hasta FROM cobertura WHERE ticker IN ({", ".join("?" * len(tickers))})', tickers
+            ).fetchall()
+        return {t: (date.fromisoformat(d), date.fromisoformat(h)) for t, d, h in filas}
+
+    # Tramos [inicio, fin] que faltan por ticker, agrupados por tramo
+    def _pendientes(self, tickers, inicio, fin):
+        cobertura = self._cobertura(tickers)
+        tramos = {}
+        for ticker in tickers:
+            if ticker not in cobertura:
+                tramos.setdefault((inicio, fin), []).append(ticker)
+                continue
+            desde, hasta = cobertura[ticker]
+            if inicio < desde:
+                tramos.setdefault((inicio, desde - timedelta(days=1)), []).append(ticker)
+            if fin > hasta:
+                tramos.setdefault((hasta + timedelta(days=1), fin), []).append(ticker)
+        return tramos
+
+    # Descarga lo que falte para cubrir [inicio, fin] en todos los tickers
+    def actualizar(self, tickers, inicio, fin, hoy=None):
+        hoy = hoy or date.today()
+        tickers = list(dict.fromkeys(tickers))
+        fin = min(fin, hoy)
+        tramos = self._pendientes(tickers, inicio, fin)
+        METRICAS.contar('insider_cache_aciertos_total', len(tickers) - len({t for g in tramos.values() for t in g}),
+                        cache='precios')
+        for (desde, hasta), grupo in tramos.items():
+            logging.info(f"Descargando cierres de {len(grupo)} tickers entre {desde} y {hasta}.")
+            METRICAS.contar('insider_cache_fallos_total', len(grupo), cache='precios')
+            try:
+                precios = self.descargar(grupo, desde, hasta)
+            except Exception as e:
+                logging.error(f"Error al descargar cierres de {len(grupo)} tickers: {e}")
+                continue
+            # La sesión de hoy aún puede cambiar: no se da por cubierta. Los tickers que no han devuelto
+            # cierres (fallo parcial del lote, símbolo no encontrado) se vuelven a pedir la próxima vez.
+            cubierto = min(hasta, hoy - timedelta(days=1))
+            devueltos = set(precios['ticker'])
+            with self.lock, self.conexion:
+                self.conexion.executemany('INSERT OR REPLACE INTO precios VALUES (?, ?, ?)',
+                                          precios[['ticker', 'fecha', 'cierre']].itertuples(index=False, name=None))
+                for ticker in (t for t in grupo if t in devueltos):
+                    self.conexion.execute('''
+                        INSERT INTO cobertura VALUES (?, ?, ?)
+                        ON CONFLICT(ticker) DO UPDATE SET desde = MIN(desde, excluded.desde), hasta = MAX(hasta, excluded.hasta)
+                    ''', (ticker, str(desde), str(cubierto)))
+
+    # Cierres en formato largo (Ticker, Fecha, Cierre), ordenados por ticker y fecha
+    def cierres(self, tickers, inicio, fin, hoy=None):
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return pd.DataFrame({'Ticker': [], 'Fecha': pd.to_datetime([]), 'Cierre': []})
+        self.actualizar(tickers, inicio, fin, hoy=hoy)
+        with self.lock:
+            filas = self.conexion.execute(
+                f'''SELECT ticker, fecha, cierre FROM precios
+                    WHERE ticker IN ({", ".join("?" * len(tickers))}) AND fecha BETWEEN ? AND ?
+                    ORDER BY ticker, fecha''',
+                tickers + [str(inicio), str(fin)]
+            ).fetchall()
+        df = pd.DataFrame(filas, columns=['Ticker', 'Fecha', 'Cierre'])
+        df['Fecha'] = pd.to_datetime(df['Fecha'])
+        return df
+
+
+# Añade a cada transacción la rentabilidad del ticker a +5, +20 y +60 sesiones. El precio de partida
+# es el último cierre en o antes de la fecha de la transacción (unión as-of por ticker); el de llegada,
+# el cierre `horizonte` sesiones después. Queda NaN si aún no han pasado suficientes sesiones.
+@medir_etapa('rentabilidades')
+def anadir_rentabilidades(df, cache, horizontes=HORIZONTES, hoy=None):
+    resultado = df.copy()
+    for horizonte in horizontes:
+        resultado[columna_rentabilidad(horizonte)] = np.nan
+    fechas = df[COLUMNA_FECHA]
+    if df.empty or fechas.isna().all():
+        return resultado
+
+    tickers = sorted(df['Ticker'].astype(str).unique())
+    inicio = (fechas.min() - timedelta(days=MARGEN_ANTERIOR)).date()
+    fin = (fechas.max() + timedelta(days=MARGEN_POSTERIOR)).date()
+    precios = cache.cierres(tickers, inicio, fin, hoy=hoy)
+    if precios.empty:
+        return resultado
+
+    # Posición de cada cierre dentro de su ticker y límites de cada ticker en el array de cierres
+    cierres = precios['Cierre'].to_numpy(dtype=np.float64)
+    codigos_precio = pd.Categorical(precios['Ticker'], categories=tickers).codes
+    fin_ticker = np.searchsorted(codigos_precio, np.arange(len(tickers)), side='right')
+    precios['Indice'] = np.arange(len(precios))
+
+    izquierda = pd.DataFrame({
+        'Fila': np.arange(len(df)),
+        'Ticker': df['Ticker'].astype(str).to_numpy(),
+        COLUMNA_FECHA: fechas.to_numpy(),
+    }).dropna(subset=[COLUMNA_FECHA]).sort_values(COLUMNA_FECHA, kind='stable')
+    derecha = precios[['Ticker', 'Fecha', 'Indice']].sort_values('Fecha', kind='stable')
+    unidas = pd.merge_asof(izquierda, derecha, left_on=COLUMNA_FECHA,
+                           right_on='Fecha', by='Ticker', direction='backward')
+    unidas = unidas.dropna(subset=['Indice'])
+    filas = unidas['Fila'].to_numpy()
+    base = unidas['Indice'].to_numpy(dtype=np.int64)
+    limite = fin_ticker[pd.Categorical(unidas['Ticker'], categories=tickers).codes]
+
+    for horizonte in horizontes:
+        destino = base + horizonte
+        disponible = destino < limite
+        valores = np.full(len(base), np.nan)
+        valores[disponible] = cierres[destino[disponible]] / cierres[base[disponible]] - 1.0
+        columna = resultado.columns.get_loc(columna_rentabilidad(horizonte))
+        resultado.iloc[filas, columna] = valores
+    return resultado
+
+
+# Rentabilidad media posterior y porcentaje de aciertos (subida tras comprar, bajada tras vender) por
+# `clave` ('Ticker' o 'Nombre') y lado, con np.bincount sobre los códigos como en el resumen principal
+def resumen_rentabilidades(df, clave='Ticker', horizontes=HORIZONTES):
+    columnas = [clave, 'Lado', 'Transacciones'] + [f'{nombre} {h}d' for h in horizontes
+                                                   for nombre in ('Rentabilidad Media', 'Aciertos')]
+    cantidad = df['Cantidad'].to_numpy() if not df.empty else np.empty(0)
+    codigos, etiquetas = _codificar(df[clave]) if not df.empty else (np.empty(0, dtype=np.int64), pd.Index([]))
+    validas = (cantidad != 0) & (codigos >= 0)
+    if not validas.any():
+        return pd.DataFrame(columns=columnas)
+
+    venta = (cantidad[validas] < 0).astype(np.int64)
+    grupo = codigos[validas].astype(np.int64) * 2 + venta
+    n_grupos = len(etiquetas) * 2
+    transacciones = np.bincount(grupo, minlength=n_grupos)
+    presentes = np.flatnonzero(transacciones)
+    resumen = {
+        clave: [str(e) for e in etiquetas[presentes // 2]],
+        'Lado': np.where(presentes % 2 == 1, 'Vendido', 'Comprado'),
+        'Transacciones': transacciones[presentes],
+    }
+    signo = np.where(venta == 1, -1.0, 1.0)
+    for horizonte in horizontes:
+        rentabilidad = df[columna_rentabilidad(horizonte)].to_numpy(dtype=np.float64)[validas]
+        conocida = ~np.isnan(rentabilidad)
+        n = np.bincount(grupo[conocida], minlength=n_grupos)[presentes]
+        suma = np.bincount(grupo[conocida], weights=rentabilidad[conocida], minlength=n_grupos)[presentes]
+        aciertos = np.bincount(grupo[conocida], weights=(signo[conocida] * rentabilidad[conocida] > 0).astype(np.float64),
+                               minlength=n_grupos)[presentes]
+        media = np.full(len(presentes), np.nan)
+        acierto = np.full(len(presentes), np.nan)
+        np.divide(suma, n, out=media, where=n > 0)
+        np.divide(aciertos, n, out=acierto, where=n > 0)
+        resumen[f'Rentabilidad Media {horizonte}d'] = (media * 100).round(2)
+        resumen[f'Aciertos {horizonte}d'] = (acierto * 100).round(1)
+    return pd.DataFrame(resumen)[columnas]
+
+
+# Añade al resumen de compras o ventas por ticker las rentabilidades medias de ese lado
+def ampliar_resumen(resumen, por_ticker, tipo, horizontes=HORIZONTES):
+    columnas = [f'Rentabilidad Media {h}d' for h in horizontes]
+    lado = por_ticker.loc[por_ticker['Lado'] == tipo, ['Ticker'] + columnas]
+    return resumen.merge(lado, on='Ticker', how='left')
@@ -0,0 +1,118 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from insider.acciones import acciones_como_numero
+
+LADOS = {'Comprado': 1, 'Vendido': -1}
+
+
+# Códigos enteros y etiquetas de una columna (reutiliza los de un categórico si ya lo es)
+def _codificar(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    codigos, etiquetas = pd.factorize(serie, sort=True)
+    return codigos, pd.Index(etiquetas)
+
+
+# Agregados de todas las transacciones (compras y ventas juntas) en una única pasada por
+# (Ticker, lado): total de acciones, importe, precio medio ponderado por volumen (VWAP),
+# número de transacciones y número de insiders distintos. Se trabaja sobre los códigos
+# enteros de los categóricos con np.bincount, sin objetos Python por fila.
+def agregar_por_ticker(df):
+    codigos_ticker, etiquetas = _codificar(df['Ticker'])
+    codigos_nombre, _ = _codificar(df['Nombre'])
+    return agregar_arrays(df['Cantidad'].to_numpy(), df['Precio de Transacción'].to_numpy(dtype='float64'),
+                          codigos_ticker, etiquetas, codigos_nombre)
+
+
+# Igual que `agregar_por_ticker`, pero sobre los arrays de las columnas ya extraídos
+def agregar_arrays(cantidad, precio, codigos_ticker, etiquetas, codigos_nombre):
+    validas = (cantidad != 0) & (codigos_ticker >= 0)
+    cantidad, precio = cantidad[validas], precio[validas]
+    codigos_ticker, codigos_nombre = codigos_ticker[validas].astype('int64'), codigos_nombre[validas].astype('int64')
+
+    # Clave de grupo: ticker * 2 + (1 si es venta)
+    venta = (cantidad < 0).astype('int64')
+    clave = codigos_ticker * 2 + venta
+    n_claves = len(etiquetas) * 2
+    volumen = np.abs(cantidad).astype('float64')
+    con_precio = ~np.isnan(precio)
+    importe = np.where(con_precio, volumen * np.where(con_precio, precio, 0.0), 0.0)
+
+    transacciones = np.bincount(clave, minlength=n_claves)
+    total = np.bincount(clave, weights=cantidad, minlength=n_claves)
+    importe_total = np.bincount(clave, weights=importe, minlength=n_claves)
+    volumen_precio = np.bincount(clave, weights=np.where(con_precio, volumen, 0.0), minlength=n_claves)
+    pares = np.unique(clave * (int(codigos_nombre.max(initial=0)) + 1) + codigos_nombre)
+    insiders = np.bincount(pares // (int(codigos_nombre.max(initial=0)) + 1), minlength=n_claves)
+
+    presentes = np.flatnonzero(transacciones)
+    vwap = np.full(len(presentes), np.nan)
+    np.divide(importe_total[presentes], volumen_precio[presentes], out=vwap, where=volumen_precio[presentes] > 0)
+    indice = pd.MultiIndex.from_arrays(
+        [etiquetas[presentes // 2], np.where(presentes % 2 == 1, -1, 1)], names=['Ticker', 'Lado']
+    )
+    return pd.DataFrame({
+        'Total': total[presentes].round().astype('int64'),
+        'Importe': importe_total[presentes],
+        'Transacciones': transacciones[presentes],
+        'Insiders': insiders[presentes],
+        'VWAP': vwap.round(2),
+    }, index=indice)
+
+
+def _acciones_por_ticker(tickers, total_acciones):
+    return pd.Series([acciones_como_numero(total_acciones.get(t)) for t in tickers], index=tickers, dtype='int64')
+
+
+# Resumen de un lado con las mismas columnas que espera el resto de la aplicación, más las nuevas
+def _resumen_lado(agregados, total_acciones, tipo):
+    columnas = ['Ticker', f'Total {tipo}', f'Precio Medio Ponderado {tipo}', f'Porcentaje {tipo}', 'Total Acciones',
+                f'Importe {tipo}', f'Transacciones {tipo}', f'Insiders {tipo}']
+    if agregados.empty or LADOS[tipo] not in agregados.index.get_level_values('Lado'):
+        return pd.DataFrame(columns=columnas)
+    lado = agregados.xs(LADOS[tipo], level='Lado')
+    tickers = [str(t) for t in lado.index]
+    acciones = _acciones_por_ticker(tickers, total_acciones).to_numpy()
+    total = lado['Total'].to_numpy()
+    porcentaje = np.divide(np.abs(total) * 100.0, acciones, out=np.zeros(len(total)), where=acciones > 0)
+    resumen = pd.DataFrame({
+        'Ticker': tickers,
+        f'Total {tipo}': total,
+        f'Precio Medio Ponderado {tipo}': lado['VWAP'].to_numpy(),
+        f'Porcentaje {tipo}': porcentaje.round(5),
+        'Total Acciones': acciones,
+        f'Importe {tipo}': lado['Importe'].to_numpy().round(2),
+        f'Transacciones {tipo}': lado['Transacciones'].to_numpy(),
+        f'Insiders {tipo}': lado['Insiders'].to_numpy(),
+    })
+    return resumen[columnas]
+
+
+# Saldo neto por ticker: acciones e importe comprados menos vendidos
+def _resumen_neto(agregados):
+    if agregados.empty:
+        return pd.DataFrame(columns=['Ticker', 'Neto', 'Importe Neto'])
+    firmado = agregados[['Total', 'Importe']].copy()
+    firmado['Importe'] *= firmado.index.get_level_values('Lado')
+    neto = firmado.groupby(level='Ticker', observed=True).sum()
+    return pd.DataFrame({
+        'Ticker': [str(t) for t in neto.index],
+        'Neto': neto['Total'].to_numpy(),
+        'Importe Neto': neto['Importe'].to_numpy().round(2),
+    })
+
+
+# Calcula en una sola pasada los resúmenes de compras, ventas y saldo neto por ticker
+def resumir_transacciones(df, total_acciones):
+    return resumir_agregados(agregar_por_ticker(df), total_acciones)
+
+
+def resumir_agregados(agregados, total_acciones):
+    resumen_compras = _resumen_lado(agregados, total_acciones, 'Comprado')
+    resumen_ventas = _resumen_lado(agregados, total_acciones, 'Vendido')
+    resumen_neto = _resumen_neto(agregados)
+    logging.info("Resúmenes de compras, ventas y saldo neto creados correctamente.")
+    return resumen_compras, resumen_ventas, resumen_neto
@@ -0,0 +1,302 @@
+import argparse
+import glob
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+from insider.almacen import AlmacenTransacciones, huella_transaccion
+from insider.config import configurar_logging
+from insider.ingesta import CODIGOS_TRANSACCION
+from insider.universo import normalizar_tickers
+
+# Lectura de formularios 4 de la SEC desde archivos de EDGAR descargados en local, como alternativa a
+# Finnhub para rellenar histórico:
+#   python -m insider.sec ARCHIVOS... [--tickers AAPL MSFT] [--desde 2023-01-01] [--procesos 8]
+#
+# Se aceptan ficheros .xml (el documento del formulario), envíos completos .txt/.nc (cabecera SGML con
+# el XML dentro, como los de edgar/data o edgar/Feed) y archivos .tar/.tar.gz/.tgz/.zip que los
+# contengan. Cada transacción se devuelve con la misma forma que un registro de Finnhub, de modo que
+# sirve tal cual para `construir_transacciones` y para el almacén.
+
+ORIGEN_SEC = 'sec'
+# Las enmiendas (4/A) no se leen: repiten las transacciones del formulario original con otro número de
+# acceso y no indican cuál corrigen, así que se contarían dos veces
+TIPOS_FORMULARIO = frozenset(['4'])
+EXTENSIONES = ('.xml', '.txt', '.nc')
+ARCHIVOS_COMPRIMIDOS = ('.tar', '.tar.gz', '.tgz', '.zip')
+TAMANO_BLOQUE = 64 * 1024
+
+_TIPO_SGML = re.compile(rb'^CONFORMED SUBMISSION TYPE:\s*(\S+)')
+_FECHA_SGML = re.compile(rb'^FILED AS OF DATE:\s*(\d{8})')
+_ACCESO_SGML = re.compile(rb'^ACCESSION NUMBER:\s*(\S+)')
+_ACCESO_RUTA = re.compile(r'(?<!\d)(\d{10})-?(\d{2})-?(\d{6})(?!\d)')
+
+
+def _etiqueta(elemento):
+    return elemento.tag.rsplit('}', 1)[-1]
+
+
+# Texto del hijo `ruta` (las cantidades del formulario van dentro de <value>)
+def _valor(elemento, ruta):
+    hijo = elemento.find(ruta)
+    if hijo is None:
+        return None
+    valor = hijo.find('value')
+    texto = (valor if valor is not None else hijo).text
+    return texto.strip() if texto and texto.strip() else None
+
+
+def _numero(texto, tipo=float):
+    try:
+        return tipo(float(texto)) if texto is not None else None
+    except ValueError:
+        return None
+
+
+# Transacción no derivada del formulario -> registro con los campos de Finnhub
+def _registro(transaccion, cabecera, indice):
+    acciones = _numero(_valor(transaccion, 'transactionAmounts/transactionShares'))
+    if acciones is None:
+        return None
+    signo = -1 if _valor(transaccion, 'transactionAmounts/transactionAcquiredDisposedCode') == 'D' else 1
+    fecha = _valor(transaccion, 'transactionDate')
+    return {
+        'id': f"{cabecera['acceso']}-{indice}" if cabecera.get('acceso') else None,
+        'name': cabecera.get('nombre'),
+        'symbol': cabecera.get('ticker'),
+        'change': signo * int(round(acciones)),
+        'share': _numero(_valor(transaccion, 'postTransactionAmounts/sharesOwnedFollowingTransaction'), int),
+        'transactionPrice': _numero(_valor(transaccion, 'transactionAmounts/transactionPricePerShare')),
+        'transactionDate': fecha[:10] if fecha else None,
+        'filingDate': cabecera.get('presentado'),
+        'transactionCode': _valor(transaccion, 'transactionCoding/transactionCode'),
+    }
+
+
+# Analiza de forma incremental un documento de propiedad (ownershipDocument) a partir de bloques de
+# bytes: cada transacción se procesa y se libera en cuanto se cierra, sin cargar el documento entero
+def _parsear_documento(bloques, cabecera, codigos):
+    parser = XMLPullParser(events=('end',))
+    registros, indice, leido = [], 0, False
+    for bloque in bloques:
+        parser.feed(bloque)
+        leido = True
+        for _, elemento in parser.read_events():
+            etiqueta = _etiqueta(elemento)
+            if etiqueta == 'documentType' and (elemento.text or '').strip() not in TIPOS_FORMULARIO:
+                return []
+            if etiqueta == 'issuerTradingSymbol':
+                cabecera['ticker'] = (elemento.text or '').strip().upper() or None
+            elif etiqueta == 'rptOwnerName' and 'nombre' not in cabecera:
+                cabecera['nombre'] = (elemento.text or '').strip()
+            elif etiqueta == 'nonDerivativeTransaction':
+                registro = _registro(elemento, cabecera, indice)
+                indice += 1
+                if registro and (codigos is None or registro['transactionCode'] in codigos):
+                    registros.append(registro)
+                elemento.clear()
+            elif etiqueta == 'derivativeTable':
+                elemento.clear()
+    # Un envío SGML que no es un formulario 4 no llega a entregar ningún bloque
+    if leido:
+        parser.close()
+    return registros
+
+
+# Bloques del XML incrustado en un envío SGML, leyendo la cabecera línea a línea. Si el envío no es
+# un formulario 4, se detiene sin leer el resto.
+def _bloques_sgml(flujo, cabecera):
+    dentro = False
+    for linea in flujo:
+        if not dentro:
+            tipo = _TIPO_SGML.match(linea)
+            if tipo and tipo.group(1).decode() not in TIPOS_FORMULARIO:
+                return
+            fecha = _FECHA_SGML.match(linea)
+            if fecha:
+                texto = fecha.group(1).decode()
+                cabecera['presentado'] = f'{texto[:4]}-{texto[4:6]}-{texto[6:]}'
+            acceso = _ACCESO_SGML.match(linea)
+            if acceso:
+                cabecera['acceso'] = acceso.group(1).decode()
+            if linea.strip().upper() == b'<XML>':
+                dentro = True
+            continue
+        if linea.strip().upper() == b'</XML>':
+            return
+        yield linea
+
+
+def _bloques_xml(flujo):
+    while True:
+        bloque = flujo.read(TAMANO_BLOQUE)
+        if not bloque:
+            return
+        yield bloque
+
+
+# Identificador de un documento .xml suelto. En EDGAR el número de acceso está en la ruta (la carpeta
+# edgar/data/CIK/0000320193240000010/ o el nombre del fichero); se escribe con guiones, como en la
+# cabecera SGML. Si no aparece, se usa un hash de la ruta completa: el nombre del fichero no basta,
+# porque los documentos principales suelen llamarse igual (form4.xml, primary_doc.xml).
+def _acceso_xml(nombre):
+    encontrados = _ACCESO_RUTA.findall(nombre)
+    if encontrados:
+        return '-'.join(encontrados[-1])
+    return hashlib.sha1(nombre.encode('utf-8')).hexdigest()[:16]
+
+
+# Registros de un único fichero (ya abierto en binario). `nombre` es la ruta del documento (en un
+# archivo comprimido, la del archivo seguida de la del miembro): sirve para elegir el formato y, en
+# los .xml, para identificar el envío.
+def parsear_flujo(flujo, nombre, codigos=CODIGOS_TRANSACCION):
+    cabecera = {}
+    if nombre.lower().endswith('.xml'):
+        cabecera['acceso'] = _acceso_xml(nombre)
+        bloques = _bloques_xml(flujo)
+    else:
+        bloques = _bloques_sgml(flujo, cabecera)
+    try:
+        return _parsear_documento(bloques, cabecera, codigos)
+    except ParseError as e:
+        logging.warning(f"Formulario mal formado en {nombre}: {e}")
+        return []
+
+
+# Registros de un fichero o archivo comprimido del disco, recorriendo sus miembros en streaming
+def parsear_archivo(ruta, codigos=CODIGOS_TRANSACCION):
+    registros = []
+    minuscula = ruta.lower()
+    absoluta = os.path.abspath(ruta)
+    if minuscula.endswith(('.tar', '.tar.gz', '.tgz')):
+        with tarfile.open(ruta, mode='r|*') as tar:
+            for miembro in tar:
+                if miembro.isfile() and miembro.name.lower().endswith(EXTENSIONES):
+                    registros.extend(parsear_flujo(tar.extractfile(miembro), f'{absoluta}/{miembro.name}', codigos))
+    elif minuscula.endswith('.zip'):
+        with zipfile.ZipFile(ruta) as archivo_zip:
+            for nombre in archivo_zip.namelist():
+                if nombre.lower().endswith(EXTENSIONES):
+                    with archivo_zip.open(nombre) as flujo:
+                        registros.extend(parsear_flujo(flujo, f'{absoluta}/{nombre}', codigos))
+    else:
+        with open(ruta, 'rb') as flujo:
+            registros.extend(parsear_flujo(flujo, absoluta, codigos))
+    return registros
+
+
+# Trabajo de un proceso: un lote de ficheros, filtrado por tickers y fecha, agrupado por ticker
+def _procesar_ficheros(rutas, tickers, desde, hasta):
+    por_ticker = {}
+    for ruta in rutas:
+        try:
+            registros = parsear_archivo(ruta)
+        except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+            logging.error(f"No se pudo leer {ruta}: {e}")
+            continue
+        for registro in registros:
+            ticker, fecha = registro['symbol'], registro['transactionDate']
+            if not ticker or (tickers is not None and ticker not in tickers):
+                continue
+            if fecha is None or (desde and fecha < desde) or (hasta and fecha > hasta):
+                continue
+            por_ticker.setdefault(ticker, []).append(registro)
+    return por_ticker
+
+
+# Ficheros a procesar: las rutas dadas y, si son carpetas, los ficheros reconocidos que contienen
+def listar_ficheros(rutas):
+    ficheros = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for candidato in sorted(glob.glob(os.path.join(ruta, '**', '*'), recursive=True)):
+                if candidato.lower().endswith(EXTENSIONES + ARCHIVOS_COMPRIMIDOS):
+                    ficheros.append(candidato)
+        else:
+            ficheros.append(ruta)
+    return ficheros
+
+
+# Lee en paralelo (un proceso por lote de ficheros) todos los formularios 4 de las rutas y devuelve
+# {ticker: registros en formato Finnhub}. Es un trabajo local limitado por CPU.
+def leer_formularios(rutas, tickers=None, desde=None, hasta=None, procesos=None, tamano_lote=16, archivo_log=None):
+    ficheros = listar_ficheros(rutas)
+    tickers = set(normalizar_tickers(tickers)) if tickers else None
+    desde, hasta = (str(desde) if desde else None), (str(hasta) if hasta else None)
+    # Los archivos comprimidos ya son grandes: van de uno en uno; los ficheros sueltos, en lotes
+    lotes = [[f] for f in ficheros if f.lower().endswith(ARCHIVOS_COMPRIMIDOS)]
+    sueltos = [f for f in ficheros if not f.lower().endswith(ARCHIVOS_COMPRIMIDOS)]
+    lotes += [sueltos[i:i + tamano_lote] for i in range(0, len(sueltos), tamano_lote)]
+    logging.info(f"Formularios 4: {len(ficheros)} ficheros en {len(lotes)} lotes.")
+
+    resultado = {}
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_iniciar_trabajador,
+                             initargs=(archivo_log,)) as ejecutor:
+        futuros = [ejecutor.submit(_procesar_ficheros, lote, tickers, desde, hasta) for lote in lotes]
+        for futuro in as_completed(futuros):
+            try:
+                for ticker, registros in futuro.result().items():
+                    resultado.setdefault(ticker, []).extend(registros)
+            except Exception as e:
+                logging.error(f"Error en un lote de formularios: {e}")
+    logging.info(f"Formularios 4: {sum(map(len, resultado.values()))} transacciones de {len(resultado)} tickers.")
+    return resultado
+
+
+def _iniciar_trabajador(archivo_log):
+    if archivo_log:
+        configurar_logging(archivo_log)
+
+
+# Deja cada transacción (por huella) en un solo envío: si el mismo formulario aparece dos veces con
+# distinto número de acceso (por ejemplo, un .xml suelto sin él en la ruta y su envío .txt), solo cuenta
+# el primero. Las líneas iguales de un mismo envío se conservan.
+def _sin_repetir(registros):
+    envios = {}
+    unicos = []
+    for registro in registros:
+        envio = (registro.get('id') or '').rsplit('-', 1)[0]
+        if envios.setdefault(huella_transaccion(registro), envio) == envio:
+            unicos.append(registro)
+    return unicos
+
+
+# Guarda los registros en el almacén de transacciones. Se guardan como no vigentes (`ahora=0`) para que
+# el siguiente refresco de Finnhub siga consultando lo posterior a la marca de agua, y con origen 'sec'
+# y huella única para que el almacén descarte las operaciones que ya tenga, de Finnhub o de otro envío.
+def rellenar_almacen(almacen, registros_por_ticker):
+    return sum(almacen.guardar(ticker, _sin_repetir(registros), ahora=0, origen=ORIGEN_SEC, huella_unica=True)
+               for ticker, registros in registros_por_ticker.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Carga formularios 4 de archivos locales de EDGAR en el almacén')
+    parser.add_argument('rutas', nargs='+', help='Ficheros o carpetas (.xml, .txt, .nc, .tar, .tar.gz, .tgz, .zip)')
+    parser.add_argument('--tickers', nargs='*', help='Solo estos tickers (por defecto, todos)')
+    parser.add_argument('--desde', help='Primera fecha de transacción (AAAA-MM-DD)')
+    parser.add_argument('--hasta', help='Última fecha de transacción (AAAA-MM-DD)')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count())
+    parser.add_argument('--almacen', default='insider_transacciones.db', help='Almacén de transacciones a rellenar')
+    parser.add_argument('--log', default='insider_sec.log', help='Archivo de log')
+    args = parser.parse_args(argv)
+
+    configurar_logging(args.log)
+    registros = leer_formularios(args.rutas, tickers=args.tickers, desde=args.desde, hasta=args.hasta,
+                                 procesos=args.procesos, archivo_log=args.log)
+    almacen = AlmacenTransacciones(args.almacen)
+    try:
+        insertadas = rellenar_almacen(almacen, registros)
+    finally:
+        almacen.cerrar()
+    logging.info(f"{insertadas} transacciones nuevas guardadas en {args.almacen}.")
+
+
+if __name__ == '__main__':
+    main()
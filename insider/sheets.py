@@ -0,0 +1,69 @@
+import logging
+
+# Ruta del fichero de credenciales de la cuenta de servicio cuando no se usa st.secrets
+RUTA_CREDENCIALES = 'Credenciales_API.json'
+NOMBRE_LIBRO = 'Resumen Transacciones Insiders'
+SCOPE = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+
+# Autenticación con Google Sheets. Usa `st.secrets["gcp_service_account"]` si existe y, si no,
+# el fichero de credenciales. gspread y oauth2client se importan solo al exportar.
+def autenticar_google_sheets(ruta_credenciales=RUTA_CREDENCIALES):
+    try:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        creds_dict = None
+        try:
+            import streamlit as st
+            creds_dict = dict(st.secrets["gcp_service_account"])
+        except Exception:
+            pass
+        if creds_dict:
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
+        else:
+            creds = ServiceAccountCredentials.from_json_keyfile_name(ruta_credenciales, SCOPE)
+        logging.info("Credenciales de Google Sheets cargadas exitosamente.")
+        cliente = gspread.authorize(creds)
+        return cliente
+    except Exception as e:
+        logging.error(f"Error al cargar las credenciales de Google Sheets: {e}")
+        return None
+
+
+# Abre el libro de Google Sheets (o None si no hay credenciales)
+def abrir_libro(nombre=None):
+    cliente = autenticar_google_sheets()
+    if cliente is None:
+        logging.error("No se pudo autenticar con Google Sheets.")
+        return None
+    try:
+        return cliente.open(nombre or NOMBRE_LIBRO)
+    except Exception as e:
+        logging.error(f"Error al abrir el libro de Google Sheets: {e}")
+        return None
+
+
+# Guardar DataFrames en una hoja de Google Sheets. Solo se envían las filas que cambian, en una
+# única llamada por hoja (ver insider.exportar.SumideroGoogleSheets)
+def guardar_en_google_sheets(df_compras, df_ventas, resumen_compras, resumen_ventas, sumidero=None):
+    if sumidero is None:
+        from insider.exportar import SumideroGoogleSheets
+        libro = abrir_libro()
+        if libro is None:
+            return
+        sumidero = SumideroGoogleSheets(libro)
+
+    try:
+        sumidero.escribir({
+            'Compras': df_compras,
+            'Ventas': df_ventas,
+            'Resumen Compras': resumen_compras,
+            'Resumen Ventas': resumen_ventas,
+        })
+        logging.info("Datos guardados en Google Sheets correctamente.")
+    except Exception as e:
+        logging.error(f"Error al guardar en Google Sheets: {e}")
@@ -0,0 +1,160 @@
+import argparse
+import glob
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import pandas as pd
+
+from insider.config import configurar_logging, obtener_api_key
+from insider.descarga import LimitadorTokens, descargar_concurrente
+from insider.fechas import indexar_por_fecha
+from insider.http import cliente_compartido
+from insider.ingesta import construir_transacciones
+from insider.metricas import METRICAS
+from insider.pipeline import descargar
+
+# Escaneo por lotes de todo un universo de tickers repartido en varios procesos:
+#   python -m insider.universo --universo tickers.txt --salida escaneo --procesos 4
+
+
+# Limpia y elimina duplicados de una lista de tickers conservando el orden original
+def normalizar_tickers(tickers):
+    return list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+
+
+# Universo de tickers desde un fichero (uno por línea, o CSV con columna `symbol`) o, si no se
+# indica, desde el listado de símbolos de EE. UU. de Finnhub (con los reintentos y el cortacircuitos
+# del cliente HTTP compartido)
+def cargar_universo(ruta=None, api_key=None, cliente=None):
+    if ruta:
+        if ruta.endswith('.csv'):
+            tickers = pd.read_csv(ruta)['symbol'].astype(str).tolist()
+        else:
+            with open(ruta, encoding='utf-8') as f:
+                tickers = f.read().split()
+    else:
+        cliente = cliente or cliente_compartido(api_key or obtener_api_key())
+        simbolos = cliente.get('/stock/symbol', {'exchange': 'US'}) or []
+        tickers = [s['symbol'] for s in simbolos if s.get('type') in (None, '', 'Common Stock')]
+    tickers = normalizar_tickers(tickers)
+    logging.info(f"Universo de {len(tickers)} tickers únicos cargado.")
+    return tickers
+
+
+# Limitador "token bucket" con el estado en memoria compartida, de modo que todos los procesos
+# consumen de un único presupuesto global. Se pasa a los trabajadores al crearlos. Usa el reloj de
+# pared porque el instante de la última recarga lo escriben procesos distintos.
+class LimitadorCompartido(LimitadorTokens):
+    reloj = staticmethod(time.time)
+
+    def __init__(self, llamadas_por_minuto=60, rafaga=None, contexto=None):
+        self._contexto = contexto or multiprocessing.get_context()
+        super().__init__(llamadas_por_minuto, rafaga)
+        del self._contexto
+
+    def _crear_estado(self, inicial):
+        return self._contexto.Array('d', inicial, lock=False), self._contexto.Lock()
+
+
+_limitador_trabajador = None
+
+
+def _iniciar_trabajador(limitador, archivo_log):
+    global _limitador_trabajador
+    _limitador_trabajador = limitador
+    if archivo_log:
+        configurar_logging(archivo_log)
+
+
+def _ruta_parte(directorio, ticker):
+    return os.path.join(directorio, 'partes', f'{ticker.replace("/", "_")}.parquet')
+
+
+# Descarga un ticker y lo guarda en su propio fichero (escritura atómica) dentro de la misma tarea,
+# de modo que cada ticker queda como punto de control en cuanto termina y no al acabar el lote
+def _descargar_y_guardar(ticker, directorio, api_key):
+    df = construir_transacciones({ticker: descargar(ticker, api_key=api_key)})
+    ruta = _ruta_parte(directorio, ticker)
+    df.to_parquet(ruta + '.tmp', index=False)
+    os.replace(ruta + '.tmp', ruta)
+    return len(df)
+
+
+# Trabajo de un proceso: descarga y guarda su lote de tickers; devuelve cuántos se completaron
+def _procesar_lote(tickers, directorio, api_key, hilos):
+    funcion = partial(_descargar_y_guardar, directorio=directorio, api_key=api_key)
+    resultados = descargar_concurrente(tickers, funcion, max_workers=hilos, limitador=_limitador_trabajador)
+    return sum(resultado.ok for resultado in resultados)
+
+
+# Tickers que ya tienen punto de control en el directorio de salida
+def tickers_completados(directorio):
+    return {os.path.basename(p)[:-len('.parquet')] for p in glob.glob(os.path.join(directorio, 'partes', '*.parquet'))}
+
+
+# Une las partes de todos los tickers en un único frame ordenado por fecha
+def fusionar_partes(directorio):
+    partes = [pd.read_parquet(p) for p in sorted(glob.glob(os.path.join(directorio, 'partes', '*.parquet')))]
+    partes = [df for df in partes if not df.empty]
+    if not partes:
+        return construir_transacciones({})
+    df = pd.concat(partes, ignore_index=True)
+    df['Ticker'] = df['Ticker'].astype('category')
+    df['Nombre'] = df['Nombre'].astype('category')
+    return indexar_por_fecha(df)
+
+
+# Escanea el universo repartiéndolo en `procesos` lotes con un presupuesto de llamadas común.
+# Los tickers con punto de control se saltan, así que relanzarlo tras un fallo continúa donde se quedó.
+def escanear_universo(tickers, directorio, procesos=4, hilos_por_proceso=4, llamadas_por_minuto=60,
+                      tamano_lote=50, api_key=None, archivo_log=None):
+    os.makedirs(os.path.join(directorio, 'partes'), exist_ok=True)
+    tickers = normalizar_tickers(tickers)
+    hechos = tickers_completados(directorio)
+    pendientes = [t for t in tickers if t.replace('/', '_') not in hechos]
+    logging.info(f"Escaneo: {len(tickers)} tickers, {len(tickers) - len(pendientes)} ya completados, {len(pendientes)} pendientes.")
+
+    if pendientes:
+        api_key = api_key or obtener_api_key()
+        contexto = multiprocessing.get_context('spawn')
+        limitador = LimitadorCompartido(llamadas_por_minuto, contexto=contexto)
+        lotes = [pendientes[i:i + tamano_lote] for i in range(0, len(pendientes), tamano_lote)]
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto,
+                                 initializer=_iniciar_trabajador, initargs=(limitador, archivo_log)) as ejecutor:
+            futuros = [ejecutor.submit(_procesar_lote, lote, directorio, api_key, hilos_por_proceso) for lote in lotes]
+            completados = 0
+            for futuro in as_completed(futuros):
+                try:
+                    completados += futuro.result()
+                except Exception as e:
+                    logging.error(f"Error en un lote del escaneo: {e}")
+            logging.info(f"{completados} de {len(pendientes)} tickers pendientes completados.")
+
+    df = fusionar_partes(directorio)
+    df.to_parquet(os.path.join(directorio, 'transacciones.parquet'), index=False)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Escaneo reanudable de un universo de tickers en varios procesos')
+    parser.add_argument('--universo', help='Fichero de tickers (uno por línea o CSV con columna symbol); por defecto, Finnhub US')
+    parser.add_argument('--salida', default='escaneo', help='Directorio de puntos de control y resultado')
+    parser.add_argument('--procesos', type=int, default=4)
+    parser.add_argument('--hilos', type=int, default=4, help='Hilos de descarga por proceso')
+    parser.add_argument('--llamadas-por-minuto', type=int, default=60, help='Presupuesto global de llamadas a Finnhub')
+    parser.add_argument('--log', default='insider_universo.log', help='Archivo de log')
+    args = parser.parse_args(argv)
+
+    configurar_logging(args.log)
+    tickers = cargar_universo(args.universo)
+    df = escanear_universo(tickers, args.salida, procesos=args.procesos, hilos_por_proceso=args.hilos,
+                           llamadas_por_minuto=args.llamadas_por_minuto, archivo_log=args.log)
+    logging.info(f"Escaneo terminado: {len(df)} transacciones en {args.salida}.")
+
+
+if __name__ == '__main__':
+    main()